@@ -0,0 +1,133 @@
+"""
+Фоновая загрузка тяжёлых ресурсов сервера (данные, модель, explainer,
+сырые таблицы). Каждый ресурс грузится в своём потоке, как только готовы
+ресурсы, от которых он зависит; сервер принимает запросы сразу, а
+эндпоинты отвечают 503 только пока не готово то, что нужно именно им.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable
+
+from fastapi import Depends, HTTPException
+
+logger = logging.getLogger(__name__)
+
+
+class AssetNotReady(RuntimeError):
+    """Ресурс ещё грузится или не загрузился."""
+
+
+@dataclass
+class Asset:
+    name: str
+    load: Callable[[], Any]
+    after: tuple[str, ...] = ()
+    state: str = "pending"          # pending -> loading -> ready | failed
+    error: str | None = None
+    started_at: float | None = None
+    duration: float | None = None
+    done: asyncio.Event | None = field(default=None, repr=False)
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def status(self) -> dict:
+        return {
+            "state": self.state,
+            "after": list(self.after),
+            "seconds": None if self.duration is None else round(self.duration, 3),
+            "error": self.error,
+        }
+
+
+class AssetLoader:
+    def __init__(self) -> None:
+        self._assets: dict[str, Asset] = {}
+        self._tasks: list[asyncio.Task] = []
+        self.started_at: float | None = None
+
+    def register(self, name: str, load: Callable[[], Any], after: Iterable[str] = ()) -> None:
+        """load вызывается в отдельном потоке после готовности всех after."""
+        self._assets[name] = Asset(name, load, tuple(after))
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._assets
+
+    def is_ready(self, *names: str) -> bool:
+        return all(name in self._assets and self._assets[name].ready for name in names)
+
+    def check(self, *names: str) -> None:
+        pending = [f"{name} ({self._assets[name].state})"
+                   for name in names if not self.is_ready(name)]
+        if pending:
+            raise AssetNotReady(", ".join(pending))
+
+    def ensure(self, *names: str) -> None:
+        """503 с Retry-After, если какой-то из names не загружен."""
+        try:
+            self.check(*names)
+        except AssetNotReady as err:
+            raise HTTPException(status_code=503, detail=f"Ресурсы не готовы: {err}",
+                                headers={"Retry-After": "5"})
+
+    def require(self, *names: str):
+        """То же, что ensure, в виде зависимости FastAPI."""
+        return Depends(lambda: self.ensure(*names))
+
+    async def _run(self, asset: Asset) -> None:
+        for dep in asset.after:
+            await self._assets[dep].done.wait()
+        failed = [dep for dep in asset.after if not self._assets[dep].ready]
+        if failed:
+            asset.state = "failed"
+            asset.error = f"не загрузились зависимости: {', '.join(failed)}"
+            asset.done.set()
+            return
+
+        asset.state = "loading"
+        asset.started_at = time.perf_counter()
+        try:
+            await asyncio.to_thread(asset.load)
+        except Exception as err:
+            asset.state = "failed"
+            asset.error = repr(err)
+            logger.exception("Не удалось загрузить %s", asset.name)
+        else:
+            asset.state = "ready"
+        finally:
+            asset.duration = time.perf_counter() - asset.started_at
+            asset.done.set()
+
+    def start(self) -> None:
+        """Запускает загрузку всех ресурсов в фоне; вызывать из lifespan."""
+        self.started_at = time.perf_counter()
+        for asset in self._assets.values():
+            asset.done = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run(a), name=f"load:{a.name}")
+                       for a in self._assets.values()]
+
+    async def wait(self) -> None:
+        """Дождаться окончания загрузки (успешной или нет) всех ресурсов."""
+        await asyncio.gather(*self._tasks)
+
+    def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+
+    def status(self, required: Iterable[str] | None = None) -> dict:
+        """
+        ready — загружены все required (по умолчанию все ресурсы); остальные
+        ресурсы, которые ещё грузятся или упали, перечислены отдельно.
+        """
+        required = list(self._assets) if required is None else list(required)
+        return {
+            "ready": self.is_ready(*required),
+            "required": required,
+            "loading": [name for name, a in self._assets.items() if a.state in ("pending", "loading")],
+            "failed": [name for name, a in self._assets.items() if a.state == "failed"],
+            "uptime": None if self.started_at is None else round(time.perf_counter() - self.started_at, 3),
+            "assets": {name: a.status() for name, a in self._assets.items()},
+        }
@@ -0,0 +1,280 @@
+"""
+Журнал решений по скорингу (write-behind). Эндпоинт только кладёт решение
+в ограниченную очередь процесса; фоновая задача забирает их пачками до
+DECISION_LOG_BATCH_SIZE штук (или сколько набралось за
+DECISION_LOG_FLUSH_INTERVAL секунд) и пишет одним многострочным INSERT
+в отдельном потоке, не занимая event loop.
+
+Если база не успевает и очередь заполнена, запрос ждёт места до
+DECISION_LOG_PUT_TIMEOUT секунд (backpressure), потом решение
+отбрасывается с ошибкой в лог. Пока таблица не создана или последняя
+запись в базу не удалась, запрос не ждёт: решение сразу отбрасывается.
+Строки, которые база отвергла, отбрасываются поштучно, не теряя остальную
+пачку. При остановке сервера очередь дописывается.
+"""
+import asyncio
+import heapq
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from os import environ
+from typing import Any
+
+from sqlalchemy import insert, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import Session
+
+from database import Base, engine
+from metrics import registry, span
+from models import ScoringDecision
+
+logger = logging.getLogger(__name__)
+
+DECISION_LOG_ENABLED = environ.get("DECISION_LOG_ENABLED", "1") == "1"
+DECISION_LOG_QUEUE_SIZE = int(environ.get("DECISION_LOG_QUEUE_SIZE", 10_000))
+DECISION_LOG_BATCH_SIZE = int(environ.get("DECISION_LOG_BATCH_SIZE", 500))
+DECISION_LOG_FLUSH_INTERVAL = float(environ.get("DECISION_LOG_FLUSH_INTERVAL", 1.0))
+DECISION_LOG_PUT_TIMEOUT = float(environ.get("DECISION_LOG_PUT_TIMEOUT", 1.0))
+DECISION_LOG_RETRIES = int(environ.get("DECISION_LOG_RETRIES", 3))
+DECISION_LOG_DRAIN_TIMEOUT = float(environ.get("DECISION_LOG_DRAIN_TIMEOUT", 30.0))
+# Сколько признаков с наибольшим |SHAP| сохраняется с решением
+DECISION_LOG_TOP_FACTORS = int(environ.get("DECISION_LOG_TOP_FACTORS", 10))
+
+DECISIONS = registry.counter(
+    "backend_decision_log_total", "Решения журнала по исходу записи", ["outcome"])
+
+_STOP = object()
+
+
+def top_factors(influencers: dict[str, float | None], k: int) -> dict[str, float]:
+    """k признаков с наибольшим |SHAP|; пустые значения пропускаются."""
+    known = ((name, value) for name, value in influencers.items() if value is not None)
+    return dict(heapq.nlargest(k, known, key=lambda item: abs(item[1])))
+
+
+@dataclass
+class Decision:
+    """
+    Решение в очереди. payload — готовое JSON-тело ответа с полями
+    AnalyzeResponse (как его отдали клиенту) либо объект с verdict, score
+    и key_influencers; JSON разбирается уже в потоке записи.
+    """
+    inn: str
+    source: str
+    payload: Any
+    model_version: str
+    data_version: str
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+    def to_row(self, k: int) -> dict[str, Any]:
+        """Строка scoring_decisions; ValueError, если решение в неё не помещается."""
+        if not 0 < len(self.inn) <= ScoringDecision.inn.type.length:
+            raise ValueError(f"ИНН {self.inn!r} не помещается в журнал")
+        if isinstance(self.payload, (bytes, str)):
+            data = json.loads(self.payload)
+            verdict, score, influencers = data["verdict"], data["score"], data["key_influencers"]
+        else:
+            verdict = getattr(self.payload.verdict, "value", self.payload.verdict)
+            score, influencers = self.payload.score, self.payload.key_influencers
+        return {
+            "inn": self.inn,
+            "created_at": self.created_at,
+            "source": self.source,
+            "verdict": verdict,
+            "score": score,
+            "top_factors": top_factors(influencers[0] if influencers else {}, k),
+            "model_version": self.model_version,
+            "data_version": self.data_version,
+        }
+
+
+class DecisionLog:
+    def __init__(
+        self,
+        bind: Engine = engine,
+        enabled: bool = DECISION_LOG_ENABLED,
+        maxsize: int = DECISION_LOG_QUEUE_SIZE,
+        batch_size: int = DECISION_LOG_BATCH_SIZE,
+        flush_interval: float = DECISION_LOG_FLUSH_INTERVAL,
+        put_timeout: float = DECISION_LOG_PUT_TIMEOUT,
+        retries: int = DECISION_LOG_RETRIES,
+        top_k: int = DECISION_LOG_TOP_FACTORS
+    ) -> None:
+        self.bind = bind
+        self.enabled = enabled
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.retries = retries
+        self.top_k = top_k
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        # Таблица создана: до этого решения не копятся в очереди
+        self.ready = False
+        # Последняя запись в базу удалась; иначе при полной очереди запрос не ждёт
+        self._healthy = True
+
+    def create_table(self) -> None:
+        Base.metadata.create_all(self.bind, tables=[ScoringDecision.__table__])
+        self.ready = True
+
+    def start(self) -> None:
+        """Запускает фоновую запись; вызывать из lifespan."""
+        if not self.enabled:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._task = asyncio.create_task(self._run(), name="decision-log")
+
+    async def record(self, inn: str, source: str, payload: Any,
+                     model_version: str, data_version: str) -> None:
+        """
+        Ставит решение в очередь; ждёт, только если очередь заполнена, а база
+        пишет. ИНН сохраняется без пробелов по краям, как его ищет поиск.
+        """
+        if self._task is None:
+            return
+        if not self.ready:
+            DECISIONS.inc("dropped")
+            return
+        decision = Decision(inn.strip(), source, payload, model_version, data_version)
+        try:
+            self._queue.put_nowait(decision)
+            return
+        except asyncio.QueueFull:
+            pass
+        if not self._healthy:
+            # База недоступна: ожидание места только задержало бы ответ
+            DECISIONS.inc("dropped")
+            return
+
+        try:
+            with span("decision_log_wait"):
+                await asyncio.wait_for(self._queue.put(decision), self.put_timeout)
+        except asyncio.TimeoutError:
+            DECISIONS.inc("dropped")
+            logger.error("Очередь журнала решений заполнена, решение по ИНН %s не записано", inn)
+
+    async def _next_batch(self) -> tuple[list[Decision], bool]:
+        """Следующая пачка решений и признак остановки."""
+        first = await self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _rows(self, batch: list[Decision]) -> list[dict[str, Any]]:
+        rows = []
+        for decision in batch:
+            try:
+                rows.append(decision.to_row(self.top_k))
+            except Exception:
+                DECISIONS.inc("invalid")
+                logger.exception("Решение по ИНН %r не записано: некорректные данные", decision.inn)
+        return rows
+
+    def _write(self, rows: list[dict[str, Any]]) -> None:
+        # Список строк SQLAlchemy отправляет многострочными INSERT ... VALUES (...), (...)
+        with self.bind.begin() as conn:
+            conn.execute(insert(ScoringDecision), rows)
+
+    async def _flush(self, batch: list[Decision]) -> None:
+        """
+        Пишет пачку. Если база отвергла данные, пачка делится пополам, пока
+        плохая строка не останется одна, — отбрасывается только она. Ошибки
+        соединения повторяются с паузой; после DECISION_LOG_RETRIES
+        неудач отбрасывается всё, что ещё не записано.
+        """
+        rows = await asyncio.to_thread(self._rows, batch)
+        chunks = [rows] if rows else []
+        failures = 0
+        while chunks:
+            chunk = chunks.pop()
+            try:
+                await asyncio.to_thread(self._write, chunk)
+            except (DataError, IntegrityError) as error:
+                if len(chunk) > 1:
+                    middle = len(chunk) // 2
+                    chunks += [chunk[middle:], chunk[:middle]]
+                else:
+                    DECISIONS.inc("invalid")
+                    logger.error("База отвергла решение по ИНН %s: %s", chunk[0]["inn"], error.orig)
+                continue
+            except Exception:
+                self._healthy = False
+                failures += 1
+                logger.exception("Не удалось записать %d решений (попытка %d)", len(chunk), failures)
+                if failures > self.retries:
+                    lost = len(chunk) + sum(map(len, chunks))
+                    DECISIONS.inc("dropped", amount=lost)
+                    logger.error("Журнал решений: %d решений не записано", lost)
+                    return
+                chunks.append(chunk)
+                await asyncio.sleep(2 ** (failures - 1))
+                continue
+            self._healthy = True
+            DECISIONS.inc("written", amount=len(chunk))
+
+    async def _run(self) -> None:
+        while True:
+            batch, stop = await self._next_batch()
+            if batch:
+                await self._flush(batch)
+            if stop:
+                return
+
+    async def stop(self, timeout: float = DECISION_LOG_DRAIN_TIMEOUT) -> None:
+        """Дописывает всё, что уже в очереди, и останавливает фоновую задачу."""
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        try:
+            await asyncio.wait_for(self._queue.put(_STOP), timeout)
+            await asyncio.wait_for(task, timeout)
+        except asyncio.TimeoutError:
+            task.cancel()
+            lost = self._queue.qsize()
+            DECISIONS.inc("dropped", amount=lost)
+            logger.error("Журнал решений не дописан за %s с, потеряно не меньше %d решений",
+                         timeout, lost)
+
+
+def query_decisions(db: Session, inn: str | None = None, source: str | None = None,
+                    since: datetime | None = None, until: datetime | None = None,
+                    limit: int = 100) -> list[ScoringDecision]:
+    """
+    Решения, новые сначала. since включительно, until — нет: следующую
+    страницу можно взять с until = created_at последней записи.
+    """
+    query = select(ScoringDecision)
+    if inn is not None:
+        query = query.where(ScoringDecision.inn == inn.strip())
+    if source is not None:
+        query = query.where(ScoringDecision.source == source)
+    if since is not None:
+        query = query.where(ScoringDecision.created_at >= since)
+    if until is not None:
+        query = query.where(ScoringDecision.created_at < until)
+    query = query.order_by(ScoringDecision.created_at.desc(), ScoringDecision.id.desc())
+    return list(db.scalars(query.limit(limit)))
+
+
+decision_log = DecisionLog()
@@ -0,0 +1,210 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from functools import wraps
+from os import environ
+from typing import Any, Awaitable, Callable, Hashable, Mapping
+
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+
+try:
+    from redis import asyncio as aioredis
+except ImportError:  # без redis работает только локальный уровень
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+# Общий для всех воркеров уровень кэша; без REDIS_URL кэш только локальный
+REDIS_URL = environ.get("REDIS_URL")
+RESULT_CACHE_SIZE = int(environ.get("RESULT_CACHE_SIZE", 10000))
+RESULT_CACHE_TTL = float(environ.get("RESULT_CACHE_TTL", 3600))
+# Недоступный Redis не должен задерживать запросы: таймауты на подключение
+# и операции, после ошибки Redis пропускается REDIS_RETRY_AFTER секунд
+REDIS_TIMEOUT = float(environ.get("REDIS_TIMEOUT", 0.25))
+REDIS_RETRY_AFTER = float(environ.get("REDIS_RETRY_AFTER", 5))
+
+
+class TTLCache:
+    """
+    LRU-кэш на maxsize записей, каждая живёт не дольше ttl секунд.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Any | None:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+def encode_response(result: Any) -> bytes:
+    """
+    Готовый ответ эндпоинта -> байты для кэша: media type и тело
+    через перевод строки. JSON сериализуется так же, как это делает FastAPI.
+    """
+    if isinstance(result, Response):
+        return (result.media_type or "").encode() + b"\n" + bytes(result.body)
+    body = json.dumps(jsonable_encoder(result), ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode()
+    return b"application/json\n" + body
+
+
+def decode_response(value: bytes) -> Response:
+    media_type, _, body = value.partition(b"\n")
+    return Response(content=body, media_type=media_type.decode() or None)
+
+
+class ResultCache:
+    """
+    Кэш готовых ответов эндпоинтов: LRU в памяти процесса перед общим
+    Redis-совместимым уровнем. Одинаковые запросы, пришедшие одновременно,
+    считаются один раз (single-flight) — остальные ждут результат первого.
+    Версии модели и данных входят в ключ, поэтому после их смены старые
+    записи просто перестают читаться и вытесняются по TTL.
+    """
+
+    def __init__(
+        self,
+        namespace: str = "backend",
+        maxsize: int = RESULT_CACHE_SIZE,
+        ttl: float = RESULT_CACHE_TTL,
+        redis_url: str | None = REDIS_URL,
+        redis: Any = None,
+        redis_timeout: float = REDIS_TIMEOUT,
+        retry_after: float = REDIS_RETRY_AFTER
+    ) -> None:
+        self.namespace = namespace
+        self.ttl = ttl
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        # redis — любой клиент с async get/set(ex=), например fake в тестах
+        self._redis = redis
+        self._redis_url = redis_url
+        self.redis_timeout = redis_timeout
+        self.retry_after = retry_after
+        self._redis_down_until = 0.0
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    @property
+    def redis(self) -> Any:
+        if self._redis_down_until > time.monotonic():
+            return None
+        if self._redis is None and self._redis_url and aioredis is not None:
+            self._redis = aioredis.from_url(self._redis_url,
+                                            socket_timeout=self.redis_timeout,
+                                            socket_connect_timeout=self.redis_timeout)
+        return self._redis
+
+    def _redis_failed(self, err: Exception) -> None:
+        self._redis_down_until = time.monotonic() + self.retry_after
+        logger.warning("Кэш в Redis недоступен, следующая попытка через %s с: %s",
+                       self.retry_after, err)
+
+    async def get(self, key: str) -> bytes | None:
+        value = self.local.get(key)
+        redis = self.redis
+        if value is not None or redis is None:
+            return value
+        try:
+            value = await redis.get(key)
+        except Exception as err:
+            self._redis_failed(err)
+            return None
+        if value is not None:
+            self.local.set(key, value)
+        return value
+
+    async def set(self, key: str, value: bytes) -> None:
+        self.local.set(key, value)
+        redis = self.redis
+        if redis is None:
+            return
+        try:
+            await redis.set(key, value, ex=int(self.ttl))
+        except Exception as err:
+            self._redis_failed(err)
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[bytes]]) -> bytes:
+        value = await self.get(key)
+        if value is not None:
+            return value
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # отменили первый запрос, а не нас — считаем сами
+                if not pending.cancelled():
+                    raise
+                return await self.get_or_compute(key, compute)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as err:
+            future.set_exception(err)
+            future.exception()  # ошибку получат ждущие; без них не шумим в лог
+            raise
+        finally:
+            del self._inflight[key]
+
+        future.set_result(value)
+        await self.set(key, value)
+        return value
+
+    def cached(self, name: str, *params: str, version: str | Callable[[], str] = "",
+               normalize: Mapping[str, Callable[[Any], Any]] | None = None):
+        """
+        Декоратор эндпоинта. Ключ — namespace, version, name и значения
+        параметров params; normalize приводит значение параметра к тому виду,
+        в котором его ищет эндпоинт (например, ИНН без пробелов), чтобы
+        одинаковые запросы делили одну запись. Исключения (например, 404)
+        не кэшируются.
+        """
+        normalize = normalize or {}
+
+        def decorator(func):
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                ver = version() if callable(version) else version
+                values = (normalize.get(p, str)(kwargs[p]) for p in params)
+                key = ":".join([self.namespace, ver, name, *map(str, values)])
+
+                async def compute() -> bytes:
+                    return encode_response(await func(*args, **kwargs))
+
+                return decode_response(await self.get_or_compute(key, compute))
+            return wrapper
+        return decorator
+
+    async def aclose(self) -> None:
+        if self._redis is not None:
+            await self._redis.aclose()
+
+
+result_cache = ResultCache()
@@ -0,0 +1,84 @@
+"""
+Колоночные копии входных CSV в Parquet: типизированные колонки, строки
+отсортированы по ИНН. Загрузчики берут .parquet рядом с CSV, если он не
+старше самого CSV, и читают из него только нужные колонки — без разбора
+текста на каждом старте воркера.
+
+    python columnar.py      # сконвертировать признаки и все сырые таблицы
+"""
+from pathlib import Path
+from typing import Iterable
+
+import pandas as pd
+
+
+def parquet_path(path: str | Path) -> Path:
+    return Path(path).with_suffix(".parquet")
+
+
+def prefer_parquet(path: str | Path) -> Path:
+    """
+    .parquet рядом с CSV, если он есть и не старше CSV; иначе сам CSV.
+    Путь к .parquet возвращается как есть.
+    """
+    path = Path(path)
+    columnar = parquet_path(path)
+    if path.suffix == ".parquet" or not columnar.is_file():
+        return path
+    if path.is_file() and path.stat().st_mtime > columnar.stat().st_mtime:
+        return path
+    return columnar
+
+
+def read_table(path: str | Path, columns: Iterable[str] | None = None) -> pd.DataFrame:
+    """CSV или Parquet; с columns читаются только те из них, что есть в файле."""
+    path = Path(path)
+    wanted = None if columns is None else set(columns)
+
+    if path.suffix == ".parquet":
+        if wanted is None:
+            return pd.read_parquet(path, memory_map=True)
+        import pyarrow.parquet as pq
+        present = [name for name in pq.read_schema(path).names if name in wanted]
+        return pd.read_parquet(path, columns=present, memory_map=True)
+
+    return pd.read_csv(path, usecols=None if wanted is None else (lambda name: name in wanted))
+
+
+def convert(csv_path: str | Path, compact: bool = False) -> Path:
+    """
+    Пишет .parquet рядом с CSV: inn строкой, строки отсортированы по ИНН
+    (устойчиво — среди дубликатов первым остаётся первый). С compact числовые
+    колонки ужимаются так же, как при загрузке CompanyStatsFromLocal.
+    """
+    from company import _compact_dtypes
+
+    df = pd.read_csv(csv_path)
+    df["inn"] = df["inn"].astype(str).str.strip()
+    if compact:
+        df = _compact_dtypes(df)
+    df = df.sort_values("inn", kind="stable", ignore_index=True)
+
+    out = parquet_path(csv_path)
+    tmp = out.with_name(out.name + ".tmp")
+    df.to_parquet(tmp, index=False)
+    tmp.replace(out)
+    return out
+
+
+def main() -> None:
+    from raw_store import RAW_TABLE_FILES
+
+    sources = {"features": ("../data/full_transformed_wo_target.csv", True)}
+    sources.update({name: (path, False) for name, path in RAW_TABLE_FILES.items()})
+
+    for name, (csv_path, compact) in sources.items():
+        if not Path(csv_path).is_file():
+            print(f"{name}: нет {csv_path}, пропускаю")
+            continue
+        out = convert(csv_path, compact=compact)
+        print(f"{name}: {csv_path} -> {out}")
+
+
+if __name__ == "__main__":
+    main()
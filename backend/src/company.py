@@ -1,14 +1,37 @@
+import hashlib
 from pathlib import Path
-from typing import Dict, Any
-from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Any, Iterable, Mapping
 
+import numpy as np
 import pandas as pd
 
+from columnar import read_table
+from serialize import RowEncoder, dumps, to_python
+
 
 class CompanyNotFoundError(ValueError):
     """ИНН не найден в источнике."""
 
 
+def _compact_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Ужимает числовые колонки: целые — до минимального целого типа,
+    вещественные — до float32, если это не теряет точность.
+    """
+    columns = {}
+    for name, col in df.items():
+        if pd.api.types.is_integer_dtype(col):
+            col = pd.to_numeric(col, downcast="integer")
+        elif pd.api.types.is_float_dtype(col) and col.dtype != np.float32:
+            narrow = col.astype(np.float32)
+            if np.array_equal(narrow.to_numpy(np.float64), col.to_numpy(np.float64),
+                              equal_nan=True):
+                col = narrow
+        columns[name] = col
+    return pd.DataFrame(columns)
+
+
 class CompanyStatsSource:
     """
     Базовый интерфейс получения статистики по категориям.
@@ -73,6 +96,12 @@ class CompanyStatsSource:
         ],
     }
 
+    @classmethod
+    def required_columns(cls, extra: Iterable[str] = ()) -> list[str]:
+        """inn, все поля CATEGORY_FIELDS и extra (например, признаки модели) без повторов."""
+        fields = (field for names in cls.CATEGORY_FIELDS.values() for field in names)
+        return list(dict.fromkeys(["inn", *fields, *extra]))
+
     def get_category_stats(self, inn: str, category: str) -> Dict[str, Any]:
         raise NotImplementedError
 
@@ -100,36 +129,111 @@ class CompanyStatsSource:
 
 
 class CompanyStatsFromLocal(CompanyStatsSource):
-    def __init__(self, csv_path: str | Path = "company_info.csv") -> None:
+    """
+    Колоночное хранилище, которое строится один раз при загрузке CSV:
+    индекс ИНН -> позиция строки, ужатые числовые колонки и заранее
+    разрешённые по CATEGORY_FIELDS срезы колонок.
+    """
+
+    def __init__(self, csv_path: str | Path = "company_info.csv",
+                 columns: Iterable[str] | None = None) -> None:
+        """
+        csv_path — CSV или Parquet (см. columnar.py). С columns читаются
+        только эти колонки (inn добавляется всегда); хеши строк и версия
+        данных считаются по прочитанным колонкам.
+        """
         path = Path(csv_path).expanduser()
 
         if not path.is_file():
-            raise FileNotFoundError(f"CSV не найден: {csv_path}")
+            raise FileNotFoundError(f"Файл данных не найден: {csv_path}")
 
-        self._df = pd.read_csv(path)
-        self._df["inn"] = self._df["inn"].astype(str).str.strip()
+        df = read_table(path, None if columns is None else ["inn", *columns])
+        df["inn"] = df["inn"].astype(str).str.strip()
+        self._df = _compact_dtypes(df)
 
-    @lru_cache(maxsize=1024)
-    def get_row(self, inn: str) -> pd.Series:
-        normalized_inn = inn.strip()
-        matches = self._df[self._df["inn"] == normalized_inn]
+        # При дубликатах ИНН берём первую строку — как раньше делал фильтр
+        inns = self._df["inn"].tolist()
+        self._index: Dict[str, int] = dict(
+            zip(reversed(inns), range(len(inns) - 1, -1, -1))
+        )
 
-        if matches.empty:
-            raise CompanyNotFoundError(f"Компания с ИНН {inn} не найдена")
+        self._category_columns: Dict[str, list[tuple[str, np.ndarray | None]]] = {
+            category: [(field, self._column(field)) for field in fields]
+            for category, fields in self.CATEGORY_FIELDS.items()
+        }
+        self._encoders: Dict[str, RowEncoder] = {
+            category: RowEncoder(columns)
+            for category, columns in self._category_columns.items()
+        }
+        self._fingerprints: np.ndarray | None = None
+
+    def __len__(self) -> int:
+        return len(self._df)
+
+    def _column(self, field: str) -> np.ndarray | None:
+        if field not in self._df.columns:
+            return None
+        return self._df[field].to_numpy()
+
+    def column(self, field: str) -> np.ndarray | None:
+        """Колонка целиком, без копии; None, если такого поля нет."""
+        return self._column(field)
+
+    @property
+    def index(self) -> Mapping[str, int]:
+        """ИНН -> позиция строки, только для чтения."""
+        return MappingProxyType(self._index)
+
+    def row_fingerprints(self) -> np.ndarray:
+        """uint64-хеш содержимого каждой строки; считается один раз."""
+        if self._fingerprints is None:
+            self._fingerprints = pd.util.hash_pandas_object(self._df, index=False).to_numpy()
+        return self._fingerprints
+
+    @property
+    def data_version(self) -> str:
+        """Версия данных — хеш от хешей всех строк, не зависит от их порядка."""
+        return hashlib.sha256(np.sort(self.row_fingerprints()).tobytes()).hexdigest()[:16]
+
+    def get_position(self, inn: str) -> int:
+        try:
+            return self._index[inn.strip()]
+        except KeyError:
+            raise CompanyNotFoundError(f"Компания с ИНН {inn} не найдена") from None
 
-        return matches.iloc[0]
+    def get_row(self, inn: str) -> pd.Series:
+        return self._df.iloc[self.get_position(inn)]
+
+    def get_rows(self, positions: list[int]) -> pd.DataFrame:
+        """Матрица признаков для набора позиций, без построчных Series."""
+        return self._df.iloc[positions].reset_index(drop=True)
 
     def get_category_stats(self, inn: str, category: str) -> Dict[str, Any]:
         if category not in self.CATEGORY_FIELDS:
             raise KeyError(f"Unknown category: {category}")
 
-        row = self.get_row(inn)
-        fields = self.CATEGORY_FIELDS[category]
-        subset = row.reindex(fields)
+        return self._stats_at(self.get_position(inn), category)
+
+    def get_all_stats(self, inn: str) -> Dict[str, Dict[str, Any]]:
+        return self.all_stats_at(self.get_position(inn))
+
+    def all_stats_at(self, pos: int) -> Dict[str, Dict[str, Any]]:
+        """Все категории по уже найденной позиции строки."""
+        return {cat: self._stats_at(pos, cat) for cat in self.CATEGORY_FIELDS}
+
+    def category_json(self, pos: int, category: str) -> str:
+        """JSON категории сразу из колонок, без промежуточного dict."""
+        return self._encoders[category].encode(pos)
+
+    def all_stats_json(self, pos: int) -> str:
+        return "{" + ",".join(
+            f"{dumps(category)}:{encoder.encode(pos)}" for category, encoder in self._encoders.items()
+        ) + "}"
 
+    def _stats_at(self, pos: int, category: str) -> Dict[str, Any]:
         return {
-            col: None if pd.isna(val) else (val.item() if hasattr(val, "item") else val)
-            for col, val in subset.items()
+            field: None if column is None else to_python(column[pos])
+            for field, column in self._category_columns[category]
         }
 
 
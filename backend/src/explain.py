@@ -0,0 +1,87 @@
+from os import environ
+from typing import Any, Dict, List
+
+from schemas import AnalyzeResponse
+
+# Бюджет на текст запроса к LLM, в токенах
+EXPLAIN_TOKEN_BUDGET = int(environ.get("EXPLAIN_TOKEN_BUDGET", 1500))
+
+# Сколько самых влиятельных признаков передаём в LLM
+EXPLAIN_TOP_K = int(environ.get("EXPLAIN_TOP_K", 10))
+
+# YandexGPT в среднем укладывает ~3 символа русского текста в токен
+CHARS_PER_TOKEN = 3
+
+CATEGORY_TITLES = {
+    "financial": "Финансовые показатели",
+    "general": "Общая информация",
+    "contracts": "Госконтракты",
+    "arbitration": "Арбитражные дела",
+    "enforcement": "Исполнительные производства",
+    "risk": "Риски",
+}
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def top_influencers(result: AnalyzeResponse, k: int = EXPLAIN_TOP_K) -> List[tuple[str, float]]:
+    """k признаков с наибольшим по модулю SHAP-вкладом."""
+    shap_values: Dict[str, float] = {}
+    for item in result.key_influencers:
+        shap_values.update(item)
+    return sorted(shap_values.items(), key=lambda kv: abs(kv[1]), reverse=True)[:k]
+
+
+def _format_value(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    return str(value)
+
+
+def build_explain_prompt(
+    inn: str,
+    result: AnalyzeResponse,
+    stats: Dict[str, Dict[str, Any]],
+    budget: int = EXPLAIN_TOKEN_BUDGET,
+    k: int = EXPLAIN_TOP_K
+) -> str:
+    """
+    Собирает текст запроса: скор, top-k SHAP-факторов и статистику по
+    категориям. Скор и факторы идут всегда, статистика добавляется
+    построчно, пока текст укладывается в budget токенов; пустые поля
+    пропускаются.
+    """
+    lines = [
+        f"Компания с ИНН {inn}.",
+        f"Скор модели: {result.score:.4f}, вердикт: {result.verdict.value}.",
+        "",
+        "Наиболее влиятельные признаки (SHAP, положительный вклад повышает риск):",
+    ]
+    lines += [f"- {name}: {value:+.4f}" for name, value in top_influencers(result, k)]
+    lines += ["", "Объясни, почему компания получила такой скор, опираясь на данные ниже."]
+
+    used = estimate_tokens("\n".join(lines))
+    for category, fields in stats.items():
+        header = f"\n{CATEGORY_TITLES.get(category, category)}:"
+        cost = estimate_tokens(header)
+        if used + cost > budget:
+            break
+        section = []
+        for field, value in fields.items():
+            if value is None:
+                continue
+            line = f"- {field}: {_format_value(value)}"
+            line_cost = estimate_tokens(line)
+            if used + cost + line_cost > budget:
+                break
+            section.append(line)
+            cost += line_cost
+        if not section:
+            continue
+        lines.append(header)
+        lines += section
+        used += cost
+
+    return "\n".join(lines)
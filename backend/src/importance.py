@@ -0,0 +1,204 @@
+"""
+Глобальная важность признаков для версии модели: SHAP по всему датасету
+(или по стратифицированной выборке), посчитанный пачками в пуле процессов.
+Результат — один JSON в <root>/<хеш модели>.json:
+
+    features   mean |SHAP|, средний SHAP и квантили SHAP по каждому признаку
+    segments   mean |SHAP| по признакам внутри каждого сегмента (msp_category, ...)
+
+Сервер читает файл при старте и отдаёт его из /v1/model/importance.
+
+    python importance.py --csv ../data/full_transformed_wo_target.csv \\
+                         --model ../models/catboost_model-2.cbm --workers 4
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator
+
+import numpy as np
+import pandas as pd
+import shap
+from catboost import CatBoostClassifier
+
+from columnar import prefer_parquet
+from company import CompanyStatsFromLocal
+from score_store import file_fingerprint
+from scoring import score_matrix
+from serialize import to_python
+
+DEFAULT_ROOT = "../data/importance"
+
+# Сегменты, внутри которых считаем важность отдельно
+SEGMENT_COLUMNS = ("msp_category", "emp_bin")
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+# Модель и explainer живут в каждом процессе пула
+_worker: dict[str, Any] = {}
+
+
+def _init_worker(model_path: str) -> None:
+    model = CatBoostClassifier(thread_count=1)
+    model.load_model(model_path)
+    _worker["model"] = model
+    _worker["explainer"] = shap.TreeExplainer(model)
+
+
+def _shap_chunk(X: pd.DataFrame) -> tuple[np.ndarray, list[str]]:
+    _, shap_full, columns = score_matrix(_worker["model"], _worker["explainer"], X)
+    return shap_full.astype(np.float32), columns
+
+
+def bounded_map(pool: Executor, func: Callable, items: Iterable, window: int) -> Iterator:
+    """
+    Как pool.map, но держит в работе не больше window задач: следующий
+    элемент items берётся, только когда освободилось место. pool.map
+    сразу отправляет всё, то есть весь датасет копируется заранее.
+    """
+    pending = deque()
+    for item in items:
+        if len(pending) >= window:
+            yield pending.popleft().result()
+        pending.append(pool.submit(func, item))
+    while pending:
+        yield pending.popleft().result()
+
+
+def stratified_sample(strata: np.ndarray, size: int, seed: int = 0) -> np.ndarray:
+    """
+    Индексы выборки размера ~size, в которой каждая страта представлена
+    пропорционально своей доле (но хотя бы одной строкой).
+    """
+    rng = np.random.default_rng(seed)
+    codes, _ = pd.factorize(strata, use_na_sentinel=False)
+    share = size / len(codes)
+    picked = []
+    for code in np.unique(codes):
+        rows = np.flatnonzero(codes == code)
+        k = max(1, round(len(rows) * share))
+        picked.append(rng.choice(rows, size=min(k, len(rows)), replace=False))
+    return np.sort(np.concatenate(picked))
+
+
+def compute_importance(source: CompanyStatsFromLocal, model_path: str,
+                       sample: int | None = None, chunk_size: int = 4096,
+                       workers: int | None = None,
+                       segments: tuple[str, ...] = SEGMENT_COLUMNS) -> dict:
+    """
+    Считает SHAP по уникальным ИНН источника пачками по chunk_size в пуле
+    из workers процессов и сворачивает его в агрегаты.
+    """
+    positions = np.fromiter(source.index.values(), dtype=np.int64, count=len(source.index))
+    segments = tuple(s for s in segments if source.column(s) is not None)
+
+    if sample is not None and sample < len(positions):
+        strata = source.column(segments[0])[positions] if segments else np.zeros(len(positions))
+        positions = positions[stratified_sample(strata, sample)]
+
+    chunks = [positions[i:i + chunk_size].tolist() for i in range(0, len(positions), chunk_size)]
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"),
+                             initializer=_init_worker, initargs=(model_path,)) as pool:
+        # Пачки собираются по мере освобождения процессов: в памяти не больше
+        # двух пачек на процесс, а не копия всего датасета
+        parts = list(bounded_map(pool, _shap_chunk, (source.get_rows(chunk) for chunk in chunks),
+                                 window=2 * workers))
+
+    columns = parts[0][1] if parts else []
+    shap_all = np.concatenate([p[0] for p in parts]) if parts else np.zeros((0, 0), np.float32)
+    abs_shap = np.abs(shap_all)
+
+    mean_abs = abs_shap.mean(axis=0) if len(shap_all) else np.zeros(len(columns))
+    mean = shap_all.mean(axis=0) if len(shap_all) else np.zeros(len(columns))
+    quantiles = np.quantile(shap_all, QUANTILES, axis=0) if len(shap_all) else \
+        np.zeros((len(QUANTILES), len(columns)))
+
+    features = [
+        {
+            "name": name,
+            "mean_abs_shap": float(mean_abs[j]),
+            "mean_shap": float(mean[j]),
+            "quantiles": {f"p{round(q * 100)}": float(quantiles[i, j])
+                          for i, q in enumerate(QUANTILES)},
+        }
+        for j, name in enumerate(columns)
+    ]
+    features.sort(key=lambda f: f["mean_abs_shap"], reverse=True)
+
+    by_segment: dict[str, dict[str, Any]] = {}
+    for segment in segments:
+        codes, groups = pd.factorize(source.column(segment)[positions])
+        by_segment[segment] = {}
+        for code, group in enumerate(groups):
+            rows = codes == code
+            seg_mean = abs_shap[rows].mean(axis=0)
+            by_segment[segment][str(to_python(group))] = {
+                "rows": int(rows.sum()),
+                "mean_abs_shap": dict(zip(columns, seg_mean.tolist())),
+            }
+
+    return {
+        "data_version": source.data_version,
+        "rows": int(len(positions)),
+        "sampled": sample is not None and sample < len(source.index),
+        "features": features,
+        "segments": by_segment,
+    }
+
+
+def importance_path(root: str | Path, model_version: str) -> Path:
+    return Path(root) / f"{model_version}.json"
+
+
+def write_importance(root: str | Path, model_version: str, result: dict) -> Path:
+    """Пишет во временный файл и атомарно подменяет старый."""
+    path = importance_path(root, model_version)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps({"model_version": model_version, "created_at": time.time(),
+                               **result}, ensure_ascii=False))
+    tmp.replace(path)
+    return path
+
+
+def load_importance(root: str | Path, model_version: str) -> dict | None:
+    path = importance_path(root, model_version)
+    if not path.is_file():
+        return None
+    return json.loads(path.read_text())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Глобальная важность признаков по SHAP")
+    parser.add_argument("--csv", default="../data/full_transformed_wo_target.csv")
+    parser.add_argument("--model", default="../models/catboost_model-2.cbm")
+    parser.add_argument("--out", default=DEFAULT_ROOT)
+    parser.add_argument("--sample", type=int, default=None,
+                        help="размер стратифицированной выборки; по умолчанию все ИНН")
+    parser.add_argument("--chunk-size", type=int, default=4096)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    model = CatBoostClassifier()
+    model.load_model(args.model)
+    source = CompanyStatsFromLocal(
+        prefer_parquet(args.csv),
+        columns=CompanyStatsFromLocal.required_columns(model.feature_names_)
+    )
+    model_version = file_fingerprint(args.model)
+
+    started = time.perf_counter()
+    result = compute_importance(source, args.model, args.sample, args.chunk_size, args.workers)
+    path = write_importance(args.out, model_version, result)
+    print(f"Модель {model_version}, данные {source.data_version}: "
+          f"{result['rows']} ИНН за {time.perf_counter() - started:.1f} с -> {path}")
+
+
+if __name__ == "__main__":
+    main()
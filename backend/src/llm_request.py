@@ -1,31 +1,46 @@
-import requests
+import asyncio
+import hashlib
+import json
+import random
+from os import environ
+from typing import AsyncIterator
 
-BASE_URL = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
+import httpx
 
-def query_yandex(
+from cache import TTLCache
+
+# Можно направить на локальный stub-сервер в тестах
+BASE_URL = environ.get(
+    "YANDEX_GPT_URL",
+    "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
+)
+
+SYSTEM_PROMPT = (
+    "Ты профессионал в анализе деятельности юридических лиц. Твоя цель - используя статистические данные различных сфер компании и метрики максимально подробно объяснить, почему компания получила тот или иной скор. Скор измеряется от 0 до 1, где 1 - кампания псевдо-банкрот, а 0 - которая точно не обанкротиться"
+)
+
+# Статусы, при которых запрос имеет смысл повторить
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def build_prompt(
     user_text: str,
-    api_key: str,
     folder_id: str,
     temperature: float = 0.6,
-    max_tokens: int = 2000
-) -> str:
-    """
-    Отправляет текст пользователя в YandexGPT через API Yandex Cloud
-    и возвращает ответ ассистента в виде строки.
-    """
-    prompt = {
+    max_tokens: int = 2000,
+    stream: bool = False
+) -> dict:
+    return {
         "modelUri": f"gpt://{folder_id}/yandexgpt",
         "completionOptions": {
-            "stream": False,
+            "stream": stream,
             "temperature": temperature,
             "maxTokens": str(max_tokens)
         },
         "messages": [
             {
                 "role": "system",
-                "text": (
-                    "Ты профессионал в анализе деятельности юридических лиц. Твоя цель - используя статистические данные различных сфер компании и метрики максимально подробно объяснить, почему компания получила тот или иной скор. Скор измеряется от 0 до 1, где 1 - кампания псевдо-банкрот, а 0 - которая точно не обанкротиться"
-                )
+                "text": SYSTEM_PROMPT
             },
             {
                 "role": "user",
@@ -33,18 +48,207 @@ def query_yandex(
             }
         ]
     }
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": "Api-Key " + api_key
-    }
 
-    resp = requests.post(BASE_URL, headers=headers, json=prompt)
-    resp.raise_for_status()
 
-    data = resp.json()
+def parse_answer(data: dict) -> str:
     # Парсим структуру ответа:
     # {"result": {"alternatives": [{"message": {"role": "assistant", "text": ...}}], ...}}
     try:
         return data["result"]["alternatives"][0]["message"]["text"]
     except (KeyError, IndexError) as e:
-        raise RuntimeError(f"Невозможно разобрать ответ сервера: {data}") from e
\ No newline at end of file
+        raise RuntimeError(f"Невозможно разобрать ответ сервера: {data}") from e
+
+
+def prompt_key(prompt: dict, api_key: str) -> str:
+    """
+    Контентный ключ: текст сообщений, modelUri, температура и хеш API-ключа —
+    ответ, оплаченный одним ключом, не отдаётся запросу с другим.
+    """
+    payload = {
+        "credentials": hashlib.sha256(api_key.encode()).hexdigest(),
+        "modelUri": prompt["modelUri"],
+        "temperature": prompt["completionOptions"]["temperature"],
+        "maxTokens": prompt["completionOptions"]["maxTokens"],
+        "messages": prompt["messages"],
+    }
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True).encode()
+    return hashlib.sha256(raw).hexdigest()
+
+
+class YandexGPTClient:
+    """
+    Асинхронный клиент YandexGPT: пул keep-alive соединений, таймауты,
+    ограничение числа одновременных запросов, повторы с экспоненциальной
+    задержкой и кэш готовых ответов.
+    """
+
+    def __init__(
+        self,
+        base_url: str = BASE_URL,
+        timeout: float = float(environ.get("LLM_TIMEOUT", 60)),
+        max_connections: int = int(environ.get("LLM_MAX_CONNECTIONS", 20)),
+        max_concurrency: int = int(environ.get("LLM_MAX_CONCURRENCY", 8)),
+        retries: int = int(environ.get("LLM_RETRIES", 3)),
+        backoff: float = 0.5,
+        cache: TTLCache | None = None,
+        transport: httpx.AsyncBaseTransport | None = None
+    ) -> None:
+        self.base_url = base_url
+        self.retries = retries
+        self.backoff = backoff
+        self.cache = cache if cache is not None else TTLCache(
+            maxsize=int(environ.get("LLM_CACHE_SIZE", 1024)),
+            ttl=float(environ.get("LLM_CACHE_TTL", 3600))
+        )
+        self._timeout = httpx.Timeout(timeout, connect=min(timeout, 10.0))
+        self._limits = httpx.Limits(max_connections=max_connections,
+                                    max_keepalive_connections=max_connections)
+        self._transport = transport
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._http: httpx.AsyncClient | None = None
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(timeout=self._timeout, limits=self._limits,
+                                           transport=self._transport)
+        return self._http
+
+    @staticmethod
+    def _headers(api_key: str) -> dict:
+        return {
+            "Content-Type": "application/json",
+            "Authorization": "Api-Key " + api_key
+        }
+
+    async def _sleep_before_retry(self, attempt: int) -> None:
+        delay = self.backoff * 2 ** attempt
+        await asyncio.sleep(delay + random.uniform(0, self.backoff))
+
+    async def post(self, prompt: dict, api_key: str) -> httpx.Response:
+        """
+        POST с повторами на сетевых ошибках и статусах из RETRY_STATUSES.
+        Ответ с ошибочным статусом после всех попыток поднимает HTTPStatusError.
+        """
+        async with self._semaphore:
+            for attempt in range(self.retries + 1):
+                last = attempt == self.retries
+                try:
+                    resp = await self.http.post(self.base_url, headers=self._headers(api_key),
+                                                json=prompt)
+                except httpx.TransportError:
+                    if last:
+                        raise
+                    await self._sleep_before_retry(attempt)
+                    continue
+
+                if resp.status_code in RETRY_STATUSES and not last:
+                    await self._sleep_before_retry(attempt)
+                    continue
+
+                resp.raise_for_status()
+                return resp
+
+    async def complete(
+        self,
+        user_text: str,
+        api_key: str,
+        folder_id: str,
+        temperature: float = 0.6,
+        max_tokens: int = 2000
+    ) -> str:
+        prompt = build_prompt(user_text, folder_id, temperature, max_tokens)
+        key = prompt_key(prompt, api_key)
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        resp = await self.post(prompt, api_key)
+        answer = parse_answer(resp.json())
+        self.cache.set(key, answer)
+        return answer
+
+    async def stream(
+        self,
+        user_text: str,
+        api_key: str,
+        folder_id: str,
+        temperature: float = 0.6,
+        max_tokens: int = 2000
+    ) -> AsyncIterator[str]:
+        """
+        Отдаёт ответ кусками по мере генерации. YandexGPT в режиме stream
+        присылает строки JSON с накопленным текстом, наружу уходит только
+        прирост; строка, которая не продолжает уже отданный текст, —
+        RuntimeError. Если генератор закрыли (клиент отключился), соединение
+        с апстримом рвётся и генерация дальше не оплачивается.
+        Полный ответ попадает в тот же кэш, что и у complete().
+        """
+        prompt = build_prompt(user_text, folder_id, temperature, max_tokens, stream=True)
+        key = prompt_key(prompt, api_key)
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+        async with self._semaphore:
+            async with self.http.stream("POST", self.base_url, headers=self._headers(api_key),
+                                        json=prompt) as resp:
+                if resp.is_error:
+                    await resp.aread()
+                    resp.raise_for_status()
+
+                sent = ""
+                async for line in resp.aiter_lines():
+                    if not line.strip():
+                        continue
+                    text = parse_answer(json.loads(line))
+                    if not text.startswith(sent):
+                        # Прирост не вычислить: отправленное клиенту уже не исправить
+                        raise RuntimeError("Поток YandexGPT прислал текст, не продолжающий "
+                                           f"уже отданный ({len(sent)} символов)")
+                    delta = text[len(sent):]
+                    sent = text
+                    if delta:
+                        yield delta
+
+        self.cache.set(key, sent)
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+llm_client = YandexGPTClient()
+
+
+async def query_yandex(
+    user_text: str,
+    api_key: str,
+    folder_id: str,
+    temperature: float = 0.6,
+    max_tokens: int = 2000
+) -> str:
+    """
+    Отправляет текст пользователя в YandexGPT через API Yandex Cloud
+    и возвращает ответ ассистента в виде строки.
+    """
+    return await llm_client.complete(user_text, api_key, folder_id,
+                                     temperature=temperature, max_tokens=max_tokens)
+
+
+def stream_yandex(
+    user_text: str,
+    api_key: str,
+    folder_id: str,
+    temperature: float = 0.6,
+    max_tokens: int = 2000
+) -> AsyncIterator[str]:
+    """
+    Потоковый вариант query_yandex: асинхронный итератор по кускам ответа.
+    """
+    return llm_client.stream(user_text, api_key, folder_id,
+                             temperature=temperature, max_tokens=max_tokens)
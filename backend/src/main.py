@@ -1,19 +1,36 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routers import root, stats, raw, load_raw_tables
-from database import test_db
+from routers import root, stats, raw, health, monitoring, assets
+from metrics import MetricsMiddleware
+from llm_request import llm_client
+from cache import result_cache
+from audit import decision_log
+
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Данные, модель и сырые таблицы грузятся в фоне, запросы принимаются сразу;
+    # готовность — /health/ready
+    assets.start()
+    decision_log.start()
+    yield
+    # Сначала дописываем журнал решений: запросов уже нет, очередь только убывает
+    await decision_log.stop()
+    assets.stop()
+    await llm_client.aclose()
+    await result_cache.aclose()
 
-# Testing infrastructure
-test_db()
-load_raw_tables()
 
 app = FastAPI(
     title="Company Analysis & LLM Chat API",
+    lifespan=lifespan,
     version="1.0.0",
     openapi_tags=[
         {"name": "Financial Analysis", "description": "Анализ вероятности дефолта и влияющих факторов"},
         {"name": "Company statistics", "description": "Статистика по категориям для заданного ИНН"},
+        {"name": "Health", "description": "Liveness и readiness"},
     ],
 )
 
@@ -26,6 +43,11 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+# Время запросов по эндпоинтам для /metrics и, с SERVER_TIMING=1, заголовок Server-Timing
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(root)
 app.include_router(stats)
 app.include_router(raw)
+app.include_router(health)
+app.include_router(monitoring)
@@ -0,0 +1,197 @@
+"""
+Лёгкие метрики без внешних зависимостей: гистограммы времени по этапам
+обработки (span) и по эндпоинтам, отдаваемые в текстовом формате
+Prometheus из /metrics.
+
+    with span("predict"):
+        proba = model.predict_proba(X)
+
+Если SERVER_TIMING=1, длительности этапов текущего запроса уходят клиенту
+в заголовке Server-Timing. Метрики у каждого процесса uvicorn свои.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from os import environ
+from typing import Any, Dict, Iterable
+
+from starlette.datastructures import MutableHeaders
+
+SERVER_TIMING = environ.get("SERVER_TIMING", "0") == "1"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Границы корзин гистограмм времени, секунды
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Время этапов текущего запроса для Server-Timing: этап -> секунды
+_timings: ContextVar[Dict[str, float] | None] = ContextVar("timings", default=None)
+
+
+class Histogram:
+    """Гистограмма одного ряда: счётчики по корзинам, число и сумма наблюдений."""
+
+    def __init__(self, buckets: Iterable[float] = LATENCY_BUCKETS) -> None:
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class HistogramFamily:
+    """Именованная гистограмма с метками: по ряду на каждое сочетание значений меток."""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = LATENCY_BUCKETS) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[tuple[str, ...], Histogram] = {}
+
+    def labels(self, *values: str) -> Histogram:
+        series = self._series.get(values)
+        if series is None:
+            series = self._series.setdefault(values, Histogram(self.buckets))
+        return series
+
+    def expose(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, h in sorted(self._series.items()):
+            running = 0
+            for bound, n in zip([*h.buckets, "+Inf"], h.counts):
+                running += n
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, le)} {running}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {h.sum}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {h.count}")
+        return lines
+
+
+class CounterFamily:
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple[str, ...], int] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *values: str, amount: int = 1) -> None:
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+    def expose(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for values, n in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, values)} {n}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.families: list[Any] = []
+
+    def histogram(self, *args, **kwargs) -> HistogramFamily:
+        family = HistogramFamily(*args, **kwargs)
+        self.families.append(family)
+        return family
+
+    def counter(self, *args, **kwargs) -> CounterFamily:
+        family = CounterFamily(*args, **kwargs)
+        self.families.append(family)
+        return family
+
+    def expose(self) -> str:
+        return "\n".join(line for family in self.families for line in family.expose()) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    "backend_stage_seconds", "Время этапов обработки запроса", ["stage"])
+REQUEST_SECONDS = registry.histogram(
+    "backend_http_request_seconds", "Время обработки HTTP-запроса", ["method", "route"])
+REQUESTS = registry.counter(
+    "backend_http_requests_total", "Число HTTP-запросов", ["method", "route", "status"])
+
+
+class span:
+    """
+    Засекает время блока: наблюдение в backend_stage_seconds{stage} и, если
+    идёт запрос, в его Server-Timing. Повторные этапы одного запроса суммируются.
+    """
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage: str) -> None:
+        self.stage = stage
+
+    def __enter__(self) -> "span":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        elapsed = time.perf_counter() - self.started
+        STAGE_SECONDS.labels(self.stage).observe(elapsed)
+        timings = _timings.get()
+        if timings is not None:
+            timings[self.stage] = timings.get(self.stage, 0.0) + elapsed
+
+
+def server_timing(timings: Dict[str, float], total: float) -> str:
+    parts = [f"{stage};dur={seconds * 1000:.3f}" for stage, seconds in timings.items()]
+    parts.append(f"total;dur={total * 1000:.3f}")
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware: время и статус каждого HTTP-запроса по шаблону пути
+    эндпоинта (не по самому пути, чтобы ИНН не плодили ряды) и Server-Timing.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timings: Dict[str, float] = {}
+        token = _timings.set(timings)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if SERVER_TIMING:
+                    MutableHeaders(scope=message).append(
+                        "Server-Timing", server_timing(timings, time.perf_counter() - started))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _timings.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            REQUEST_SECONDS.labels(scope["method"], path).observe(time.perf_counter() - started)
+            REQUESTS.inc(scope["method"], path, str(status))
@@ -0,0 +1,28 @@
+from sqlalchemy import JSON, BigInteger, Column, DateTime, Float, Index, Integer, String
+from sqlalchemy.dialects.postgresql import JSONB
+
+from database import Base
+
+
+class ScoringDecision(Base):
+    """
+    Журнал выданных решений: вердикт, скор и главные факторы SHAP на момент
+    ответа клиенту. Пишется фоном пачками (см. audit.py).
+    """
+    __tablename__ = "scoring_decisions"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    inn = Column(String(12), nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    source = Column(String(16), nullable=False)     # analyze, batch, company, explain
+    verdict = Column(String(16), nullable=False)
+    score = Column(Float, nullable=False)
+    top_factors = Column(JSON().with_variant(JSONB, "postgresql"), nullable=False)
+    model_version = Column(String(32), nullable=False)
+    data_version = Column(String(32), nullable=False)
+
+    __table_args__ = (
+        # история по ИНН и выборки за период
+        Index("ix_scoring_decisions_inn_created_at", "inn", "created_at"),
+        Index("ix_scoring_decisions_created_at", "created_at"),
+    )
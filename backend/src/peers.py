@@ -0,0 +1,145 @@
+"""
+Сравнение компании с группами похожих: по отрасли, региону, категории МСП
+и размеру штата. Индекс строится один раз при загрузке: для каждой
+группировки и признака хранятся перцентиль каждой строки внутри её группы
+(uint16, сотые доли процента) и квартили каждой группы. Самих значений
+индекс не копирует — сравнение сводится к чтению готовых чисел.
+"""
+from typing import Any, Dict, Iterable
+
+import numpy as np
+import pandas as pd
+
+from company import CompanyStatsFromLocal
+from serialize import to_python
+
+# Колонки, по которым собираются группы похожих компаний
+PEER_GROUPINGS = ("main_okved2", "region2", "msp_category", "emp_bin")
+
+# Перцентиль хранится в сотых долях процента: 0..10000
+_NO_PERCENTILE = np.iinfo(np.uint16).max
+QUANTILES = (0.25, 0.5, 0.75)
+
+
+class _Grouping:
+    """
+    Одна группировка: код группы каждой строки, размеры групп и по каждому
+    признаку — перцентиль строки в группе, число известных значений и
+    квартили группы.
+    """
+
+    def __init__(self, keys: np.ndarray, features: Dict[str, np.ndarray]) -> None:
+        codes, self.groups = pd.factorize(keys)
+        self.codes = codes                                  # код группы каждой строки, -1 — нет
+        self.sizes = np.bincount(codes[codes >= 0], minlength=len(self.groups))
+
+        self.percentiles: Dict[str, np.ndarray] = {}
+        self.counts: Dict[str, np.ndarray] = {}
+        self.quantiles: Dict[str, np.ndarray] = {}
+        for name, column in features.items():
+            self._index_feature(name, column)
+
+    def _index_feature(self, name: str, column: np.ndarray) -> None:
+        n_groups = len(self.groups)
+        rows = np.flatnonzero((self.codes >= 0) & ~pd.isna(column))
+        values = column[rows]
+        order = np.lexsort((values, self.codes[rows]))
+        rows, values, codes = rows[order], values[order], self.codes[rows[order]]
+
+        # Известные значения группы g занимают [starts[g], starts[g + 1]) в values
+        counts = np.bincount(codes, minlength=n_groups)
+        starts = np.concatenate(([0], np.cumsum(counts)))
+
+        # Средний ранг: равные значения делят перцентиль поровну. Для каждой
+        # строки — границы её серии равных значений внутри группы
+        new_run = np.ones(len(values), dtype=bool)
+        new_run[1:] = (codes[1:] != codes[:-1]) | (values[1:] != values[:-1])
+        run_starts = np.flatnonzero(new_run)
+        run_ends = np.append(run_starts[1:], len(values))
+        run = np.cumsum(new_run) - 1
+        below = run_starts[run] - starts[codes]
+        upto = run_ends[run] - starts[codes]
+
+        percentiles = np.full(len(column), _NO_PERCENTILE, dtype=np.uint16)
+        if len(values):
+            percentiles[rows] = np.rint((below + upto) * 5000 / counts[codes]).astype(np.uint16)
+
+        # Квантили с линейной интерполяцией, как np.quantile
+        quantiles = np.full((n_groups, len(QUANTILES)), np.nan)
+        known = np.flatnonzero(counts)
+        for j, q in enumerate(QUANTILES):
+            idx = q * (counts[known] - 1)
+            lo = np.floor(idx).astype(np.int64)
+            hi = np.minimum(lo + 1, counts[known] - 1)
+            low = values[starts[known] + lo].astype(np.float64)
+            high = values[starts[known] + hi].astype(np.float64)
+            quantiles[known, j] = low + (high - low) * (idx - lo)
+
+        self.percentiles[name] = percentiles
+        self.counts[name] = counts
+        self.quantiles[name] = quantiles
+
+    def describe(self, pos: int, code: int, feature: str, value: Any) -> Dict[str, Any]:
+        n = int(self.counts[feature][code])
+        stats: Dict[str, Any] = {"value": value, "peers": n, "percentile": None,
+                                 "median": None, "p25": None, "p75": None}
+        if n == 0:
+            return stats
+
+        p25, median, p75 = self.quantiles[feature][code].tolist()
+        stats.update(median=median, p25=p25, p75=p75)
+        percentile = int(self.percentiles[feature][pos])
+        if percentile != _NO_PERCENTILE:
+            stats["percentile"] = percentile / 100
+        return stats
+
+
+class PeerIndex:
+    """Перцентили и медианы групп похожих компаний по числовым признакам."""
+
+    def __init__(self, source: CompanyStatsFromLocal,
+                 groupings: Iterable[str] = PEER_GROUPINGS) -> None:
+        self.source = source
+        groupings = [g for g in groupings if source.column(g) is not None]
+
+        # Числовые поля категорий, кроме самих группировок
+        self.category_features: Dict[str, list[str]] = {}
+        columns: Dict[str, np.ndarray] = {}
+        for category, fields in source.CATEGORY_FIELDS.items():
+            names = []
+            for field in fields:
+                column = source.column(field)
+                if field in groupings or column is None or column.dtype.kind not in "fiub":
+                    continue
+                if field not in columns:
+                    columns[field] = column
+                names.append(field)
+            self.category_features[category] = names
+
+        self._groupings = {g: _Grouping(source.column(g), columns) for g in groupings}
+
+    def compare(self, inn: str, category: str) -> Dict[str, Any]:
+        """
+        Для каждой группировки: группа компании, её размер и по каждому
+        числовому признаку категории — значение, перцентиль среди группы,
+        медиана и квартили группы.
+        """
+        if category not in self.category_features:
+            raise KeyError(f"Unknown category: {category}")
+
+        pos = self.source.get_position(inn)
+        features = self.category_features[category]
+        values = {f: to_python(self.source.column(f)[pos]) for f in features}
+
+        result: Dict[str, Any] = {}
+        for name, grouping in self._groupings.items():
+            code = int(grouping.codes[pos])
+            if code < 0:
+                result[name] = None
+                continue
+            result[name] = {
+                "group": to_python(grouping.groups[code]),
+                "size": int(grouping.sizes[code]),
+                "features": {f: grouping.describe(pos, code, f, values[f]) for f in features},
+            }
+        return {"inn": inn, "category": category, "groups": result}
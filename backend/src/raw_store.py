@@ -0,0 +1,167 @@
+"""
+data_text сырых таблиц, сгруппированный по ИНН в один бинарный файл на
+таблицу. На каждую таблицу файлы:
+
+    <name>.bin           тексты всех ИНН подряд в UTF-8
+    <name>.keys.npy      отсортированные ИНН
+    <name>.offsets.npy   границы текстов в .bin (len(keys) + 1 значений)
+    <name>.source.json   путь, размер и mtime исходного файла
+
+Всё открывается через mmap, поэтому страницы общие для воркеров uvicorn,
+а поиск — бинарный по keys и не зависит от размера таблицы. Если исходный
+CSV или Parquet изменился, индекс пересобирается при открытии.
+
+    python raw_store.py      # пересобрать все таблицы из RAW_TABLE_FILES
+"""
+import json
+import mmap
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from columnar import prefer_parquet, read_table
+
+# Настройки для преобразованных таблиц для BERT
+RAW_TABLE_FILES: dict[str, str] = {
+    "contracts":    "../data/contracts.csv",
+    "egrul":        "../data/egrul.csv",
+    "enforcements": "../data/enforcements.csv",
+    "finances":     "../data/finances.csv",
+    "kad_arbitr":   "../data/kad_arbitr.csv",
+}
+
+RAW_INDEX_DIR = os.environ.get("RAW_INDEX_DIR", "../data/raw")
+
+
+def _paths(directory: Path, name: str) -> tuple[Path, Path, Path]:
+    return (directory / f"{name}.bin",
+            directory / f"{name}.keys.npy",
+            directory / f"{name}.offsets.npy")
+
+
+def _source_path(directory: Path, name: str) -> Path:
+    return directory / f"{name}.source.json"
+
+
+def _source_stat(csv_path: str | Path) -> dict:
+    stat = os.stat(csv_path)
+    return {"path": str(csv_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _replace_atomically(path: Path, write) -> None:
+    """
+    Пишет файл через уникальный временный файл в той же папке и os.replace:
+    воркеры, собирающие индекс одновременно, не пишут в один и тот же файл.
+    """
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f".{path.name}.",
+                                     suffix=".tmp", delete=False) as f:
+        tmp_path = Path(f.name)
+        try:
+            write(f)
+        except BaseException:
+            f.close()
+            tmp_path.unlink(missing_ok=True)
+            raise
+    # mkstemp создаёт файл с правами 0600, а индекс могут читать воркеры под другим пользователем
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+
+
+def build_table(csv_path: str | Path, directory: str | Path, name: str) -> int:
+    """
+    Группирует строки CSV или Parquet по ИНН (несколько строк склеиваются
+    через перевод строки) и пишет .bin и индекс. Из файла читаются только
+    inn и data_text. Возвращает число ИНН.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    # Снимок до чтения: если файл поменяют во время сборки, индекс пересоберётся
+    source = _source_stat(csv_path)
+
+    df = read_table(csv_path, ["inn", "data_text"])
+    df = df.dropna(subset=["data_text"])
+    df["inn"] = df["inn"].astype(str).str.strip()
+    grouped = df.groupby("inn", sort=True)["data_text"].agg(lambda rows: "\n".join(map(str, rows)))
+
+    keys = np.array([inn.encode() for inn in grouped.index], dtype=bytes)
+    offsets = np.zeros(len(grouped) + 1, dtype=np.uint64)
+
+    def write_texts(f) -> None:
+        for i, text in enumerate(grouped):
+            offsets[i + 1] = offsets[i] + f.write(text.encode())
+
+    bin_path, keys_path, offsets_path = _paths(directory, name)
+    _replace_atomically(bin_path, write_texts)
+    _replace_atomically(keys_path, lambda f: np.save(f, keys))
+    _replace_atomically(offsets_path, lambda f: np.save(f, offsets))
+    # Последним: пока его нет или он от другого источника, индекс считается устаревшим
+    _replace_atomically(_source_path(directory, name),
+                        lambda f: f.write(json.dumps(source).encode()))
+    return len(keys)
+
+
+class RawTextTable:
+    """Read-only доступ к data_text одной таблицы по ИНН."""
+
+    def __init__(self, directory: str | Path, name: str) -> None:
+        bin_path, keys_path, offsets_path = _paths(Path(directory), name)
+        self._keys = np.load(keys_path, mmap_mode="r")
+        self._offsets = np.load(offsets_path, mmap_mode="r")
+
+        with open(bin_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def get(self, inn: str) -> str | None:
+        key = inn.strip().encode()
+        if not key or len(key) > self._keys.dtype.itemsize:
+            return None
+
+        i = int(np.searchsorted(self._keys, key))
+        if i == len(self._keys) or self._keys[i] != key:
+            return None
+
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        return self._data[start:end].decode()
+
+
+def open_raw_tables(directory: str | Path = RAW_INDEX_DIR,
+                    sources: dict[str, str] = RAW_TABLE_FILES) -> dict[str, RawTextTable]:
+    """Открывает индексы всех таблиц, собирая недостающие из Parquet или CSV."""
+    return {name: open_raw_table(name, csv_path, directory) for name, csv_path in sources.items()}
+
+
+def is_fresh(name: str, source_path: str | Path, directory: str | Path = RAW_INDEX_DIR) -> bool:
+    """Индекс собран и собран из текущей версии source_path."""
+    directory = Path(directory)
+    if not all(path.is_file() for path in _paths(directory, name)):
+        return False
+    try:
+        built_from = json.loads(_source_path(directory, name).read_text())
+    except (OSError, ValueError):
+        return False
+    return built_from == _source_stat(source_path)
+
+
+def open_raw_table(name: str, csv_path: str | Path,
+                   directory: str | Path = RAW_INDEX_DIR) -> RawTextTable:
+    """Открывает индекс одной таблицы, собрав его заново, если его нет или он устарел."""
+    source_path = prefer_parquet(csv_path)
+    if not is_fresh(name, source_path, directory):
+        build_table(source_path, directory, name)
+    return RawTextTable(directory, name)
+
+
+def main() -> None:
+    for name, csv_path in RAW_TABLE_FILES.items():
+        count = build_table(prefer_parquet(csv_path), RAW_INDEX_DIR, name)
+        print(f"{name}: {count} ИНН")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,47 @@
+import asyncio
+import codecs
+import hashlib
+import json
+from contextlib import contextmanager
+from datetime import datetime
 from os import environ
-from collections import defaultdict
-from typing import Dict, Any
-
-import numpy as np
-import pandas as pd
-
-import requests
-from fastapi import FastAPI, APIRouter, Query, HTTPException, Depends
-from fastapi.responses import PlainTextResponse
+from functools import partial
+from typing import AsyncIterator, Iterator
+
+import httpx
+from fastapi import APIRouter, Query, HTTPException, Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse, Response, JSONResponse
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
 
 import shap
 from catboost import CatBoostClassifier
 
-from schemas import AnalyzeResponse, Verdict, ChatResponse
+from schemas import (AnalyzeResponse, AnalyzeBatchRequest, AnalyzeBatchItem, ChatResponse,
+                     ExplainResponse, CompanyResponse, DecisionRecord)
 from company import CompanyStatsFromLocal, CompanyNotFoundError
-from database import get_db
-from llm_request import query_yandex
-
-# Настройки для преобразованных таблиц для BERT
-RAW_TABLE_FILES: dict[str, str] = {
-    "contracts":    "../data/contracts.csv",
-    "egrul":        "../data/egrul.csv",
-    "enforcements": "../data/enforcements.csv",
-    "finances":     "../data/finances.csv",
-    "kad_arbitr":   "../data/kad_arbitr.csv",
-}
-
-raw_tables = {}
+from scoring import score_frame, score_matrix, verdict_for
+from serialize import analysis_json, dumps
+from score_store import ScoreStore, file_fingerprint
+from raw_store import RAW_TABLE_FILES, RawTextTable, open_raw_table
+from columnar import prefer_parquet
+from peers import PeerIndex
+from importance import load_importance
+from database import get_db, test_db
+from assets import AssetLoader
+from audit import decision_log, query_decisions
+from metrics import CONTENT_TYPE, registry, span
+from llm_request import query_yandex, stream_yandex
+from cache import TTLCache, result_cache, encode_response
+from explain import build_explain_prompt, top_influencers
+
+raw_tables: dict[str, RawTextTable] = {}
+
+# Сколько ИНН скорим одной матрицей в /analyze/batch
+ANALYZE_BATCH_SIZE = int(environ.get("ANALYZE_BATCH_SIZE", 1024))
 
 # Конфигурация YandexGPT
-BASE_URL = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
-
 API_KEY = environ.get("YANDEX_CLOUD_API_KEY")
 if not API_KEY:
     raise KeyError("Environment variable YANDEX_CLOUD_API_KEY not specified")
@@ -40,41 +50,164 @@ FOLDER_ID = environ.get("YANDEX_CLOUD_FOLDER_ID")
 if not FOLDER_ID:
     raise KeyError("Environment variable YANDEX_CLOUD_FOLDER_ID not specified")
 
-# Инициализация источника данных и модели
-stats_source = CompanyStatsFromLocal("../data/full_transformed_wo_target.csv")
+# Источник данных, модель и прочие тяжёлые ресурсы грузятся в фоне
+# (см. assets.py и регистрацию ниже); до загрузки здесь None
+MODEL_PATH = "../models/catboost_model-2.cbm"
+DATA_PATH = "../data/full_transformed_wo_target.csv"
+
+model_version = file_fingerprint(MODEL_PATH)
+credit_model: CatBoostClassifier | None = None
+explainer: shap.TreeExplainer | None = None
+stats_source: CompanyStatsFromLocal | None = None
+data_version = ""
+peer_index: PeerIndex | None = None
+score_store: ScoreStore | None = None
+global_importance: dict | None = None
+global_importance_json: str | None = None
+
+
+def _load_model() -> None:
+    global credit_model
+    model = CatBoostClassifier()
+    model.load_model(MODEL_PATH)
+    credit_model = model
+
+
+def _load_explainer() -> None:
+    global explainer
+    explainer = shap.TreeExplainer(credit_model)
+
+
+def _load_stats() -> None:
+    global stats_source, data_version
+    # Parquet-копия (python columnar.py), если она свежее CSV; читаем только нужные колонки
+    source = CompanyStatsFromLocal(
+        prefer_parquet(DATA_PATH),
+        columns=CompanyStatsFromLocal.required_columns(credit_model.feature_names_)
+    )
+    data_version = source.data_version
+    stats_source = source
+
+
+def _load_peers() -> None:
+    global peer_index
+    peer_index = PeerIndex(stats_source)
+
+
+def _load_score_store() -> None:
+    # Материализованные скоры (см. score_store.py); без них скорим на лету
+    global score_store
+    store = ScoreStore.open(environ.get("SCORE_STORE_DIR", "../data/scores"), model_version)
+    if store is not None:
+        store.bind(stats_source)
+    score_store = store
+
+
+def _load_importance() -> None:
+    # Глобальная важность признаков (см. importance.py); без неё /model/importance — 404
+    global global_importance, global_importance_json
+    importance = load_importance(environ.get("IMPORTANCE_DIR", "../data/importance"),
+                                 model_version)
+    if importance is not None:
+        global_importance_json = dumps(importance)
+    global_importance = importance
+
+
+def _load_raw_table(name: str) -> None:
+    """
+    Открывает через mmap сгруппированные по ИНН data_text таблицы
+    (см. raw_store.py); недостающий индекс собирается из Parquet или CSV.
+    """
+    raw_tables[name] = open_raw_table(name, RAW_TABLE_FILES[name])
+
+
+assets = AssetLoader()
+assets.register("database", test_db)
+assets.register("decision_log", decision_log.create_table, after=["database"])
+assets.register("model", _load_model)
+assets.register("explainer", _load_explainer, after=["model"])
+assets.register("stats", _load_stats, after=["model"])
+assets.register("peers", _load_peers, after=["stats"])
+assets.register("score_store", _load_score_store, after=["stats"])
+assets.register("importance", _load_importance)
+for _table in RAW_TABLE_FILES:
+    assets.register(f"raw:{_table}", partial(_load_raw_table, _table))
+
+# Что нужно для скоринга; score_store необязателен — без него скорим на лету
+SCORING = ("model", "explainer", "stats")
+# От чего зависит /health/ready; без остальных ресурсов (сырые таблицы, пиры,
+# журнал решений...) сервер работает, отвечая 503 только на их эндпоинтах
+READY_ASSETS = ("database", *SCORING)
+
+
+def results_version() -> str:
+    """Ключ кэша ответов: ответы зависят и от модели, и от данных."""
+    return f"{model_version}.{data_version}"
+
+
+# Ключ кэша ответов по ИНН: эндпоинты ищут ИНН без пробелов по краям,
+# так что "?inn=%20123" и "?inn=123" — один и тот же ответ
+INN_KEY = {"inn": str.strip}
 
-credit_model = CatBoostClassifier()
-credit_model.load_model("../models/catboost_model-2.cbm")
 
-explainer = shap.TreeExplainer(credit_model)
+async def record_decision(inn: str, source: str, payload) -> None:
+    """Решение, отданное клиенту, — в журнал решений (см. audit.py)."""
+    await decision_log.record(inn, source, payload, model_version, data_version)
+
+
+# Готовые объяснения по (ИНН, версия модели, версия данных, хеш API-ключа):
+# ответ, оплаченный одним ключом, не отдаётся запросу с другим
+explain_cache = TTLCache(
+    maxsize=int(environ.get("EXPLAIN_CACHE_SIZE", 4096)),
+    ttl=float(environ.get("EXPLAIN_CACHE_TTL", 24 * 3600))
+)
 
 # Роутеры
 root = APIRouter(prefix="/v1", tags=["Financial Analysis"])
-stats = APIRouter(prefix="/v1/stats", tags=["Company statistics"])
+stats = APIRouter(prefix="/v1/stats", tags=["Company statistics"],
+                  dependencies=[assets.require("stats")])
 raw = APIRouter(prefix="/v1/raw", tags=["Ra data"])
+health = APIRouter(prefix="/health", tags=["Health"])
+monitoring = APIRouter(tags=["Health"])
+
+
+@health.get("/live", summary="Процесс жив")
+async def live():
+    return {"status": "ok"}
 
 
-def load_raw_tables() -> None:
+@health.get("/ready", summary="Готовность ресурсов и время их загрузки")
+async def ready():
     """
-    Построчно подгружает большие CSV и сохраняет только колонку data_text
-    (привязывая её к ИНН) в оперативную память.
+    Состояние каждого ресурса (pending / loading / ready / failed) и сколько
+    он грузился. 200 — загружены база и всё для скоринга (READY_ASSETS),
+    иначе 503; упавшие необязательные ресурсы — в failed, но на код не влияют.
     """
-    for name, path in RAW_TABLE_FILES.items():
-        df = pd.read_csv(path)
-        raw_tables[name] = df["data_text"]
+    status = assets.status(required=READY_ASSETS)
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@monitoring.get("/metrics", summary="Метрики в формате Prometheus",
+                response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """
+    Гистограммы времени этапов (backend_stage_seconds) и HTTP-запросов
+    по эндпоинтам этого процесса.
+    """
+    return PlainTextResponse(registry.expose(), media_type=CONTENT_TYPE)
 
 
 def _get_data_text(table: str, inn: str) -> PlainTextResponse:
-    tbl = raw_tables.get(table)
-    return PlainTextResponse(tbl["
-    if tbl is None:
+    if f"raw:{table}" not in assets:
         raise HTTPException(status_code=404, detail=f"Неизвестная таблица “{table}”")
-    rows = tbl.get(inn)
-    if not rows:
+    assets.ensure(f"raw:{table}")
+    tbl = raw_tables[table]
+    text = tbl.get(inn)
+    if text is None:
         raise HTTPException(status_code=404,
                             detail=f"ИНН {inn} не найден в таблице “{table}”")
-    # если строк несколько — склеиваем через перевод строки
-    return PlainTextResponse("\n".join(rows))
+    # если строк несколько — они уже склеены через перевод строки
+    return PlainTextResponse(text)
 
 
 def expect_not_found(func, inn: str):
@@ -84,69 +217,257 @@ def expect_not_found(func, inn: str):
         raise HTTPException(status_code=404, detail=f"Компания с ИНН {inn} не найдена")
 
 
+@result_cache.cached("analyze", "inn", "top_k", version=results_version, normalize=INN_KEY)
+async def _analyze_cached(inn: str, top_k: int | None) -> Response:
+    # Получаем позицию строки с данными или 404
+    with span("lookup"):
+        pos = expect_not_found(stats_source.get_position, inn)
+    # Промах хранилища — predict_proba и SHAP, не в event loop
+    return _json(await run_in_threadpool(_analysis_json, inn, pos, top_k))
+
+
 @root.get(
     "/analyze",
     response_model=AnalyzeResponse,
-    summary="Анализ компании"
+    summary="Анализ компании",
+    dependencies=[assets.require(*SCORING)]
 )
 async def analyze_company(
-    db: Session = Depends(get_db),
-    inn: str = Query(..., description="ИНН компании")
+    inn: str = Query(..., description="ИНН компании"),
+    top_k: int | None = Query(None, ge=1, description="Оставить только top_k признаков по |SHAP|")
+):
+    # Ответ может прийти из кэша, но в журнал попадает каждое выданное решение
+    response = await _analyze_cached(inn=inn, top_k=top_k)
+    await record_decision(inn, "analyze", response.body)
+    return response
+
+
+@root.get("/model/importance", summary="Глобальная важность признаков модели",
+          dependencies=[assets.require("importance")])
+async def model_importance(
+    top_k: int | None = Query(None, ge=1, description="Оставить только top_k признаков")
 ):
-    # Получаем строку с данными или 404
-    row = expect_not_found(stats_source.get_row, inn)
+    """
+    mean |SHAP|, распределение SHAP по признакам и агрегаты по сегментам,
+    заранее посчитанные для текущей версии модели.
+    """
+    if global_importance is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Важность признаков для модели {model_version} не посчитана (python importance.py)"
+        )
+    if top_k is None:
+        return _json(global_importance_json)
+    return {**global_importance, "features": global_importance["features"][:top_k]}
+
+
+def _json(body: str) -> Response:
+    return Response(content=body, media_type="application/json")
+
+
+def _analysis_json(inn: str, pos: int, top_k: int | None = None) -> str:
+    """
+    JSON AnalyzeResponse прямо из массивов скора и SHAP: из материализованного
+    хранилища, если строка там есть, иначе скорим на лету.
+    """
+    if score_store is not None:
+        with span("store"):
+            found = score_store.lookup(inn)
+        if found is not None:
+            score, verdict, shap_row = found
+            with span("serialize"):
+                return analysis_json(score, verdict, shap_row, score_store.features, top_k)
+
+    with span("frame"):
+        X = stats_source.get_rows([pos])
+    proba, shap_full, columns = score_matrix(credit_model, explainer, X)
+    with span("serialize"):
+        return analysis_json(proba[0], verdict_for(proba[0]), shap_full[0], columns, top_k)
+
+
+def _score_one(inn: str, pos: int) -> AnalyzeResponse:
+    if score_store is not None:
+        cached = score_store.get(inn)
+        if cached is not None:
+            return cached
+
+    with span("frame"):
+        X = stats_source.get_rows([pos])
+    return score_frame(credit_model, explainer, X)[0]
 
-    # Подготавливаем фичи
-    X = row.to_frame().T.reset_index(drop=True)
 
-    # 1. Предсказываем вероятность default
-    p_quasi_default = credit_model.predict_proba(X)[0][1]
-    verdict = Verdict.decline if p_quasi_default >= 0.3 else Verdict.approve
+def company_etag(inn: str, pos: int) -> str:
+    """
+    ETag карточки компании: меняется только вместе с моделью или
+    содержимым строки этой компании.
+    """
+    fingerprint = int(stats_source.row_fingerprints()[pos])
+    raw = f"{inn}:{model_version}:{fingerprint:016x}".encode()
+    return '"' + hashlib.sha256(raw).hexdigest()[:32] + '"'
+
+
+def etag_matches(etag: str, if_none_match: str | None) -> bool:
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+
+def _company_json(inn: str, pos: int) -> str:
+    # {"inn":..., поля AnalyzeResponse..., "stats":{...}} — см. CompanyResponse
+    analysis = _analysis_json(inn, pos)
+    with span("stats"):
+        stats_json = stats_source.all_stats_json(pos)
+    return f'{{"inn":{dumps(inn)},{analysis[1:-1]},"stats":{stats_json}}}'
+
+
+@root.get(
+    "/company/{inn}",
+    response_model=CompanyResponse,
+    summary="Карточка компании: скор, SHAP и вся статистика",
+    dependencies=[assets.require(*SCORING)]
+)
+async def company_dashboard(request: Request, inn: str):
+    """
+    Всё, что нужно странице компании, одним ответом. Поддерживает
+    `If-None-Match`: если ни модель, ни данные компании не менялись — 304.
+    """
+    pos = expect_not_found(stats_source.get_position, inn)
+    etag = company_etag(inn, pos)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if etag_matches(etag, request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+
+    async def compute() -> bytes:
+        return encode_response(_json(await run_in_threadpool(_company_json, inn, pos)))
+
+    value = await result_cache.get_or_compute(f"{result_cache.namespace}:company:{etag}", compute)
+    _, _, body = value.partition(b"\n")
+    await record_decision(inn, "company", body)
+    return Response(content=body, media_type="application/json", headers=headers)
 
-    # 2. Вычисляем SHAP-значения
-    shap_vals = explainer.shap_values(X)
-    shap_full = shap_vals[1] if isinstance(shap_vals, list) else shap_vals
 
-    # 3. Убираем колонку 'id', если есть
-    if 'id' in X.columns:
-        idx = X.columns.get_loc('id')
-        features = X.drop(columns=['id'])
-        shap_feats = np.delete(shap_full, idx, axis=1)
+def _analyze_chunk(inns: list[str]) -> list[AnalyzeBatchItem]:
+    """
+    Скорит пачку ИНН одной матрицей признаков; ненайденные ИНН
+    возвращаются с ошибкой на своём месте.
+    """
+    items: list[AnalyzeBatchItem | None] = []
+    positions, slots = [], []
+    for inn in inns:
+        try:
+            pos = stats_source.get_position(inn)
+        except CompanyNotFoundError as err:
+            items.append(AnalyzeBatchItem(inn=inn, error=str(err)))
+            continue
+
+        cached = score_store.get(inn) if score_store is not None else None
+        if cached is not None:
+            items.append(AnalyzeBatchItem(inn=inn, result=cached))
+            continue
+
+        positions.append(pos)
+        slots.append(len(items))
+        items.append(None)
+
+    with span("frame"):
+        X = stats_source.get_rows(positions)
+    results = score_frame(credit_model, explainer, X)
+    for slot, result in zip(slots, results):
+        items[slot] = AnalyzeBatchItem(inn=inns[slot], result=result)
+    return items
+
+
+async def _iter_inn_lines(request: Request) -> AsyncIterator[str]:
+    """Читает ИНН построчно из тела запроса по мере поступления чанков."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    tail = ""
+    async for chunk in request.stream():
+        lines = (tail + decoder.decode(chunk)).split("\n")
+        tail = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield line.strip()
+    tail += decoder.decode(b"", final=True)
+    if tail.strip():
+        yield tail.strip()
+
+
+async def _stream_batch(inns: list[str]) -> AsyncIterator[str]:
+    for start in range(0, len(inns), ANALYZE_BATCH_SIZE):
+        chunk = inns[start:start + ANALYZE_BATCH_SIZE]
+        for item in await run_in_threadpool(_analyze_chunk, chunk):
+            if item.result is not None:
+                await record_decision(item.inn, "batch", item.result)
+            yield item.model_dump_json() + "\n"
+
+
+@root.post(
+    "/analyze/batch",
+    summary="Пакетный анализ компаний",
+    dependencies=[assets.require(*SCORING)],
+    response_class=StreamingResponse,
+    openapi_extra={
+        "requestBody": {
+            "content": {
+                "application/json": {"schema": AnalyzeBatchRequest.model_json_schema()},
+                "text/plain": {"schema": {"type": "string",
+                                          "description": "По одному ИНН на строку"}},
+            }
+        }
+    },
+)
+async def analyze_batch(request: Request):
+    """
+    Принимает JSON `{"inns": [...]}` или текстовый файл с ИНН построчно
+    и отдаёт NDJSON: по строке `AnalyzeBatchItem` на каждый ИНН.
+    Скоринг идёт пачками по ANALYZE_BATCH_SIZE строк, результаты каждой
+    пачки отправляются клиенту сразу.
+    """
+    if request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            body = AnalyzeBatchRequest.model_validate_json(await request.body())
+        except ValidationError as err:
+            raise HTTPException(status_code=422, detail=err.errors())
+        inns = body.inns
     else:
-        features = X
-        shap_feats = shap_full
-
-    # 4. Берём единственную строку shap-значений и формируем ключевых влияющих
-    shap_single = shap_feats[0]
-    key_influencers = [
-        {feat: float(val) for feat, val in zip(features.columns, shap_single)}
-    ]
-
-    return AnalyzeResponse(
-        verdict=verdict,
-        score=float(p_quasi_default),
-        key_influencers=key_influencers
-    )
+        # Тело дочитываем до ответа: пока отдаётся StreamingResponse,
+        # receive() занят ожиданием отключения клиента
+        inns = [inn async for inn in _iter_inn_lines(request)]
+
+    return StreamingResponse(_stream_batch(inns), media_type="application/x-ndjson")
 
 
 @root.get(
-    "/chat",
-    response_model=ChatResponse,
-    summary="LLM Chat — отправить текст и получить ответ"
+    "/decisions",
+    response_model=list[DecisionRecord],
+    summary="Журнал выданных решений",
+    dependencies=[assets.require("decision_log")]
 )
-async def chat_llm(
-    text: str = Query(..., description="Текст запроса для LLM"),
-    api_key: str = Query(..., description="API-ключ Yandex Cloud", example=API_KEY),
-    folder_id: str = Query(..., description="ID папки в Yandex Cloud", example=FOLDER_ID),
-) -> ChatResponse:
+def list_decisions(
+    db: Session = Depends(get_db),
+    inn: str | None = Query(None, description="ИНН компании"),
+    source: str | None = Query(None, description="Эндпоинт: analyze, batch, company, explain"),
+    since: datetime | None = Query(None, description="Не раньше (включительно)"),
+    until: datetime | None = Query(None, description="Раньше (не включительно)"),
+    limit: int = Query(100, ge=1, le=1000)
+):
     """
-    Отправляет `text` в YandexGPT и возвращает ответ модели.
+    Решения из журнала, новые сначала. Запись фоновая: последние решения
+    появляются здесь с задержкой до DECISION_LOG_FLUSH_INTERVAL секунд.
     """
+    return query_decisions(db, inn=inn, source=source, since=since, until=until, limit=limit)
+
+
+@contextmanager
+def llm_errors() -> Iterator[None]:
+    """Ошибки запроса к YandexGPT -> HTTPException: статус апстрима или 500."""
     try:
-        answer = query_yandex(text, api_key=api_key, folder_id=folder_id)
-    except requests.HTTPError as http_err:
+        yield
+    except httpx.HTTPStatusError as http_err:
         status = http_err.response.status_code
-        detail = http_err.response.text or http_err.response.reason
+        detail = http_err.response.text or http_err.response.reason_phrase
         raise HTTPException(status_code=status, detail=f"YandexGPT error: {detail}")
     except Exception as err:
         raise HTTPException(
@@ -155,95 +476,195 @@ async def chat_llm(
         )
 
 
+@root.get(
+    "/chat",
+    response_model=ChatResponse,
+    summary="LLM Chat — отправить текст и получить ответ"
+)
+async def chat_llm(
+    text: str = Query(..., description="Текст запроса для LLM"),
+    api_key: str = Query(..., description="API-ключ Yandex Cloud", example=API_KEY),
+    folder_id: str = Query(..., description="ID папки в Yandex Cloud", example=FOLDER_ID),
+) -> ChatResponse:
+    """
+    Отправляет `text` в YandexGPT и возвращает ответ модели.
+    """
+    with llm_errors():
+        answer = await query_yandex(text, api_key=api_key, folder_id=folder_id)
     return ChatResponse(answer=answer)
 
 
-# Эндпоинты статистики по категориям
-@stats.get("/financial", summary="Финансовые метрики")
-async def financial(
-    inn: str = Query(..., description="ИНН компании")
+@root.get(
+    "/explain",
+    response_model=ExplainResponse,
+    summary="Объяснение скора компании от LLM",
+    dependencies=[assets.require(*SCORING)]
+)
+async def explain_company(
+    inn: str = Query(..., description="ИНН компании"),
+    api_key: str = Query(API_KEY, description="API-ключ Yandex Cloud"),
+    folder_id: str = Query(FOLDER_ID, description="ID папки в Yandex Cloud"),
+) -> ExplainResponse:
+    """
+    Скор, SHAP и статистика компании собираются на сервере и уходят
+    в YandexGPT одним запросом. Ответ кэшируется до смены модели или данных.
+    """
+    pos = expect_not_found(stats_source.get_position, inn)
+
+    key = (inn.strip(), model_version, data_version, hashlib.sha256(api_key.encode()).hexdigest())
+    cached = explain_cache.get(key)
+    if cached is not None:
+        await record_decision(inn, "explain", cached)
+        return cached
+
+    result, all_stats = await asyncio.gather(
+        run_in_threadpool(_score_one, inn, pos),
+        run_in_threadpool(stats_source.get_all_stats, inn),
+    )
+    prompt = build_explain_prompt(inn, result, all_stats)
+
+    with llm_errors():
+        answer = await query_yandex(prompt, api_key=api_key, folder_id=folder_id)
+
+    response = ExplainResponse(
+        inn=inn,
+        verdict=result.verdict,
+        score=result.score,
+        key_influencers=[dict(top_influencers(result))],
+        answer=answer
+    )
+    explain_cache.set(key, response)
+    await record_decision(inn, "explain", result)
+    return response
+
+
+def _sse(data: dict, event: str | None = None) -> str:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@root.get(
+    "/chat/stream",
+    summary="LLM Chat — ответ потоком (Server-Sent Events)",
+    response_class=StreamingResponse
+)
+async def chat_llm_stream(
+    request: Request,
+    text: str = Query(..., description="Текст запроса для LLM"),
+    api_key: str = Query(..., description="API-ключ Yandex Cloud", example=API_KEY),
+    folder_id: str = Query(..., description="ID папки в Yandex Cloud", example=FOLDER_ID),
 ):
-    return expect_not_found(stats_source.get_financial_stats, inn)
+    """
+    Как `/chat`, но отдаёт текст по мере генерации: события `data: {"delta": ...}`,
+    в конце `event: done`. При отключении клиента запрос к YandexGPT прерывается.
+    """
+    chunks = stream_yandex(text, api_key=api_key, folder_id=folder_id)
+
+    # Первый кусок ждём до ответа, чтобы ошибки апстрима вернулись статусом
+    with llm_errors():
+        first = await anext(chunks, "")
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            if first:
+                yield _sse({"delta": first})
+            async for delta in chunks:
+                if await request.is_disconnected():
+                    break
+                yield _sse({"delta": delta})
+            else:
+                yield _sse({}, event="done")
+        except Exception as err:
+            yield _sse({"detail": f"Не удалось получить ответ от LLM: {err}"}, event="error")
+        finally:
+            await chunks.aclose()
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def _stats_response(inn: str, category: str | None = None) -> Response:
+    pos = expect_not_found(stats_source.get_position, inn)
+    if category is None:
+        return _json(stats_source.all_stats_json(pos))
+    return _json(stats_source.category_json(pos, category))
 
 
 # Эндпоинты статистики по категориям
 @stats.get("/financial", summary="Финансовые метрики")
+@result_cache.cached("stats/financial", "inn", version=results_version, normalize=INN_KEY)
 async def financial(
     inn: str = Query(..., description="ИНН компании")
 ):
-    return expect_not_found(stats_source.get_financial_stats, inn)
+    return _stats_response(inn, "financial")
   
 
 @stats.get("/general", summary="Общие метрики")
+@result_cache.cached("stats/general", "inn", version=results_version, normalize=INN_KEY)
 async def general(
     inn: str = Query(..., description="ИНН компании")
 ):
-    return expect_not_found(stats_source.get_general_stats, inn)
-
-
-@stats.get("/general", summary="Общие метрики")
-async def general(
-    inn: str = Query(..., description="ИНН компании")
-):
-    return expect_not_found(stats_source.get_general_stats, inn)
-
-
-@stats.get("/contracts", summary="Контрактные метрики")
-async def contracts(
-    inn: str = Query(..., description="ИНН компании")
-):
-    return expect_not_found(stats_source.get_contracts_stats, inn)
+    return _stats_response(inn, "general")
 
 
 @stats.get("/contracts", summary="Контрактные метрики")
+@result_cache.cached("stats/contracts", "inn", version=results_version, normalize=INN_KEY)
 async def contracts(
     inn: str = Query(..., description="ИНН компании")
 ):
-    return expect_not_found(stats_source.get_contracts_stats, inn)
-
-
-@stats.get("/arbitration", summary="Арбитражные метрики")
-async def arbitration(
-    inn: str = Query(..., description="ИНН компании")
-):
-    return expect_not_found(stats_source.get_arbitration_stats, inn)
+    return _stats_response(inn, "contracts")
 
 
 @stats.get("/arbitration", summary="Арбитражные метрики")
+@result_cache.cached("stats/arbitration", "inn", version=results_version, normalize=INN_KEY)
 async def arbitration(
     inn: str = Query(..., description="ИНН компании")
 ):
-    return expect_not_found(stats_source.get_arbitration_stats, inn)
+    return _stats_response(inn, "arbitration")
 
 
 @stats.get("/enforcement", summary="Исполнительные метрики")
+@result_cache.cached("stats/enforcement", "inn", version=results_version, normalize=INN_KEY)
 async def enforcement(
     inn: str = Query(..., description="ИНН компании")
 ):
-    return expect_not_found(stats_source.get_enforcement_stats, inn)
+    return _stats_response(inn, "enforcement")
 
 
-@stats.get("/enforcement", summary="Исполнительные метрики")
-async def enforcement(
+@stats.get("/risk", summary="Риск-метрики")
+@result_cache.cached("stats/risk", "inn", version=results_version, normalize=INN_KEY)
+async def risk(
     inn: str = Query(..., description="ИНН компании")
 ):
-    return expect_not_found(stats_source.get_enforcement_stats, inn)
+    return _stats_response(inn, "risk")
 
 
-@stats.get("/risk", summary="Риск-метрики")
-async def risk(
-    inn: str = Query(..., description="ИНН компании")
+@stats.get("/peers", summary="Сравнение с группами похожих компаний",
+           dependencies=[assets.require("peers")])
+@result_cache.cached("stats/peers", "inn", "category", version=results_version, normalize=INN_KEY)
+async def peers(
+    inn: str = Query(..., description="ИНН компании"),
+    category: str = Query(..., description="Категория метрик: financial, general, ...")
 ):
-    return expect_not_found(stats_source.get_risk_stats, inn)
+    """
+    Перцентиль компании и медиана/квартили по каждому числовому признаку
+    категории внутри групп по main_okved2, region2, msp_category и emp_bin.
+    """
+    if category not in peer_index.category_features:
+        raise HTTPException(status_code=404, detail=f"Неизвестная категория “{category}”")
+    return expect_not_found(lambda i: peer_index.compare(i, category), inn)
 
 
 @stats.get("/all", summary="Все метрики")
+@result_cache.cached("stats/all", "inn", version=results_version, normalize=INN_KEY)
 async def all_stats(
     inn: str = Query(..., description="ИНН компании")
 ):
-    return expect_not_found(stats_source.get_all_stats, inn)
+    return _stats_response(inn)
 
 
+# Без кэша ответов: тексты бывают по нескольку мегабайт, а чтение из mmap и так
+# дешёвое — копия в LRU каждого воркера только съела бы память
 @raw.get("/{table}", summary="data_text по таблице", response_class=PlainTextResponse)
 async def raw_generic(table: str, inn: str = Query(..., description="ИНН")):
     """
@@ -1,5 +1,6 @@
-from pydantic import BaseModel, Field
-from typing import Dict, Any, List
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Dict, Any, List, Optional
+from datetime import datetime
 from enum import Enum
 
 class Feature(str, Enum):
@@ -18,5 +19,40 @@ class AnalyzeResponse(BaseModel):
     score: float
     key_influencers: List[Dict[str, float]]
 
+class AnalyzeBatchRequest(BaseModel):
+    inns: List[str] = Field(..., description="Список ИНН для скоринга")
+
+class AnalyzeBatchItem(BaseModel):
+    inn: str
+    result: Optional[AnalyzeResponse] = None
+    error: Optional[str] = None
+
+class CompanyResponse(BaseModel):
+    inn: str
+    verdict: Verdict
+    score: float
+    key_influencers: List[Dict[str, float]]
+    stats: Dict[str, Dict[str, Any]] = Field(..., description="Статистика по всем категориям")
+
 class ChatResponse(BaseModel):
     answer: str = Field(..., description="Текстовый ответ от LLM")
+
+class ExplainResponse(BaseModel):
+    inn: str
+    verdict: Verdict
+    score: float
+    key_influencers: List[Dict[str, float]] = Field(..., description="Top-k признаков по |SHAP|")
+    answer: str = Field(..., description="Объяснение скора от LLM")
+
+class DecisionRecord(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    inn: str
+    created_at: datetime
+    source: str
+    verdict: Verdict
+    score: float
+    top_factors: Dict[str, float] = Field(..., description="Top признаков по |SHAP| на момент решения")
+    model_version: str
+    data_version: str
@@ -0,0 +1,249 @@
+"""
+Материализованные скоры: вероятность, вердикт и SHAP-вектор для каждого
+ИНН, посчитанные офлайн и сохранённые в .npy, которые сервер читает через mmap.
+
+Хранилище лежит в <root>/<хеш модели> (симлинк на каталог с данными) и помнит хеш каждой строки
+признаков, поэтому повторный запуск пересчитывает только изменившиеся
+строки, а сервер не отдаёт скор для строки, которая поменялась после
+материализации.
+
+    python score_store.py --csv ../data/full_transformed_wo_target.csv \\
+                          --model ../models/catboost_model-2.cbm
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import shap
+from catboost import CatBoostClassifier
+
+from columnar import prefer_parquet
+from company import CompanyStatsFromLocal
+from schemas import AnalyzeResponse, Verdict
+from scoring import DECLINE_THRESHOLD, build_response, score_matrix
+
+DEFAULT_ROOT = "../data/scores"
+
+# Тот же тип, что отдаёт живой скоринг: ответ из хранилища и посчитанный
+# на лету должны совпадать байт в байт (общий кэш ответов и ETag /company)
+SHAP_DTYPE = np.float64
+
+
+def file_fingerprint(path: str | Path) -> str:
+    """Короткий sha256 содержимого файла — версия модели."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+class ScoreStore:
+    """
+    Хранилище материализованных скоров одной версии модели.
+    Массивы открываются через mmap и делятся между воркерами.
+    """
+
+    ARRAYS = ("inns", "fingerprints", "scores", "verdicts", "shap")
+
+    def __init__(self, path: str | Path) -> None:
+        # <root>/<модель> — симлинк, который materialize может переключить;
+        # все файлы читаем из одного и того же каталога
+        self.path = Path(path).resolve()
+        meta = json.loads((self.path / "meta.json").read_text())
+        self.model_version: str = meta["model_version"]
+        self.data_version: str = meta["data_version"]
+        self.features: list[str] = meta["features"]
+
+        self._inns = np.load(self.path / "inns.npy", mmap_mode="r")
+        self._fingerprints = np.load(self.path / "fingerprints.npy", mmap_mode="r")
+        self._scores = np.load(self.path / "scores.npy", mmap_mode="r")
+        self._verdicts = np.load(self.path / "verdicts.npy", mmap_mode="r")
+        self._shap = np.load(self.path / "shap.npy", mmap_mode="r")
+
+        self._lookup: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._inns)
+
+    @classmethod
+    def open(cls, root: str | Path, model_version: str) -> "ScoreStore | None":
+        path = Path(root) / model_version
+        if not (path / "meta.json").is_file():
+            return None
+        store = cls(path)
+        if store._shap.dtype != SHAP_DTYPE:
+            # Старое хранилище с округлённым SHAP: его ответы расходились бы
+            # с живым скорингом, так что пересчитываем всё заново
+            return None
+        return store
+
+    def positions(self) -> dict[str, int]:
+        return dict(zip(self._inns.tolist(), range(len(self._inns))))
+
+    def bind(self, source: CompanyStatsFromLocal) -> int:
+        """
+        Сверяет хранилище с текущим источником: отдаваться будут только ИНН,
+        чья строка признаков не менялась с момента материализации.
+        Возвращает число таких ИНН.
+        """
+        inns = self._inns.tolist()
+        index = source.index
+        pos = np.fromiter((index.get(inn, -1) for inn in inns), dtype=np.int64, count=len(inns))
+
+        fresh = pos >= 0
+        fresh[fresh] = source.row_fingerprints()[pos[fresh]] == self._fingerprints[fresh]
+
+        self._lookup = {inns[i]: i for i in np.flatnonzero(fresh).tolist()}
+        return len(self._lookup)
+
+    def lookup(self, inn: str) -> tuple[float, Verdict, np.ndarray] | None:
+        """(скор, вердикт, SHAP-вектор) или None, если ИНН не материализован."""
+        i = self._lookup.get(inn.strip())
+        if i is None:
+            return None
+        verdict = Verdict.decline if self._verdicts[i] else Verdict.approve
+        return float(self._scores[i]), verdict, self._shap[i]
+
+    def get(self, inn: str) -> AnalyzeResponse | None:
+        found = self.lookup(inn)
+        if found is None:
+            return None
+        score, verdict, shap_row = found
+        return build_response(score, shap_row, self.features, verdict)
+
+
+def materialize(source: CompanyStatsFromLocal, model, explainer, model_version: str,
+                root: str | Path = DEFAULT_ROOT, chunk_size: int = 4096) -> tuple[int, int]:
+    """
+    Пересобирает хранилище для model_version. Строки, хеш которых совпадает
+    с уже сохранённым, копируются, остальные скорятся пачками по chunk_size.
+    Возвращает (всего ИНН, пересчитано).
+    """
+    index = source.index
+    inns = list(index.keys())
+    positions = np.fromiter(index.values(), dtype=np.int64, count=len(inns))
+    fingerprints = source.row_fingerprints()[positions]
+    n = len(inns)
+
+    scores = np.zeros(n, dtype=np.float64)
+    verdicts = np.zeros(n, dtype=np.uint8)
+    shap_values: np.ndarray | None = None
+    features: list[str] = []
+    todo = np.ones(n, dtype=bool)
+
+    previous = ScoreStore.open(root, model_version)
+    if previous is not None:
+        prev_pos = previous.positions()
+        j = np.fromiter((prev_pos.get(inn, -1) for inn in inns), dtype=np.int64, count=n)
+        hit = j >= 0
+        hit[hit] = previous._fingerprints[j[hit]] == fingerprints[hit]
+
+        features = previous.features
+        shap_values = np.zeros((n, len(features)), dtype=SHAP_DTYPE)
+        scores[hit] = previous._scores[j[hit]]
+        verdicts[hit] = previous._verdicts[j[hit]]
+        shap_values[hit] = previous._shap[j[hit]]
+        todo = ~hit
+        del previous
+
+    todo_idx = np.flatnonzero(todo)
+    for start in range(0, len(todo_idx), chunk_size):
+        idx = todo_idx[start:start + chunk_size]
+        X = source.get_rows(positions[idx].tolist())
+        p_quasi_default, shap_full, columns = score_matrix(model, explainer, X)
+
+        if shap_values is None:
+            features = columns
+            shap_values = np.zeros((n, len(columns)), dtype=SHAP_DTYPE)
+
+        scores[idx] = p_quasi_default
+        verdicts[idx] = p_quasi_default >= DECLINE_THRESHOLD
+        shap_values[idx] = shap_full
+
+    if shap_values is None:
+        shap_values = np.zeros((n, 0), dtype=SHAP_DTYPE)
+
+    _write(Path(root), model_version, {
+        "inns": np.array(inns, dtype=str),
+        "fingerprints": fingerprints,
+        "scores": scores,
+        "verdicts": verdicts,
+        "shap": shap_values,
+    }, {
+        "model_version": model_version,
+        "data_version": source.data_version,
+        "features": features,
+        "created_at": time.time(),
+    })
+    return n, len(todo_idx)
+
+
+def _write(root: Path, model_version: str, arrays: dict[str, np.ndarray], meta: dict) -> None:
+    """
+    Пишет хранилище в новый каталог и переключает на него симлинк
+    <root>/<model_version> через os.replace: читатель видит либо старое
+    хранилище, либо новое целиком. Старый каталог удаляется после
+    переключения; уже открытые mmap на него остаются рабочими.
+    """
+    root.mkdir(parents=True, exist_ok=True)
+    final = root / model_version
+    target = Path(tempfile.mkdtemp(dir=root, prefix=f".{model_version}."))
+    try:
+        for name, arr in arrays.items():
+            np.save(target / f"{name}.npy", arr)
+        (target / "meta.json").write_text(json.dumps(meta))
+    except BaseException:
+        shutil.rmtree(target, ignore_errors=True)
+        raise
+    # mkdtemp создаёт каталог с правами 0700, а читать его могут воркеры под другим пользователем
+    os.chmod(target, 0o755)
+
+    previous = final.resolve() if final.is_symlink() else None
+    if final.is_dir() and previous is None:
+        # Хранилище старого формата — обычный каталог, его не подменить атомарно:
+        # только при этом переходе хранилища нет, пока не появится симлинк
+        previous = final.with_name(f"{target.name}.old")
+        final.rename(previous)
+
+    link = target.with_name(f"{target.name}.link")
+    link.symlink_to(target.name)
+    os.replace(link, final)
+    if previous is not None:
+        shutil.rmtree(previous, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Материализация скоров и SHAP")
+    parser.add_argument("--csv", default="../data/full_transformed_wo_target.csv")
+    parser.add_argument("--model", default="../models/catboost_model-2.cbm")
+    parser.add_argument("--out", default=DEFAULT_ROOT)
+    parser.add_argument("--chunk-size", type=int, default=4096)
+    args = parser.parse_args()
+
+    model = CatBoostClassifier()
+    model.load_model(args.model)
+    # Те же колонки, что читает сервер, иначе хеши строк не совпадут
+    source = CompanyStatsFromLocal(
+        prefer_parquet(args.csv),
+        columns=CompanyStatsFromLocal.required_columns(model.feature_names_)
+    )
+    explainer = shap.TreeExplainer(model)
+    model_version = file_fingerprint(args.model)
+
+    started = time.perf_counter()
+    total, computed = materialize(source, model, explainer, model_version,
+                                  args.out, args.chunk_size)
+    print(f"Модель {model_version}, данные {source.data_version}: "
+          f"{total} ИНН, пересчитано {computed} "
+          f"за {time.perf_counter() - started:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+from metrics import span
+from schemas import AnalyzeResponse, Verdict
+
+# Порог вероятности квази-дефолта, начиная с которого выдаём отказ
+DECLINE_THRESHOLD = 0.3
+
+
+def score_matrix(model, explainer, X: pd.DataFrame) -> tuple[np.ndarray, np.ndarray, list[str]]:
+    """
+    Считает вероятности квази-дефолта и SHAP-значения для всех строк X
+    одним вызовом predict_proba и shap_values.
+    Возвращает (вероятности, SHAP-матрица, имена признаков SHAP-матрицы).
+    """
+    # Оставляем только признаки модели в её порядке (без inn и прочего),
+    # иначе имена колонок разъезжаются с SHAP-векторами
+    X = X[model.feature_names_]
+
+    # 1. Предсказываем вероятность default
+    with span("predict"):
+        p_quasi_default = model.predict_proba(X)[:, 1]
+
+    # 2. Вычисляем SHAP-значения
+    with span("shap"):
+        shap_vals = explainer.shap_values(X)
+    shap_full = shap_vals[1] if isinstance(shap_vals, list) else shap_vals
+
+    # 3. Убираем колонку 'id', если есть
+    columns = list(X.columns)
+    if 'id' in X.columns:
+        idx = X.columns.get_loc('id')
+        shap_full = np.delete(shap_full, idx, axis=1)
+        del columns[idx]
+
+    return p_quasi_default, shap_full, columns
+
+
+def verdict_for(score: float) -> Verdict:
+    return Verdict.decline if score >= DECLINE_THRESHOLD else Verdict.approve
+
+
+def build_response(score: float, shap_row: np.ndarray, columns: list[str],
+                   verdict: Verdict | None = None) -> AnalyzeResponse:
+    return AnalyzeResponse(
+        verdict=verdict or verdict_for(score),
+        score=float(score),
+        key_influencers=[dict(zip(columns, shap_row.tolist()))]
+    )
+
+
+def score_frame(model, explainer, X: pd.DataFrame) -> list[AnalyzeResponse]:
+    """
+    Скорит все строки X и возвращает по AnalyzeResponse на каждую строку
+    в исходном порядке.
+    """
+    if X.empty:
+        return []
+
+    p_quasi_default, shap_full, columns = score_matrix(model, explainer, X)
+    return [
+        build_response(p, shap_row, columns)
+        for p, shap_row in zip(p_quasi_default, shap_full)
+    ]
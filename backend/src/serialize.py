@@ -0,0 +1,112 @@
+"""
+Сборка JSON-ответов напрямую из NumPy-массивов, без промежуточных dict
+и без валидации pydantic. Ключи объектов кодируются один раз, NaN и inf
+заменяются на null маской по всему вектору. Формат совпадает с тем, что
+FastAPI отдаёт для схем из schemas.py.
+"""
+import json
+from functools import lru_cache
+from typing import Any, Sequence
+
+import numpy as np
+
+from schemas import Verdict
+
+
+def to_python(val: Any) -> Any:
+    """NumPy-скаляр -> значение Python, NaN -> None."""
+    if hasattr(val, "item"):
+        val = val.item()
+    if val is None or (isinstance(val, float) and val != val):
+        return None
+    return val
+
+
+def dumps(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def float_literals(values: np.ndarray) -> list[str]:
+    """JSON-литералы для вещественного вектора; не-конечные значения -> null."""
+    values = np.asarray(values, dtype=np.float64)
+    literals = list(map(float.__repr__, values.tolist()))
+    bad = ~np.isfinite(values)
+    if bad.any():
+        for i in np.flatnonzero(bad).tolist():
+            literals[i] = "null"
+    return literals
+
+
+def join_object(keys: Sequence[str], literals: Sequence[str]) -> str:
+    return "{" + ",".join(map(str.__add__, keys, literals)) + "}"
+
+
+class FieldTable:
+    """Заранее закодированные ключи `"name":` для фиксированного набора полей."""
+
+    def __init__(self, names: Sequence[str]) -> None:
+        self.names = list(names)
+        self.keys = [dumps(name) + ":" for name in self.names]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def encode(self, values: np.ndarray, top_k: int | None = None) -> str:
+        """
+        {поле: значение} для вещественного вектора в порядке полей; с top_k —
+        только top_k полей с наибольшим |значением|, по убыванию.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if top_k is None or top_k >= len(values):
+            return join_object(self.keys, float_literals(values))
+
+        magnitude = np.nan_to_num(np.abs(values), nan=-1.0)
+        top = np.argpartition(-magnitude, top_k - 1)[:top_k]
+        top = top[np.argsort(-magnitude[top], kind="stable")]
+        return join_object([self.keys[i] for i in top.tolist()], float_literals(values[top]))
+
+
+@lru_cache(maxsize=8)
+def field_table(names: tuple[str, ...]) -> FieldTable:
+    return FieldTable(names)
+
+
+class RowEncoder:
+    """
+    JSON-объект из полей одной строки колоночной таблицы. Колонки заранее
+    разложены по типам: вещественные и целые читаются одним вектором на
+    строку, остальные (строки, bool) — по одной; отсутствующие поля — null.
+    """
+
+    def __init__(self, columns: Sequence[tuple[str, np.ndarray | None]]) -> None:
+        self.table = FieldTable([field for field, _ in columns])
+        self._floats: list[tuple[int, np.ndarray]] = []
+        self._ints: list[tuple[int, np.ndarray]] = []
+        self._other: list[tuple[int, np.ndarray]] = []
+        for i, (_, column) in enumerate(columns):
+            if column is None:
+                continue
+            kind = column.dtype.kind
+            group = self._floats if kind == "f" else self._ints if kind in "iu" else self._other
+            group.append((i, column))
+
+    def encode(self, pos: int) -> str:
+        literals = ["null"] * len(self.table)
+        if self._floats:
+            row = np.fromiter((column[pos] for _, column in self._floats),
+                              dtype=np.float64, count=len(self._floats))
+            for (i, _), literal in zip(self._floats, float_literals(row)):
+                literals[i] = literal
+        for i, column in self._ints:
+            literals[i] = str(int(column[pos]))
+        for i, column in self._other:
+            literals[i] = dumps(to_python(column[pos]))
+        return join_object(self.table.keys, literals)
+
+
+def analysis_json(score: float, verdict: Verdict, shap_row: np.ndarray,
+                  features: Sequence[str], top_k: int | None = None) -> str:
+    """JSON AnalyzeResponse; с top_k в key_influencers только top_k признаков по |SHAP|."""
+    influencers = field_table(tuple(features)).encode(shap_row, top_k)
+    return (f'{{"verdict":{dumps(verdict.value)},"score":{float_literals([score])[0]},'
+            f'"key_influencers":[{influencers}]}}')
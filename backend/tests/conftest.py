@@ -0,0 +1,4 @@
+import os
+
+# database.py требует DATABASE_URL при импорте; тесты передают свои движки явно
+os.environ.setdefault("DATABASE_URL", "sqlite://")
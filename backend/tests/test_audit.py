@@ -0,0 +1,162 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from audit import DECISIONS, DecisionLog, query_decisions
+from models import ScoringDecision
+
+
+def payload(score: float = 0.5, verdict: str | None = "approve", **shap: float) -> bytes:
+    return json.dumps({"verdict": verdict, "score": score,
+                       "key_influencers": [shap or {"a": 1.0}]}).encode()
+
+
+def count(outcome: str) -> int:
+    return DECISIONS._values.get((outcome,), 0)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path / 'decisions.sqlite'}")
+
+
+def rows(engine) -> list[ScoringDecision]:
+    with Session(engine) as db:
+        return list(db.scalars(select(ScoringDecision).order_by(ScoringDecision.id)))
+
+
+def run(log: DecisionLog, decisions, after=None) -> None:
+    async def main() -> None:
+        log.start()
+        for inn, source, body in decisions:
+            await log.record(inn, source, body, "m1", "d1")
+        if after is not None:
+            await after()
+        await log.stop(timeout=10)
+
+    asyncio.run(main())
+
+
+def test_writes_batches_with_canonical_inn(engine):
+    log = DecisionLog(bind=engine, batch_size=3, flush_interval=0.01, top_k=2)
+    log.create_table()
+    written = count("written")
+
+    run(log, [(f" 77{i:08d} ", "analyze", payload(a=0.1, b=-0.9, c=0.5)) for i in range(7)])
+
+    stored = rows(engine)
+    assert [row.inn for row in stored] == [f"77{i:08d}" for i in range(7)]
+    assert stored[0].top_factors == {"b": -0.9, "c": 0.5}
+    assert (stored[0].verdict, stored[0].model_version, stored[0].data_version) == ("approve", "m1", "d1")
+    assert count("written") - written == 7
+
+
+def test_flushes_without_stop(engine):
+    log = DecisionLog(bind=engine, flush_interval=0.05)
+    log.create_table()
+
+    async def wait_for_flush() -> None:
+        for _ in range(100):
+            if rows(engine):
+                return
+            await asyncio.sleep(0.02)
+
+    run(log, [("7700000001", "analyze", payload())], after=wait_for_flush)
+    assert len(rows(engine)) == 1
+
+
+def test_bad_rows_do_not_drop_the_batch(engine):
+    log = DecisionLog(bind=engine, batch_size=100, flush_interval=0.05)
+    log.create_table()
+    invalid = count("invalid")
+    decisions = [(f"77{i:08d}", "batch", payload()) for i in range(10)]
+    decisions[3] = ("7700000003", "batch", payload(verdict=None))   # NOT NULL в базе
+    decisions[7] = ("1" * 15, "batch", payload())                    # длиннее String(12)
+
+    run(log, decisions)
+
+    assert sorted(row.inn for row in rows(engine)) == [f"77{i:08d}" for i in range(10) if i not in (3, 7)]
+    assert count("invalid") - invalid == 2
+
+
+def test_drops_without_waiting_until_table_is_ready(engine):
+    log = DecisionLog(bind=engine, put_timeout=5)
+    dropped = count("dropped")
+
+    started = time.monotonic()
+    run(log, [("7700000001", "analyze", payload())])
+
+    assert time.monotonic() - started < 1
+    assert count("dropped") - dropped == 1
+
+
+def test_drops_without_waiting_while_database_fails(engine, tmp_path):
+    log = DecisionLog(bind=engine, maxsize=1, flush_interval=0.01, put_timeout=5, retries=1)
+    log.create_table()
+    log.bind = create_engine(f"sqlite:///{tmp_path / 'missing' / 'decisions.sqlite'}")
+    dropped = count("dropped")
+
+    async def main() -> float:
+        log.start()
+        await log.record("7700000001", "analyze", payload(), "m1", "d1")
+        while log._healthy:
+            await asyncio.sleep(0.01)
+        await log.record("7700000002", "analyze", payload(), "m1", "d1")    # занимает очередь
+        started = time.monotonic()
+        await log.record("7700000003", "analyze", payload(), "m1", "d1")
+        elapsed = time.monotonic() - started
+        await log.stop(timeout=10)
+        return elapsed
+
+    assert asyncio.run(main()) < 1
+    # третье отброшено сразу, первые два — после повторов
+    assert count("dropped") - dropped == 3
+
+
+def test_waits_for_room_then_drops(engine):
+    log = DecisionLog(bind=engine, maxsize=1, flush_interval=0.01, put_timeout=0.1)
+    log.create_table()
+    log._write = lambda rows: time.sleep(0.5)   # база медленная, но пишет
+    dropped = count("dropped")
+
+    async def main() -> float:
+        log.start()
+        await log.record("7700000001", "analyze", payload(), "m1", "d1")
+        while not log._queue.empty():   # фоновая задача забрала первое и пишет
+            await asyncio.sleep(0.01)
+        await log.record("7700000002", "analyze", payload(), "m1", "d1")
+        started = time.monotonic()
+        await log.record("7700000003", "analyze", payload(), "m1", "d1")
+        elapsed = time.monotonic() - started
+        await log.stop(timeout=10)
+        return elapsed
+
+    assert asyncio.run(main()) >= 0.1
+    assert count("dropped") - dropped == 1
+
+
+def test_query_decisions_filters_and_pages(engine):
+    log = DecisionLog(bind=engine, flush_interval=0.01)
+    log.create_table()
+    run(log, [("7700000001", "analyze", payload(0.1)),
+              ("7700000002", "analyze", payload(0.2)),
+              ("7700000001", "explain", payload(0.3))])
+
+    with Session(engine) as db:
+        by_inn = query_decisions(db, inn=" 7700000001 ")
+        assert [row.score for row in by_inn] == [0.3, 0.1]
+        assert [row.score for row in query_decisions(db, source="analyze")] == [0.2, 0.1]
+
+        newest, *_ = query_decisions(db, limit=1)
+        assert newest.score == 0.3
+        # until не включительно: created_at последней записи — курсор следующей страницы
+        page = query_decisions(db, until=newest.created_at, limit=10)
+        assert [row.score for row in page] == [0.2, 0.1]
+
+        future = datetime.now(timezone.utc) + timedelta(hours=1)
+        assert query_decisions(db, since=future) == []
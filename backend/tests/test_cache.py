@@ -0,0 +1,164 @@
+import asyncio
+
+import pytest
+
+from cache import ResultCache, TTLCache
+
+
+class FakeRedis:
+    """Redis в памяти процесса: async get/set(ex=), как у redis.asyncio."""
+
+    def __init__(self) -> None:
+        self.data: dict[str, bytes] = {}
+        self.calls = 0
+        self.fail = False
+
+    async def get(self, key: str) -> bytes | None:
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("redis is down")
+        return self.data.get(key)
+
+    async def set(self, key: str, value: bytes, ex: int | None = None) -> None:
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("redis is down")
+        self.data[key] = value
+
+    async def aclose(self) -> None:
+        pass
+
+
+class Counter:
+    def __init__(self, value: bytes = b"value", delay: float = 0.0) -> None:
+        self.value = value
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self) -> bytes:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.value
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(maxsize=2, ttl=-1)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_workers_share_results_through_redis():
+    redis = FakeRedis()
+    first, second = ResultCache(redis=redis), ResultCache(redis=redis)
+    compute = Counter()
+
+    async def main():
+        assert await first.get_or_compute("k", compute) == b"value"
+        assert await second.get_or_compute("k", compute) == b"value"
+
+    asyncio.run(main())
+    assert compute.calls == 1
+    assert second.local.get("k") == b"value"
+
+
+def test_concurrent_requests_compute_once():
+    cache = ResultCache(redis=FakeRedis())
+    compute = Counter(delay=0.01)
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_compute("k", compute) for _ in range(10)))
+
+    assert asyncio.run(main()) == [b"value"] * 10
+    assert compute.calls == 1
+
+
+def test_errors_are_not_cached():
+    cache = ResultCache(redis=FakeRedis())
+    calls = 0
+
+    async def failing() -> bytes:
+        nonlocal calls
+        calls += 1
+        raise ValueError("boom")
+
+    async def main():
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                await cache.get_or_compute("k", failing)
+
+    asyncio.run(main())
+    assert calls == 2
+    assert cache.local.get("k") is None
+
+
+def test_redis_outage_falls_back_to_local_and_backs_off():
+    redis = FakeRedis()
+    redis.fail = True
+    cache = ResultCache(redis=redis, retry_after=60)
+    compute = Counter()
+
+    async def main():
+        for _ in range(3):
+            assert await cache.get_or_compute("k", compute) == b"value"
+
+    asyncio.run(main())
+    # первая ошибка отключает Redis на retry_after, дальше работает локальный уровень
+    assert redis.calls == 1
+    assert compute.calls == 1
+
+
+def test_cached_decorator_keys_by_params_and_version():
+    cache = ResultCache(redis=FakeRedis())
+    version = "v1"
+    calls = []
+
+    @cache.cached("echo", "inn", version=lambda: version)
+    async def echo(inn: str, other: int = 0):
+        calls.append(inn)
+        return {"inn": inn}
+
+    async def main():
+        first = await echo(inn="1", other=1)
+        again = await echo(inn="1", other=2)
+        return first, again
+
+    first, again = asyncio.run(main())
+    assert first.body == again.body == b'{"inn":"1"}'
+    assert first.media_type == "application/json"
+    assert calls == ["1"]
+
+    asyncio.run(echo(inn="2"))
+    version = "v2"
+    asyncio.run(echo(inn="1"))
+    assert calls == ["1", "2", "1"]
+
+
+def test_cached_decorator_normalizes_params():
+    cache = ResultCache(redis=FakeRedis())
+    calls = []
+
+    @cache.cached("echo", "inn", "category", normalize={"inn": str.strip})
+    async def echo(inn: str, category: str):
+        calls.append((inn, category))
+        return {"inn": inn.strip(), "category": category}
+
+    async def main():
+        return [await echo(inn=inn, category=category)
+                for inn, category in [("123", "a"), (" 123 ", "a"), ("123", " a")]]
+
+    padded, same, other = asyncio.run(main())
+    assert padded.body == same.body
+    # Без normalize параметр в ключе как есть
+    assert calls == [("123", "a"), ("123", " a")]
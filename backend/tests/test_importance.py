@@ -0,0 +1,52 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+from catboost import CatBoostClassifier
+
+from company import CompanyStatsFromLocal
+from importance import bounded_map, compute_importance
+
+
+def test_bounded_map_keeps_order_and_window():
+    produced = []
+
+    def items():
+        for i in range(20):
+            produced.append(i)
+            yield i
+
+    with ThreadPoolExecutor(2) as pool:
+        results = bounded_map(pool, lambda x: x * x, items(), window=3)
+        assert next(results) == 0
+        # Отправлено не больше window задач, следующий элемент ещё не собран
+        assert len(produced) == 4
+        assert list(results) == [i * i for i in range(1, 20)]
+
+
+def test_compute_importance_does_not_depend_on_chunking(tmp_path):
+    rng = np.random.default_rng(0)
+    n = 200
+    df = pd.DataFrame({
+        "inn": [f"{7700000000 + i}" for i in range(n)],
+        "msp_category": rng.choice(["micro", "small"], n),
+        "num_employees": rng.integers(1, 500, n),
+        "roa": rng.normal(0, 1, n),
+    })
+    df.to_csv(tmp_path / "companies.csv", index=False)
+    model = CatBoostClassifier(iterations=10, depth=2, verbose=False, allow_writing_files=False)
+    model.fit(df[["num_employees", "roa"]], (df["roa"] < 0).astype(int))
+    model.save_model(str(tmp_path / "model.cbm"))
+    source = CompanyStatsFromLocal(tmp_path / "companies.csv")
+
+    whole = compute_importance(source, str(tmp_path / "model.cbm"), chunk_size=n, workers=1,
+                               segments=("msp_category",))
+    chunked = compute_importance(source, str(tmp_path / "model.cbm"), chunk_size=7, workers=2,
+                                 segments=("msp_category",))
+
+    assert whole["rows"] == chunked["rows"] == n
+    assert [f["name"] for f in whole["features"]] == [f["name"] for f in chunked["features"]]
+    for a, b in zip(whole["features"], chunked["features"]):
+        assert a["mean_abs_shap"] == pytest.approx(b["mean_abs_shap"])
+    assert sum(s["rows"] for s in chunked["segments"]["msp_category"].values()) == n
@@ -0,0 +1,166 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from cache import TTLCache
+from llm_request import YandexGPTClient
+
+
+def answer(text: str) -> dict:
+    return {"result": {"alternatives": [{"message": {"role": "assistant", "text": text}}]}}
+
+
+class Upstream:
+    """Стаб YandexGPT для httpx.MockTransport: отдаёт статусы из очереди, потом 200."""
+
+    def __init__(self, *statuses: int | type[Exception], delay: float = 0) -> None:
+        self.statuses = list(statuses)
+        self.delay = delay
+        self.requests: list[httpx.Request] = []
+        self.in_flight = self.max_in_flight = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        status = self.statuses.pop(0) if self.statuses else 200
+        if not isinstance(status, int):
+            raise status("upstream is unreachable", request=request)
+        if status != 200:
+            return httpx.Response(status, json={"error": {"message": "nope"}})
+        return httpx.Response(200, json=answer(f"ответ {len(self.requests)}"))
+
+
+def client(upstream: Upstream, **kwargs) -> YandexGPTClient:
+    kwargs.setdefault("retries", 3)
+    return YandexGPTClient(base_url="http://llm.test/completion", backoff=0,
+                           transport=httpx.MockTransport(upstream), **kwargs)
+
+
+def complete(llm: YandexGPTClient, text: str = "вопрос", api_key: str = "key") -> str:
+    return asyncio.run(llm.complete(text, api_key, "folder"))
+
+
+@pytest.mark.parametrize("status", [429, 500, 502, 503, 504, httpx.ConnectError])
+def test_retries_transient_errors(status):
+    upstream = Upstream(status, status)
+    assert complete(client(upstream)) == "ответ 3"
+    assert len(upstream.requests) == 3
+
+
+def test_gives_up_after_retries():
+    upstream = Upstream(503, 503, 503)
+    with pytest.raises(httpx.HTTPStatusError) as err:
+        complete(client(upstream, retries=2))
+    assert err.value.response.status_code == 503
+    assert len(upstream.requests) == 3
+
+
+@pytest.mark.parametrize("status", [400, 401, 403, 404])
+def test_does_not_retry_client_errors(status):
+    upstream = Upstream(status)
+    with pytest.raises(httpx.HTTPStatusError):
+        complete(client(upstream))
+    assert len(upstream.requests) == 1
+
+
+def test_cache_hit_makes_no_outbound_call():
+    upstream = Upstream()
+    llm = client(upstream)
+    assert complete(llm) == complete(llm) == "ответ 1"
+    assert len(upstream.requests) == 1
+    assert upstream.requests[0].headers["Authorization"] == "Api-Key key"
+
+    assert complete(llm, text="другой вопрос") == "ответ 2"
+
+
+def test_cache_is_per_api_key():
+    calls = []
+
+    def upstream(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        if request.headers["Authorization"] != "Api-Key valid":
+            return httpx.Response(401, json={"error": {"message": "unauthorized"}})
+        return httpx.Response(200, json=answer("платный ответ"))
+
+    llm = YandexGPTClient(base_url="http://llm.test/completion", backoff=0,
+                          transport=httpx.MockTransport(upstream))
+    assert complete(llm, api_key="valid") == "платный ответ"
+    # Ответ, оплаченный ключом valid, не отдаётся с чужим ключом
+    with pytest.raises(httpx.HTTPStatusError):
+        complete(llm, api_key="stolen")
+    assert len(calls) == 2
+
+
+def test_evicted_answer_is_requested_again():
+    upstream = Upstream()
+    llm = client(upstream, cache=TTLCache(maxsize=1, ttl=60))
+    complete(llm, "первый")
+    complete(llm, "второй")
+    assert complete(llm, "первый") == "ответ 3"
+
+
+def test_semaphore_limits_concurrent_requests():
+    upstream = Upstream(delay=0.02)
+    llm = client(upstream, max_concurrency=2)
+
+    async def main() -> list[str]:
+        return await asyncio.gather(*(llm.complete(f"вопрос {i}", "key", "folder")
+                                      for i in range(6)))
+
+    assert len(asyncio.run(main())) == 6
+    assert upstream.max_in_flight == 2
+
+
+def ndjson(*texts: str) -> bytes:
+    return "".join(json.dumps(answer(text), ensure_ascii=False) + "\n\n" for text in texts).encode()
+
+
+def stream(llm: YandexGPTClient, text: str = "вопрос") -> list[str]:
+    async def main() -> list[str]:
+        return [chunk async for chunk in llm.stream(text, "key", "folder")]
+    return asyncio.run(main())
+
+
+def streaming_client(body: bytes) -> tuple[YandexGPTClient, list[httpx.Request]]:
+    calls = []
+
+    def upstream(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(200, content=body)
+
+    return YandexGPTClient(base_url="http://llm.test/completion", backoff=0,
+                           transport=httpx.MockTransport(upstream)), calls
+
+
+def test_stream_yields_increments_of_cumulative_text():
+    llm, calls = streaming_client(ndjson("Ком", "Компания", "Компания", "Компания надёжна."))
+    assert stream(llm) == ["Ком", "пания", " надёжна."]
+    assert json.loads(calls[0].content)["completionOptions"]["stream"] is True
+
+    # Полный ответ закэширован и отдаётся одним куском без запроса
+    assert stream(llm) == ["Компания надёжна."]
+    assert len(calls) == 1
+
+
+def test_stream_rejects_text_that_does_not_continue():
+    llm, calls = streaming_client(ndjson("Компания", "Фирма надёжна"))
+    received = []
+
+    async def main() -> None:
+        async for chunk in llm.stream("вопрос", "key", "folder"):
+            received.append(chunk)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(main())
+    assert received == ["Компания"]
+    # Оборванный ответ не кэшируется
+    with pytest.raises(RuntimeError):
+        stream(llm)
+    assert len(calls) == 2
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from company import CompanyStatsFromLocal
+from peers import PeerIndex
+
+
+@pytest.fixture(scope="module")
+def source(tmp_path_factory):
+    rng = np.random.default_rng(0)
+    n = 300
+    roa = rng.normal(0, 1, n).round(1)        # округление даёт много равных значений
+    roa[rng.random(n) < 0.1] = np.nan
+    df = pd.DataFrame({
+        "inn": [f"{7700000000 + i}" for i in range(n)],
+        "main_okved2": rng.choice(["62", "46", "41", None], n),
+        "region2": rng.choice(["77", "78"], n),
+        "roa": roa,
+        "num_employees": rng.integers(0, 5, n),    # целые: int8 после ужатия
+        "has_sanctions": rng.random(n) < 0.2,
+    })
+    path = tmp_path_factory.mktemp("peers") / "companies.csv"
+    df.to_csv(path, index=False)
+    return CompanyStatsFromLocal(path)
+
+
+def brute_force(values: np.ndarray, group: np.ndarray, pos: int) -> dict:
+    peers = np.sort(values[(group == group[pos]) & ~np.isnan(values)])
+    value = values[pos]
+    stats = {"peers": len(peers), "percentile": None, "median": None, "p25": None, "p75": None}
+    if len(peers):
+        p25, median, p75 = np.quantile(peers, [0.25, 0.5, 0.75])
+        stats.update(p25=p25, median=median, p75=p75)
+    if len(peers) and not np.isnan(value):
+        below, upto = np.sum(peers < value), np.sum(peers <= value)
+        stats["percentile"] = round((below + upto) / 2 / len(peers) * 100, 2)
+    return stats
+
+
+@pytest.mark.parametrize("category, feature", [("financial", "roa"), ("general", "num_employees"),
+                                               ("risk", "has_sanctions")])
+def test_percentiles_and_quartiles_match_brute_force(source, category, feature):
+    index = PeerIndex(source, groupings=("main_okved2", "region2"))
+    values = source.column(feature).astype(np.float64)
+
+    for inn, pos in list(source.index.items())[:120]:
+        groups = index.compare(inn, category)["groups"]
+        for grouping in ("main_okved2", "region2"):
+            keys = pd.Series(source.column(grouping)).astype(str).to_numpy()
+            if pd.isna(source.column(grouping)[pos]):
+                assert groups[grouping] is None
+                continue
+            got = groups[grouping]["features"][feature]
+            expected = brute_force(values, keys, pos)
+            assert got["peers"] == expected["peers"]
+            assert got["percentile"] == expected["percentile"]
+            for q in ("p25", "median", "p75"):
+                assert got[q] == pytest.approx(expected[q])
+
+
+def test_ties_share_the_mid_rank(tmp_path):
+    df = pd.DataFrame({"inn": ["1", "2", "3", "4"], "region2": ["77"] * 4, "roa": [1.0, 2.0, 2.0, 3.0]})
+    df.to_csv(tmp_path / "c.csv", index=False)
+    index = PeerIndex(CompanyStatsFromLocal(tmp_path / "c.csv"), groupings=("region2",))
+
+    percentile = lambda inn: index.compare(inn, "financial")["groups"]["region2"]["features"]["roa"]["percentile"]
+    assert [percentile(inn) for inn in "1234"] == [12.5, 50.0, 50.0, 87.5]
+    region = index.compare("1", "financial")["groups"]["region2"]
+    assert region["size"] == 4
+    assert region["features"]["roa"]["median"] == 2.0
+
+
+def test_unknown_category_and_inn(source):
+    index = PeerIndex(source)
+    with pytest.raises(KeyError):
+        index.compare("7700000000", "unknown")
+    with pytest.raises(ValueError):
+        index.compare("0", "financial")
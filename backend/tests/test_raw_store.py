@@ -0,0 +1,55 @@
+import os
+
+import pandas as pd
+
+from raw_store import build_table, is_fresh, open_raw_table
+
+
+def write_csv(path, rows) -> None:
+    pd.DataFrame(rows, columns=["inn", "data_text"]).to_csv(path, index=False)
+
+
+def test_lookup_hits_and_misses(tmp_path):
+    csv = tmp_path / "egrul.csv"
+    write_csv(csv, [(" 7700000002", "второй"), ("7700000001", "первый"),
+                    ("7700000002", "ещё"), ("500100732259", "ИП"), ("7700000003", None)])
+    table = open_raw_table("egrul", csv, tmp_path / "raw")
+
+    assert len(table) == 3
+    assert table.get("7700000001") == "первый"
+    assert table.get(" 7700000002 ") == "второй\nещё"
+    assert table.get("500100732259") == "ИП"
+    for missing in ("7700000003", "7700000000", "9999999999", "", "1" * 20):
+        assert table.get(missing) is None
+
+
+def test_rebuilds_when_source_changes(tmp_path):
+    csv, directory = tmp_path / "egrul.csv", tmp_path / "raw"
+    write_csv(csv, [("7700000001", "старый")])
+    assert open_raw_table("egrul", csv, directory).get("7700000001") == "старый"
+    assert is_fresh("egrul", csv, directory)
+
+    write_csv(csv, [("7700000001", "новый"), ("7700000002", "x")])
+    stat = os.stat(csv)
+    os.utime(csv, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert not is_fresh("egrul", csv, directory)
+    assert open_raw_table("egrul", csv, directory).get("7700000001") == "новый"
+    assert is_fresh("egrul", csv, directory)
+
+
+def test_missing_index_file_is_not_fresh(tmp_path):
+    csv, directory = tmp_path / "egrul.csv", tmp_path / "raw"
+    write_csv(csv, [("7700000001", "текст")])
+    build_table(csv, directory, "egrul")
+    (directory / "egrul.offsets.npy").unlink()
+    assert not is_fresh("egrul", csv, directory)
+
+
+def test_build_leaves_no_temp_files(tmp_path):
+    csv, directory = tmp_path / "egrul.csv", tmp_path / "raw"
+    write_csv(csv, [("7700000001", "текст")])
+    build_table(csv, directory, "egrul")
+    build_table(csv, directory, "egrul")
+    assert sorted(p.name for p in directory.iterdir()) == [
+        "egrul.bin", "egrul.keys.npy", "egrul.offsets.npy", "egrul.source.json"]
+    assert all(oct(p.stat().st_mode & 0o777) == "0o644" for p in directory.iterdir())
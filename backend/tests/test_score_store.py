@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+import shap
+from catboost import CatBoostClassifier
+
+from company import CompanyStatsFromLocal
+from score_store import ScoreStore, materialize
+from scoring import score_frame
+
+FEATURES = ["num_employees", "fin_rev_last", "roa"]
+
+
+def frame(n: int = 40, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "inn": [f"{7700000000 + i}" for i in range(n)],
+        "num_employees": rng.integers(1, 500, n),
+        "fin_rev_last": rng.normal(1e6, 3e5, n),
+        "roa": rng.normal(0, 1, n),
+    })
+
+
+@pytest.fixture(scope="module")
+def model():
+    df = frame(200, seed=1)
+    model = CatBoostClassifier(iterations=20, depth=3, verbose=False, allow_writing_files=False)
+    model.fit(df[FEATURES], (df["roa"] < 0).astype(int))
+    return model, shap.TreeExplainer(model)
+
+
+def source(tmp_path, df: pd.DataFrame) -> CompanyStatsFromLocal:
+    path = tmp_path / "companies.csv"
+    df.to_csv(path, index=False)
+    return CompanyStatsFromLocal(path, columns=CompanyStatsFromLocal.required_columns(FEATURES))
+
+
+def test_materialize_recomputes_only_changed_rows(tmp_path, model):
+    df = frame()
+    root = tmp_path / "scores"
+    assert materialize(source(tmp_path, df), *model, "m1", root) == (40, 40)
+    assert materialize(source(tmp_path, df), *model, "m1", root) == (40, 0)
+
+    df.loc[3, "roa"] += 1
+    df.loc[len(df)] = ["7799999999", 10, 1e6, 0.5]
+    assert materialize(source(tmp_path, df), *model, "m1", root) == (41, 2)
+    # Переключается симлинк, временные и старые каталоги не остаются
+    assert [p.name for p in root.iterdir() if not p.name.startswith(".")] == ["m1"]
+    assert (root / "m1").is_symlink()
+    assert len(list(root.iterdir())) == 2
+
+
+def test_bind_serves_only_unchanged_rows(tmp_path, model):
+    df = frame()
+    root = tmp_path / "scores"
+    materialize(source(tmp_path, df), *model, "m1", root)
+
+    df.loc[3, "roa"] += 1
+    df = df.drop(index=5)
+    current = source(tmp_path, df)
+    store = ScoreStore.open(root, "m1")
+    assert store.bind(current) == 38
+
+    assert store.lookup("7700000003") is None    # строка поменялась: скорим на лету
+    assert store.lookup("7700000005") is None    # ИНН больше нет в данных
+    assert store.lookup(" 7700000004 ") is not None
+
+
+def test_stored_response_matches_live_scoring(tmp_path, model):
+    current = source(tmp_path, frame())
+    materialize(current, *model, "m1", tmp_path / "scores")
+    store = ScoreStore.open(tmp_path / "scores", "m1")
+    store.bind(current)
+
+    positions = list(current.index.values())
+    live = score_frame(*model, current.get_rows(positions))
+    for inn, expected in zip(current.index, live):
+        assert store.get(inn).model_dump_json() == expected.model_dump_json()
+
+
+def test_open_rejects_missing_and_other_model(tmp_path, model):
+    materialize(source(tmp_path, frame()), *model, "m1", tmp_path / "scores")
+    assert ScoreStore.open(tmp_path / "scores", "m2") is None
+    assert ScoreStore.open(tmp_path / "missing", "m1") is None
@@ -0,0 +1,180 @@
+"""
+Benchmark suite for the backend and the inference-server.
+
+    python -m bench run --out bench-results/$(git rev-parse --short HEAD).json
+    python -m bench compare bench-results/old.json bench-results/new.json
+
+`run` generates the synthetic workdir (reused while its parameters do not
+change), runs the micro-benchmarks of each service in a fresh process and
+then load-tests each app over HTTP. `compare` prints every metric of two
+result files side by side and flags changes beyond --threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, Tuple
+
+from bench import load
+from bench.synthetic import REPO, prepare
+
+SERVICES = ("backend", "inference")
+
+
+def git_revision() -> Dict[str, Any]:
+    def git(*args: str) -> str:
+        return subprocess.run(["git", *args], cwd=REPO, capture_output=True,
+                              text=True).stdout.strip()
+
+    return {"commit": git("rev-parse", "HEAD") or None,
+            "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def run_micro(service: str, workdir: Path, args: argparse.Namespace) -> Dict[str, Any]:
+    """Runs bench.micro_<service> in its own process; its last stdout line is the JSON result."""
+    cmd = [sys.executable, "-m", f"bench.micro_{service}", "--workdir", str(workdir),
+           "--seconds", str(args.seconds), "--seed", str(args.seed)]
+    out = subprocess.run(cmd, cwd=REPO, stdout=subprocess.PIPE, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def run(args: argparse.Namespace) -> int:
+    workdir = Path(args.workdir).resolve()
+    services = [s for s in SERVICES if s in args.services.split(",")]
+    started = time.time()
+
+    print(f"Preparing synthetic data in {workdir}", file=sys.stderr)
+    manifest = prepare(workdir, rows=args.rows, seed=args.seed, parquet=not args.csv_only)
+
+    result: Dict[str, Any] = {
+        "meta": {
+            **git_revision(),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(started)),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k != "func"},
+            "data": manifest,
+        },
+        "micro": {},
+        "load": {},
+    }
+
+    if not args.no_micro:
+        for service in services:
+            print(f"Micro-benchmarks: {service}", file=sys.stderr)
+            result["micro"][service] = run_micro(service, workdir, args)
+
+    if not args.no_load:
+        for service in services:
+            print(f"Load test: {service}", file=sys.stderr)
+            if service == "backend":
+                result["load"][service] = load.run_backend(
+                    workdir, args.concurrency, args.duration, args.warmup, args.seed,
+                    args.llm_latency_ms)
+            else:
+                result["load"][service] = load.run_inference(
+                    workdir, args.concurrency, args.duration, args.warmup, args.seed)
+
+    result["meta"]["seconds"] = round(time.time() - started, 1)
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(text + "\n")
+        print(f"Written to {args.out}", file=sys.stderr)
+    else:
+        print(text)
+    return 0
+
+
+def metrics(result: Dict[str, Any]) -> Iterator[Tuple[str, float]]:
+    """Comparable leaves of a result file as (dotted.path, value), meta excluded."""
+    def walk(prefix: str, node: Any) -> Iterator[Tuple[str, float]]:
+        if isinstance(node, dict):
+            for key, value in node.items():
+                yield from walk(f"{prefix}.{key}" if prefix else key, value)
+        elif isinstance(node, (int, float)) and not isinstance(node, bool):
+            yield prefix, float(node)
+
+    for section in ("micro", "load"):
+        yield from walk(section, result.get(section, {}))
+
+
+def lower_is_better(name: str) -> bool | None:
+    """Direction of a metric; None for metrics that are not compared (counts, settings)."""
+    leaf = name.rsplit(".", 1)[-1]
+    if leaf == "max_ms":
+        return None             # a single sample, too noisy to compare
+    if leaf.endswith(("_ms", "_mb", "_seconds")) or ".assets." in name:
+        return True
+    if leaf == "throughput":
+        return False
+    return None
+
+
+def compare(args: argparse.Namespace) -> int:
+    old = dict(metrics(json.loads(Path(args.old).read_text())))
+    new = dict(metrics(json.loads(Path(args.new).read_text())))
+
+    regressions = 0
+    width = max(map(len, old.keys() | new.keys()), default=10)
+    print(f"{'metric':<{width}}  {'old':>12}  {'new':>12}  {'change':>8}")
+    for name in sorted(old.keys() & new.keys()):
+        direction = lower_is_better(name)
+        if direction is None:
+            continue
+        a, b = old[name], new[name]
+        change = (b - a) / a if a else 0.0
+        worse = change > args.threshold if direction else change < -args.threshold
+        better = change < -args.threshold if direction else change > args.threshold
+        mark = "REGRESSION" if worse else "improved" if better else ""
+        regressions += worse
+        print(f"{name:<{width}}  {a:>12.4f}  {b:>12.4f}  {change:>+8.1%}  {mark}")
+
+    for name in sorted(old.keys() ^ new.keys()):
+        print(f"{name:<{width}}  only in {'old' if name in old else 'new'}")
+
+    print(f"\n{regressions} regression(s) beyond {args.threshold:.0%}")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench", description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(required=True)
+
+    p = commands.add_parser("run", help="generate data and run the benchmarks")
+    p.add_argument("--workdir", default=str(REPO / "bench" / ".work"))
+    p.add_argument("--out", help="write the JSON here instead of stdout")
+    p.add_argument("--services", default=",".join(SERVICES),
+                   help="comma separated subset of: " + ", ".join(SERVICES))
+    p.add_argument("--rows", type=int, default=50_000, help="companies in the feature table")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--csv-only", action="store_true", help="do not write Parquet copies")
+    p.add_argument("--seconds", type=float, default=1.0, help="minimal time per micro-benchmark")
+    p.add_argument("--concurrency", type=int, default=16, help="requests in flight under load")
+    p.add_argument("--duration", type=float, default=10.0, help="seconds per load scenario")
+    p.add_argument("--warmup", type=float, default=1.0, help="seconds of load before measuring")
+    p.add_argument("--llm-latency-ms", type=float, default=50.0, help="latency of the stub LLM")
+    p.add_argument("--no-micro", action="store_true")
+    p.add_argument("--no-load", action="store_true")
+    p.set_defaults(func=run)
+
+    p = commands.add_parser("compare", help="compare two result files")
+    p.add_argument("old")
+    p.add_argument("new")
+    p.add_argument("--threshold", type=float, default=0.1,
+                   help="relative change that counts as a regression")
+    p.add_argument("--fail-on-regression", action="store_true",
+                   help="exit with 1 if anything regressed")
+    p.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+"""
+HTTP load against the real FastAPI apps: each service is started with
+uvicorn in its own process on the synthetic workdir, then every scenario
+is driven by a closed-loop async client (`concurrency` requests in flight)
+for `duration` seconds after a short warm-up. The backend's LLM routes talk
+to stub_llm.py instead of YandexGPT.
+"""
+import asyncio
+import itertools
+import os
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+import pandas as pd
+
+from bench.stats import rss, summarize
+from bench.synthetic import BACKEND_SRC, FEATURES_CSV, INFERENCE_SRC, sample_texts
+
+BENCH_DIR = Path(__file__).resolve().parent
+
+# (method, url, keyword arguments for httpx) for the i-th request of a scenario
+RequestFactory = Callable[[int], Tuple[str, str, Dict[str, Any]]]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Server:
+    """A uvicorn process serving `app`; the log goes to <workdir>/logs/<name>.log."""
+
+    def __init__(self, name: str, app: str, app_dir: Path, cwd: str | Path, workdir: str | Path,
+                 env: Optional[Dict[str, str]] = None, ready_path: str = "/openapi.json",
+                 ready: Callable[[httpx.Response], bool] = lambda r: r.status_code == 200,
+                 ready_timeout: float = 300.0) -> None:
+        self.name = name
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.ready_path = ready_path
+        self.ready = ready
+        self.ready_timeout = ready_timeout
+        self.log_path = Path(workdir) / "logs" / f"{name}.log"
+        self._args = [sys.executable, "-m", "uvicorn", app, "--app-dir", str(app_dir),
+                      "--host", "127.0.0.1", "--port", str(self.port), "--log-level", "warning"]
+        self._cwd = cwd
+        self._env = {**os.environ, **(env or {})}
+        self.process: Optional[subprocess.Popen] = None
+        self.startup_seconds: Optional[float] = None
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    def start(self) -> "Server":
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        log = open(self.log_path, "w")
+        started = time.perf_counter()
+        self.process = subprocess.Popen(self._args, cwd=self._cwd, env=self._env,
+                                        stdout=log, stderr=subprocess.STDOUT)
+        log.close()
+
+        deadline = started + self.ready_timeout
+        while time.perf_counter() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"{self.name} exited with {self.process.returncode}, "
+                                   f"see {self.log_path}")
+            try:
+                if self.ready(httpx.get(self.url + self.ready_path, timeout=5)):
+                    self.startup_seconds = round(time.perf_counter() - started, 3)
+                    return self
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.1)
+        self.stop()
+        raise TimeoutError(f"{self.name} not ready after {self.ready_timeout} s, see {self.log_path}")
+
+    def stop(self) -> None:
+        if self.process is None or self.process.poll() is not None:
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+    def __enter__(self) -> "Server":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+async def drive(client: httpx.AsyncClient, make_request: RequestFactory,
+                concurrency: int, duration: float, warmup: float = 1.0) -> Dict[str, Any]:
+    """
+    Keeps `concurrency` requests in flight for warmup + duration seconds;
+    only the requests started after the warm-up are counted. Responses
+    with status >= 400 and transport errors are counted as errors.
+    """
+    counter = itertools.count()
+    latencies: List[float] = []
+    errors: Counter = Counter()
+    clock = time.perf_counter
+    measure_from = clock() + warmup
+    deadline = measure_from + duration
+
+    async def worker() -> None:
+        while True:
+            t0 = clock()
+            if t0 >= deadline:
+                return
+            method, url, kwargs = make_request(next(counter))
+            try:
+                response = await client.request(method, url, **kwargs)
+                error = str(response.status_code) if response.status_code >= 400 else None
+            except httpx.HTTPError as err:
+                error = type(err).__name__
+            if t0 < measure_from:
+                continue
+            if error is None:
+                latencies.append(clock() - t0)
+            else:
+                errors[error] += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    summary = summarize(latencies, elapsed=duration)
+    summary["errors"] = dict(errors)
+    return summary
+
+
+def run_scenarios(server: Server, scenarios: Dict[str, RequestFactory],
+                  concurrency: int, duration: float, warmup: float) -> Dict[str, Any]:
+    async def main() -> Dict[str, Any]:
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        results = {}
+        async with httpx.AsyncClient(base_url=server.url, limits=limits, timeout=60) as client:
+            for name, make_request in scenarios.items():
+                results[name] = await drive(client, make_request, concurrency, duration, warmup)
+                results[name]["rss_mb"] = rss(server.pid)["rss_mb"]
+        return results
+
+    scenarios_result = asyncio.run(main())
+    return {
+        "startup_seconds": server.startup_seconds,
+        "concurrency": concurrency,
+        "duration": duration,
+        **rss(server.pid),
+        "scenarios": scenarios_result,
+    }
+
+
+def backend_scenarios(workdir: Path, seed: int) -> Dict[str, RequestFactory]:
+    from raw_store import RAW_TABLE_FILES
+
+    data = workdir / "data"
+    rng = np.random.default_rng(seed)
+    inns = pd.read_csv(data / FEATURES_CSV, usecols=["inn"], dtype=str)["inn"].to_numpy()
+    inns = rng.choice(inns, size=10_000)
+    raw_inns = pd.read_csv(data / Path(RAW_TABLE_FILES["egrul"]).name, usecols=["inn"],
+                           dtype=str)["inn"].unique()
+    raw_inns = rng.choice(raw_inns, size=10_000)
+
+    def get(path: Callable[[int], str], params: Callable[[int], dict] = lambda i: {}):
+        return lambda i: ("GET", path(i), {"params": params(i)})
+
+    def inn(i: int) -> str:
+        return inns[i % len(inns)]
+
+    return {
+        "analyze": get(lambda i: "/v1/analyze", lambda i: {"inn": inn(i)}),
+        "stats_all": get(lambda i: "/v1/stats/all", lambda i: {"inn": inn(i)}),
+        "company": get(lambda i: f"/v1/company/{inn(i)}"),
+        "peers": get(lambda i: "/v1/stats/peers", lambda i: {"inn": inn(i), "category": "financial"}),
+        "raw": get(lambda i: "/v1/raw/egrul", lambda i: {"inn": raw_inns[i % len(raw_inns)]}),
+        # distinct texts, so every request reaches the stub instead of the LLM cache
+        "chat": get(lambda i: "/v1/chat",
+                    lambda i: {"text": f"Вопрос {i}", "api_key": "bench", "folder_id": "bench"}),
+        "explain": get(lambda i: "/v1/explain", lambda i: {"inn": inn(i)}),
+    }
+
+
+def inference_scenarios(seed: int) -> Dict[str, RequestFactory]:
+    texts = sample_texts(1024, seed=seed)
+
+    def predict(size: int, **options) -> RequestFactory:
+        def make(i: int):
+            start = (i * size) % len(texts)
+            inputs = [{"data": text} for text in texts[start:start + size]]
+            return "POST", "/predict/arbitr", {"json": {"inputs": inputs, **options}}
+        return make
+
+    return {
+        "predict_1": predict(1),
+        "predict_8": predict(8),
+        "predict_1_no_attributions": predict(1, return_attributions=False),
+    }
+
+
+def run_backend(workdir: Path, concurrency: int, duration: float, warmup: float,
+                seed: int, llm_latency_ms: float) -> Dict[str, Any]:
+    if str(BACKEND_SRC) not in sys.path:
+        sys.path.insert(0, str(BACKEND_SRC))
+
+    stub = Server("stub_llm", "stub_llm:app", BENCH_DIR, BENCH_DIR, workdir,
+                  env={"STUB_LLM_LATENCY_MS": str(llm_latency_ms)})
+    with stub:
+        backend = Server(
+            "backend", "main:app", BACKEND_SRC, workdir / "src", workdir,
+            env={
+                "DATABASE_URL": f"sqlite:///{workdir}/bench.sqlite",
+                "YANDEX_CLOUD_API_KEY": "bench",
+                "YANDEX_CLOUD_FOLDER_ID": "bench",
+                "YANDEX_GPT_URL": f"{stub.url}/completion",
+                "REDIS_URL": "",
+            },
+            ready_path="/health/ready",
+            # scenarios also hit the optional assets (raw tables, peers)
+            ready=lambda r: r.status_code == 200 and not r.json()["loading"],
+        )
+        with backend:
+            result = run_scenarios(backend, backend_scenarios(workdir, seed),
+                                   concurrency, duration, warmup)
+        result["llm_calls"] = httpx.get(f"{stub.url}/calls").json()["count"]
+    return result
+
+
+def run_inference(workdir: Path, concurrency: int, duration: float, warmup: float,
+                  seed: int) -> Dict[str, Any]:
+    server = Server("inference", "main:app", INFERENCE_SRC, INFERENCE_SRC, workdir,
+                    env={"MODEL_DIR": str(workdir / "models" / "bert")})
+    with server:
+        return run_scenarios(server, inference_scenarios(seed), concurrency, duration, warmup)
@@ -0,0 +1,104 @@
+"""
+Micro-benchmarks of the backend hot paths, run in-process against the
+synthetic workdir. Prints one JSON object to stdout; started by
+`python -m bench run`, but can be run alone:
+
+    python -m bench.micro_backend --workdir bench/.work
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from bench.stats import measure, rss
+from bench.synthetic import BACKEND_SRC
+
+
+def load_backend(workdir: str):
+    """Imports the routers from <workdir>/src and loads every asset synchronously."""
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.abspath(workdir)}/bench.sqlite")
+    os.environ.setdefault("YANDEX_CLOUD_API_KEY", "bench")
+    os.environ.setdefault("YANDEX_CLOUD_FOLDER_ID", "bench")
+    os.environ.pop("REDIS_URL", None)
+    os.chdir(os.path.join(workdir, "src"))
+    sys.path.insert(0, str(BACKEND_SRC))
+
+    import routers
+
+    async def load() -> None:
+        routers.assets.start()
+        await routers.assets.wait()
+
+    asyncio.run(load())
+    status = routers.assets.status()
+    failed = {name: a["error"] for name, a in status["assets"].items() if a["state"] != "ready"}
+    # importance is optional: nothing is precomputed for the synthetic model
+    failed.pop("importance", None)
+    if failed:
+        raise RuntimeError(f"Assets failed to load: {failed}")
+    return routers, status
+
+
+def run(workdir: str, seconds: float, samples: int, seed: int) -> dict:
+    started = time.perf_counter()
+    routers, status = load_backend(workdir)
+    startup = time.perf_counter() - started
+    loaded = rss()
+
+    from fastapi import HTTPException
+
+    source = routers.stats_source
+    rng = np.random.default_rng(seed)
+    inns = [str(inn) for inn in rng.choice(list(source.index), size=samples)]
+    positions = [source.get_position(inn) for inn in inns]
+    raw = routers.raw_tables["egrul"]
+    raw_inns = [inn for inn in inns if raw.get(inn) is not None] or inns[:1]
+
+    def analyze(inn: str):
+        # what the uncached /v1/analyze does, without the threadpool hop
+        return routers._json(routers._analysis_json(inn, source.get_position(inn)))
+
+    def raw_text(inn: str):
+        try:
+            return routers._get_data_text("egrul", inn)
+        except HTTPException:
+            return None
+
+    cases = {
+        "company.get_row": (source.get_row, inns),
+        "company.get_category_stats": (lambda inn: source.get_category_stats(inn, "financial"), inns),
+        "company.all_stats_json": (source.all_stats_json, positions),
+        "routers.analyze_company": (analyze, inns),
+        "routers._get_data_text": (raw_text, raw_inns),
+        "peers.compare": (lambda inn: routers.peer_index.compare(inn, "financial"), inns),
+    }
+    results = {name: measure(func, inputs, min_seconds=seconds) for name, (func, inputs) in cases.items()}
+
+    return {
+        "rows": len(source),
+        "startup_seconds": round(startup, 3),
+        "assets": {name: a["seconds"] for name, a in status["assets"].items()},
+        "rss_mb": loaded["rss_mb"],
+        "peak_rss_mb": rss()["peak_rss_mb"],
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Backend micro-benchmarks")
+    parser.add_argument("--workdir", default="bench/.work")
+    parser.add_argument("--seconds", type=float, default=1.0,
+                        help="minimal time per benchmark")
+    parser.add_argument("--samples", type=int, default=1000, help="distinct INNs per benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    workdir = os.path.abspath(args.workdir)
+    print(json.dumps(run(workdir, args.seconds, args.samples, args.seed)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Micro-benchmarks of the inference-server hot paths with the tiny synthetic
+BERT from the workdir. Prints one JSON object to stdout:
+
+    python -m bench.micro_inference --workdir bench/.work
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from bench.stats import measure, rss
+from bench.synthetic import INFERENCE_SRC, sample_texts, vocabulary
+
+
+def load_inference(workdir: str):
+    """Imports main with models from <workdir>/models/bert and warms them up like the lifespan does."""
+    os.environ["MODEL_DIR"] = os.path.join(workdir, "models", "bert")
+    sys.path.insert(0, str(INFERENCE_SRC))
+
+    import torch
+    import main
+
+    torch.set_num_threads(main._worker_threads())
+    main.warm_up()
+    return main
+
+
+def run(workdir: str, seconds: float, samples: int, seed: int) -> dict:
+    started = time.perf_counter()
+    main = load_inference(workdir)
+    startup = time.perf_counter() - started
+    loaded = rss()
+
+    import torch
+    from schemas import InferenceRequest
+
+    def request(texts, **options) -> InferenceRequest:
+        return InferenceRequest(inputs=[{"data": text} for text in texts], **options)
+
+    texts = sample_texts(samples * 16, seed=seed)
+    long_texts = sample_texts(samples, seed=seed + 1, min_words=800, max_words=1500)
+    single = [request([text]) for text in texts[:samples]]
+    batches = [request(texts[i:i + 16]) for i in range(0, samples * 16, 16)]
+    no_attributions = [request([text], return_attributions=False) for text in texts[:samples]]
+    windowed = [request([text], windowed=True) for text in long_texts]
+
+    # compute_top20 at BERT-base shape: 12 heads, batch of 16, 256 tokens
+    _, tokenizer = main.load_model(main.MODEL_REGISTRY["arbitr"], main.MODEL_BACKENDS["arbitr"])
+    generator = torch.Generator().manual_seed(seed)
+    attentions = [torch.softmax(torch.randn(16, 12, 256, 256, generator=generator), dim=-1)
+                  for _ in range(4)]
+    input_ids = torch.randint(5, 5 + len(vocabulary()), (16, 256), generator=generator)
+
+    def predict(req: InferenceRequest):
+        return main.predict("arbitr", req)
+
+    cases = {
+        "predict.single": (predict, single),
+        "predict.batch16": (predict, batches),
+        "predict.no_attributions": (predict, no_attributions),
+        "predict.windowed": (predict, windowed),
+        "compute_top20": (lambda attn: main.compute_top20(attn, input_ids, tokenizer), attentions),
+    }
+    results = {name: measure(func, inputs, warmup=2, min_seconds=seconds)
+               for name, (func, inputs) in cases.items()}
+
+    return {
+        "torch_threads": torch.get_num_threads(),
+        "startup_seconds": round(startup, 3),
+        "rss_mb": loaded["rss_mb"],
+        "peak_rss_mb": rss()["peak_rss_mb"],
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Inference-server micro-benchmarks")
+    parser.add_argument("--workdir", default="bench/.work")
+    parser.add_argument("--seconds", type=float, default=1.0,
+                        help="minimal time per benchmark")
+    parser.add_argument("--samples", type=int, default=32, help="distinct requests per benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    workdir = os.path.abspath(args.workdir)
+    print(json.dumps(run(workdir, args.seconds, args.samples, args.seed)))
+
+
+if __name__ == "__main__":
+    main()
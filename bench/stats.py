@@ -0,0 +1,93 @@
+"""
+Latency summaries and process memory readings shared by the micro and
+load benchmarks.
+"""
+import os
+import resource
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """q-th percentile (0..100) of an already sorted list, linear interpolation."""
+    if not sorted_values:
+        return float("nan")
+    idx = q / 100 * (len(sorted_values) - 1)
+    lo = int(idx)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (idx - lo)
+
+
+def summarize(latencies: List[float], elapsed: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Count, throughput and latency percentiles in milliseconds for latencies
+    given in seconds. Without `elapsed` throughput is 1 / mean latency.
+    """
+    values = sorted(latencies)
+    n = len(values)
+    total = sum(values)
+    elapsed = total if elapsed is None else elapsed
+    summary: Dict[str, Any] = {
+        "n": n,
+        "throughput": round(n / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(total / n * 1000, 4) if n else None,
+    }
+    for q in PERCENTILES:
+        summary[f"p{q}_ms"] = round(percentile(values, q) * 1000, 4) if n else None
+    summary["max_ms"] = round(values[-1] * 1000, 4) if n else None
+    return summary
+
+
+def measure(func: Callable[[Any], Any], inputs: List[Any], warmup: int = 10,
+            min_seconds: float = 0.0) -> Dict[str, Any]:
+    """
+    Calls func(x) for every x in inputs (repeating the list until
+    min_seconds have passed) and times each call separately.
+    """
+    for x in inputs[:warmup]:
+        func(x)
+
+    latencies: List[float] = []
+    clock = time.perf_counter
+    started = clock()
+    while True:
+        for x in inputs:
+            t0 = clock()
+            func(x)
+            latencies.append(clock() - t0)
+        if clock() - started >= min_seconds:
+            break
+    return summarize(latencies)
+
+
+def _proc_status(pid: int) -> Dict[str, int]:
+    """VmRSS / VmHWM of a process in bytes from /proc (Linux only)."""
+    values = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in ("VmRSS", "VmHWM"):
+                    values[key] = int(rest.split()[0]) * 1024
+    except OSError:
+        pass
+    return values
+
+
+def rss(pid: Optional[int] = None) -> Dict[str, Optional[float]]:
+    """Current and peak resident set size in MiB of pid (default: this process)."""
+    status = _proc_status(pid or os.getpid())
+    current = status.get("VmRSS")
+    peak = status.get("VmHWM")
+    if peak is None and pid is None:
+        # ru_maxrss is in KiB on Linux and in bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak *= 1 if sys.platform == "darwin" else 1024
+    mib = 1024 * 1024
+    return {
+        "rss_mb": None if current is None else round(current / mib, 1),
+        "peak_rss_mb": None if peak is None else round(peak / mib, 1),
+    }
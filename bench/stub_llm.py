@@ -0,0 +1,51 @@
+"""
+Stand-in for the YandexGPT completion endpoint, so LLM-backed routes can be
+load-tested offline. Answers after STUB_LLM_LATENCY_MS milliseconds; with
+"stream": true the answer is sent in STUB_LLM_CHUNKS cumulative chunks like
+the real API does.
+
+    uvicorn stub_llm:app --app-dir bench --port 8799
+"""
+import asyncio
+import json
+from os import environ
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+LATENCY = float(environ.get("STUB_LLM_LATENCY_MS", 50)) / 1000
+CHUNKS = int(environ.get("STUB_LLM_CHUNKS", 8))
+
+app = FastAPI(title="Stub YandexGPT")
+calls = {"count": 0}
+
+
+def _alternative(text: str, status: str) -> str:
+    return json.dumps({"result": {"alternatives": [
+        {"message": {"role": "assistant", "text": text}, "status": status}
+    ]}}, ensure_ascii=False)
+
+
+@app.post("/completion")
+async def completion(request: Request):
+    body = await request.json()
+    calls["count"] += 1
+    prompt = body["messages"][-1]["text"]
+    answer = f"Ответ заглушки на запрос из {len(prompt)} символов. " * 4
+
+    if not body.get("completionOptions", {}).get("stream"):
+        await asyncio.sleep(LATENCY)
+        return json.loads(_alternative(answer, "ALTERNATIVE_STATUS_FINAL"))
+
+    async def chunks():
+        step = max(1, len(answer) // CHUNKS)
+        for end in range(step, len(answer) + step, step):
+            await asyncio.sleep(LATENCY / CHUNKS)
+            yield _alternative(answer[:end], "ALTERNATIVE_STATUS_PARTIAL") + "\n"
+
+    return StreamingResponse(chunks(), media_type="application/json")
+
+
+@app.get("/calls")
+def calls_made():
+    return calls
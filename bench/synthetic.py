@@ -0,0 +1,203 @@
+"""
+Synthetic inputs for the benchmarks, laid out the way both services expect
+them on disk (the backend runs from <workdir>/src and reads ../data and
+../models):
+
+    data/full_transformed_wo_target.csv   every CATEGORY_FIELDS column
+    data/<table>.csv                       inn, data_text per RAW_TABLE_FILES
+    models/catboost_model-2.cbm            small CatBoost on the numeric columns
+    models/bert/<key>/                     tiny random BERT + tokenizer per model key
+
+Everything is generated from one seed, so two runs with the same arguments
+benchmark identical inputs. A manifest.json records the arguments; an
+existing workdir with the same manifest is reused as is.
+"""
+import json
+import shutil
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+REPO = Path(__file__).resolve().parent.parent
+BACKEND_SRC = REPO / "backend" / "src"
+INFERENCE_SRC = REPO / "inference-server" / "src"
+
+# Keys of MODEL_REGISTRY in inference-server/src/main.py
+BERT_KEYS = ("arbitr", "egrul", "contracts", "finances", "enforcements")
+
+FEATURES_CSV = "full_transformed_wo_target.csv"
+MODEL_FILE = "catboost_model-2.cbm"
+
+MANIFEST_VERSION = 1
+
+MSP_CATEGORIES = ("Микропредприятие", "Малое предприятие", "Среднее предприятие")
+FLAG_FIELDS = {"mass_address", "mass_director", "illegal_finance"}
+
+_SYLLABLES = ("ка", "ло", "ре", "ми", "ст", "на", "во", "ду", "пр", "ти",
+              "ор", "ган", "су", "де", "бо", "за", "ко", "ль", "ны", "ве")
+
+
+def backend_imports() -> None:
+    if str(BACKEND_SRC) not in sys.path:
+        sys.path.insert(0, str(BACKEND_SRC))
+
+
+def vocabulary(size: int = 400, seed: int = 0) -> List[str]:
+    """Distinct alphabetic pseudo-words; the tiny BERT vocab is built from them."""
+    rng = np.random.default_rng(seed)
+    words: Dict[str, None] = {}
+    while len(words) < size:
+        n = int(rng.integers(2, 5))
+        words["".join(rng.choice(_SYLLABLES, size=n))] = None
+    return list(words)
+
+
+def sample_texts(n: int, seed: int = 0, min_words: int = 10, max_words: int = 400) -> List[str]:
+    """n texts of random length from the benchmark vocabulary."""
+    rng = np.random.default_rng(seed)
+    words = np.array(vocabulary())
+    lengths = rng.integers(min_words, max_words + 1, size=n)
+    return [" ".join(rng.choice(words, size=int(k))) for k in lengths]
+
+
+def _column(name: str, n: int, rng: np.random.Generator) -> np.ndarray:
+    """Values of one feature column; the kind is guessed from the column name."""
+    if name == "msp_category":
+        return rng.choice(MSP_CATEGORIES, size=n)
+    if name == "main_okved":
+        return np.char.add(rng.integers(1, 99, n).astype(str),
+                           np.char.add(".", rng.integers(10, 99, n).astype(str)))
+    if name == "main_okved2":
+        return rng.integers(1, 99, n)
+    if name == "region2":
+        return rng.integers(1, 90, n)
+    if name.endswith("_flag") or name.startswith("has_") or name in FLAG_FIELDS:
+        return (rng.random(n) < 0.1).astype(np.int8)
+    if name.endswith("_bin"):
+        return rng.integers(0, 5, n)
+    if (name.startswith(("cnt_", "num_", "uniq_")) or name.endswith(("_cnt", "_cases_total")) or
+            "days_ago" in name or name.endswith("_age") or "years" in name):
+        return rng.poisson(5, n)
+    values = rng.lognormal(mean=0.0, sigma=2.0, size=n) * rng.choice([-1.0, 1.0], n, p=[0.2, 0.8])
+    values[rng.random(n) < 0.05] = np.nan
+    return values
+
+
+def make_features(rows: int, seed: int) -> pd.DataFrame:
+    backend_imports()
+    from company import CompanyStatsFromLocal
+
+    rng = np.random.default_rng(seed)
+    columns = {"inn": np.arange(1_000_000_000, 1_000_000_000 + rows).astype(str)}
+    for name in CompanyStatsFromLocal.required_columns():
+        if name != "inn":
+            columns[name] = _column(name, rows, rng)
+    return pd.DataFrame(columns)
+
+
+def train_catboost(df: pd.DataFrame, path: Path, seed: int, iterations: int) -> List[str]:
+    """Fits a small classifier on the numeric columns; the target depends on a few of them."""
+    from catboost import CatBoostClassifier
+
+    X = df.drop(columns=["inn"]).select_dtypes("number")
+    X = X.sample(n=min(len(X), 20_000), random_state=seed)
+    rng = np.random.default_rng(seed)
+    signal = sum(np.nan_to_num(np.sign(X[c].to_numpy(np.float64))) for c in X.columns[:8])
+    y = (signal + rng.normal(0, 2, len(X)) > 0).astype(int)
+
+    model = CatBoostClassifier(iterations=iterations, depth=6, random_seed=seed,
+                               verbose=0, allow_writing_files=False)
+    model.fit(X, y)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    model.save_model(str(path))
+    return list(model.feature_names_)
+
+
+def make_raw_tables(inns: np.ndarray, data_dir: Path, seed: int, share: float) -> Dict[str, int]:
+    """For each raw table: 1-3 data_text rows for a `share` of the INNs."""
+    backend_imports()
+    from raw_store import RAW_TABLE_FILES
+
+    words = np.array(vocabulary())
+    counts = {}
+    for i, (name, csv_path) in enumerate(RAW_TABLE_FILES.items()):
+        rng = np.random.default_rng(seed + 1 + i)
+        picked = inns[rng.random(len(inns)) < share]
+        repeats = rng.integers(1, 4, len(picked))
+        table_inns = np.repeat(picked, repeats)
+        lengths = rng.integers(10, 60, len(table_inns))
+        texts = [" ".join(rng.choice(words, size=int(k))) for k in lengths]
+        pd.DataFrame({"inn": table_inns, "data_text": texts}).to_csv(
+            data_dir / Path(csv_path).name, index=False)
+        counts[name] = len(table_inns)
+    return counts
+
+
+def make_bert(directory: Path, seed: int) -> None:
+    """Two-layer BERT with random weights and a word-level vocabulary."""
+    import torch
+    from transformers import BertConfig, BertForSequenceClassification, BertTokenizerFast
+
+    directory.mkdir(parents=True, exist_ok=True)
+    vocab_file = directory / "vocab.txt"
+    vocab_file.write_text("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", *vocabulary()]) + "\n",
+                          encoding="utf-8")
+    tokenizer = BertTokenizerFast(vocab_file=str(vocab_file), do_lower_case=False,
+                                  model_max_length=512)
+
+    torch.manual_seed(seed)
+    config = BertConfig(vocab_size=len(tokenizer), hidden_size=64, num_hidden_layers=2,
+                        num_attention_heads=2, intermediate_size=128,
+                        max_position_embeddings=512, num_labels=2)
+    model = BertForSequenceClassification(config)
+    model.eval()
+    model.save_pretrained(directory)
+    tokenizer.save_pretrained(directory)
+
+
+def prepare(workdir: str | Path, rows: int = 50_000, seed: int = 0, raw_share: float = 0.5,
+            catboost_iterations: int = 100, parquet: bool = True) -> Dict[str, object]:
+    """Generates everything into workdir unless it already holds the same inputs."""
+    workdir = Path(workdir)
+    manifest = {"version": MANIFEST_VERSION, "rows": rows, "seed": seed, "raw_share": raw_share,
+                "catboost_iterations": catboost_iterations, "parquet": parquet}
+    manifest_path = workdir / "manifest.json"
+    if manifest_path.is_file():
+        existing = json.loads(manifest_path.read_text())
+        if {k: existing.get(k) for k in manifest} == manifest:
+            return existing
+        manifest_path.unlink()
+
+    data_dir, models_dir = workdir / "data", workdir / "models"
+    data_dir.mkdir(parents=True, exist_ok=True)
+    (workdir / "src").mkdir(exist_ok=True)
+    for stale in ("raw", "scores", "importance"):
+        # indexes built from older inputs would not match the new CSVs; the
+        # score store keeps one subdirectory per model version
+        shutil.rmtree(data_dir / stale, ignore_errors=True)
+
+    df = make_features(rows, seed)
+    df.to_csv(data_dir / FEATURES_CSV, index=False)
+    features = train_catboost(df, models_dir / MODEL_FILE, seed, catboost_iterations)
+    raw_rows = make_raw_tables(df["inn"].to_numpy(), data_dir, seed, raw_share)
+    for i, key in enumerate(BERT_KEYS):
+        make_bert(models_dir / "bert" / key, seed + i)
+
+    if parquet:
+        backend_imports()
+        from columnar import convert
+        from raw_store import RAW_TABLE_FILES
+
+        convert(data_dir / FEATURES_CSV, compact=True)
+        for csv_path in RAW_TABLE_FILES.values():
+            convert(data_dir / Path(csv_path).name)
+    else:
+        for path in data_dir.glob("*.parquet"):
+            path.unlink()
+
+    manifest.update(features=len(features), raw_rows=raw_rows)
+    manifest_path.write_text(json.dumps(manifest, indent=2, ensure_ascii=False))
+    return manifest
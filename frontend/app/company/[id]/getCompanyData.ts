@@ -83,24 +83,18 @@ export interface CompanyData {
 }
 
 export async function getCompanyData(inn: string): Promise<CompanyData & { statsAll: any }> {
-  const [analyzeRes, statsRes] = await Promise.all([
-    fetch(`http://localhost:8000/v1/analyze/?inn=${encodeURIComponent(inn)}`, { cache: "no-store" }),
-    fetch(`http://localhost:8000/v1/stats/all/?inn=${encodeURIComponent(inn)}`, { cache: "no-store" }),
-  ])
+  // Один запрос за скором, SHAP и статистикой; "no-cache" даёт браузеру
+  // перепроверить ответ по ETag и получить 304, если компания не менялась
+  const res = await fetch(`http://localhost:8000/v1/company/${encodeURIComponent(inn)}`, { cache: "no-cache" })
 
-  if (!analyzeRes.ok) {
-    throw new Error(`Failed to load company data (${analyzeRes.status})`)
+  if (!res.ok) {
+    throw new Error(`Failed to load company data (${res.status})`)
   }
 
-  if (!statsRes.ok) {
-    throw new Error(`Failed to load stats data (${statsRes.status})`)
-  }
-
-  const analyzeData = await analyzeRes.json()
-  const statsData = await statsRes.json()
+  const { stats, ...analyzeData } = await res.json()
 
   return {
     ...analyzeData,
-    statsAll: statsData
+    statsAll: stats
   }
 }
\ No newline at end of file
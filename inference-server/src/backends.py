@@ -0,0 +1,258 @@
+"""
+Model execution backends for the classifiers.
+
+All backends take a padded tokenizer batch and return
+(logits [batch, labels], CLS attention row of the last layer [batch, seq] or None):
+
+  torch  full-precision PyTorch weights
+  int8   PyTorch with dynamic int8 quantization of the Linear layers
+  onnx   the model exported to ONNX and run with onnxruntime; the weights live in
+         a separate file that onnxruntime maps into memory, so forked workers
+         share one copy of them through the page cache
+"""
+import hashlib
+import math
+import os
+import re
+import shutil
+import tempfile
+import threading
+from os import environ
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import torch
+
+BACKENDS = ("torch", "int8", "onnx")
+
+ONNX_CACHE_DIR = Path(environ.get("ONNX_CACHE_DIR",
+                                  Path.home() / ".cache" / "inference-server" / "onnx"))
+
+# onnxruntime pre-packs MatMul weights into a private copy per session: about
+# 10% faster on CPU, but every worker then holds its own copy of the weights
+ONNX_PREPACK = environ.get("ONNX_PREPACK", "0") == "1"
+
+
+def parse_backends(spec: str) -> Dict[str, str]:
+    """Parses "arbitr=int8,egrul=onnx" into {"arbitr": "int8", "egrul": "onnx"}."""
+    backends = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        key, _, backend = part.partition("=")
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend '{backend}' for '{key}', expected one of {BACKENDS}")
+        backends[key.strip()] = backend
+    return backends
+
+
+def last_self_attention(model):
+    """Last encoder layer's self-attention of a BERT-like model, if it has one."""
+    try:
+        attn = model.base_model.encoder.layer[-1].attention.self
+    except (AttributeError, IndexError):
+        return None
+    if not all(hasattr(attn, name) for name in
+               ("query", "key", "num_attention_heads", "attention_head_size")):
+        return None
+    return attn
+
+
+def cls_attention(attn, hidden: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+    """
+    Recomputes only the CLS row of `attn`'s attention probabilities,
+    averaged over heads: [batch, seq] instead of [batch, heads, seq, seq].
+    """
+    batch, seq, _ = hidden.shape
+    heads, size = attn.num_attention_heads, attn.attention_head_size
+    query = attn.query(hidden[:, :1]).view(batch, 1, heads, size).transpose(1, 2)
+    key = attn.key(hidden).view(batch, seq, heads, size).transpose(1, 2)
+    scores = (query @ key.transpose(-1, -2)).squeeze(2) / math.sqrt(size)
+    scores = scores.masked_fill(attention_mask[:, None, :] == 0, torch.finfo(scores.dtype).min)
+    return torch.softmax(scores, dim=-1).mean(dim=1)
+
+
+def forward_with_cls(model, enc, attributions: bool = True
+) -> Tuple[torch.Tensor, Optional[torch.Tensor]]:
+    """
+    Runs the model without materializing per-layer attention matrices.
+    The CLS attention row is captured by a forward hook on the last
+    self-attention; models without one fall back to output_attentions.
+    """
+    attn = last_self_attention(model) if attributions else None
+
+    if attributions and attn is None:
+        out = model(**enc, output_attentions=True)
+        return out.logits, out.attentions[-1].mean(dim=1)[:, 0, :]
+
+    captured = {}
+
+    def hook(module, args, kwargs, output):
+        hidden = args[0] if args else kwargs["hidden_states"]
+        captured["cls"] = cls_attention(module, hidden, enc["attention_mask"])
+
+    handle = attn.register_forward_hook(hook, with_kwargs=True) if attn is not None else None
+    try:
+        out = model(**enc, output_attentions=False)
+    finally:
+        if handle is not None:
+            handle.remove()
+    return out.logits, captured.get("cls")
+
+
+class TorchBackend:
+    def __init__(self, model):
+        self.model = model
+        self.config = model.config
+
+    def __call__(self, enc, attributions: bool = True
+    ) -> Tuple[torch.Tensor, Optional[torch.Tensor]]:
+        with torch.no_grad():
+            return forward_with_cls(self.model, enc, attributions)
+
+
+def quantize_int8(model):
+    """Dynamic int8 quantization of all Linear layers (weights int8, activations fp32)."""
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class _ExportWrapper(torch.nn.Module):
+    """Returns (logits, CLS attention row) so both end up as ONNX graph outputs."""
+
+    def __init__(self, model, input_names):
+        super().__init__()
+        self.model = model
+        self.input_names = input_names
+
+    def forward(self, *inputs):
+        enc = dict(zip(self.input_names, inputs))
+        return forward_with_cls(self.model, enc, attributions=True)
+
+
+def export_onnx(model, tokenizer, path: Path) -> None:
+    """
+    Exports into a directory of its own: path (the graph) and path + ".data"
+    (the weights, stored as ONNX external data).
+    """
+    sample = tokenizer(["export sample", "a slightly longer export sample"],
+                       padding=True, return_tensors="pt")
+    input_names = list(sample.keys())
+    dynamic_axes = {name: {0: "batch", 1: "seq"} for name in input_names}
+    dynamic_axes.update({"logits": {0: "batch"}, "cls_attention": {0: "batch", 1: "seq"}})
+
+    import onnx
+
+    directory = path.parent
+    directory.parent.mkdir(parents=True, exist_ok=True)
+    # Workers exporting the same model at once each write their own temp directory;
+    # renaming it into place publishes the graph and its weights together
+    tmp = Path(tempfile.mkdtemp(dir=directory.parent, prefix=f".{directory.name}."))
+    try:
+        graph = tmp / path.name
+        with torch.no_grad():
+            # eval(): export restores the wrapper's mode afterwards, and a fresh
+            # module is in training mode, which would switch dropout on in `model`
+            torch.onnx.export(_ExportWrapper(model, input_names).eval(),
+                              tuple(sample[name] for name in input_names),
+                              str(graph),
+                              input_names=input_names,
+                              output_names=["logits", "cls_attention"],
+                              dynamic_axes=dynamic_axes,
+                              opset_version=17,
+                              dynamo=False)
+        onnx.save_model(onnx.load(str(graph)), str(graph), save_as_external_data=True,
+                        all_tensors_to_one_file=True, location=path.name + ".data",
+                        size_threshold=1024)
+        for f in tmp.iterdir():
+            os.chmod(f, 0o644)
+        os.chmod(tmp, 0o755)
+        try:
+            tmp.rename(directory)
+        except OSError:
+            # Another worker has already published the same export
+            if not path.is_file():
+                raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+class OnnxBackend:
+    """
+    The session is created on first use: onnxruntime starts its thread pools
+    with the session, and they must not be inherited across a fork. Its
+    weights stay in the memory-mapped .data file unless ONNX_PREPACK is on.
+    """
+
+    def __init__(self, path: Path, config):
+        self.path = path
+        self.config = config
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        with self._lock:
+            if self._session is None:
+                import onnxruntime as ort
+
+                options = ort.SessionOptions()
+                if not ONNX_PREPACK:
+                    options.add_session_config_entry("session.disable_prepacking", "1")
+                self._session = ort.InferenceSession(str(self.path), options,
+                                                     providers=["CPUExecutionProvider"])
+            return self._session
+
+    def __call__(self, enc, attributions: bool = True
+    ) -> Tuple[torch.Tensor, Optional[torch.Tensor]]:
+        session = self.session
+        feeds = {i.name: np.asarray(enc[i.name], dtype=np.int64) for i in session.get_inputs()}
+        if not attributions:
+            logits, = session.run(["logits"], feeds)
+            return torch.from_numpy(logits), None
+        logits, cls = session.run(["logits", "cls_attention"], feeds)
+        return torch.from_numpy(logits), torch.from_numpy(cls)
+
+
+WEIGHT_SUFFIXES = (".safetensors", ".bin", ".pt", ".pth")
+
+
+def weights_fingerprint(model, model_id: str) -> str:
+    """
+    Short hash identifying the weights behind model_id: size and mtime of the
+    weight files of a local directory, the commit of a Hub snapshot, or else
+    the parameters themselves.
+    """
+    digest = hashlib.sha256()
+    directory = Path(model_id)
+    files = sorted(f for f in directory.iterdir()
+                   if f.suffix in WEIGHT_SUFFIXES) if directory.is_dir() else []
+    commit = getattr(model.config, "_commit_hash", None)
+    if files:
+        for f in files:
+            stat = f.stat()
+            digest.update(f"{f.name}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    elif commit:
+        digest.update(commit.encode())
+    else:
+        for name, tensor in model.state_dict().items():
+            digest.update(name.encode())
+            digest.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+
+def onnx_path(model_id: str, fingerprint: str) -> Path:
+    """One export directory per model and weights version, so new weights get a new graph."""
+    return ONNX_CACHE_DIR / (re.sub(r"[^\w.-]+", "__", model_id) + f"-{fingerprint}") / "model.onnx"
+
+
+def build_backend(model, tokenizer, model_id: str, backend: str):
+    """Wraps a loaded fp32 model into the requested backend."""
+    if backend == "torch":
+        return TorchBackend(model)
+    if backend == "int8":
+        return TorchBackend(quantize_int8(model))
+    if backend == "onnx":
+        path = onnx_path(model_id, weights_fingerprint(model, model_id))
+        if not path.is_file():
+            export_onnx(model, tokenizer, path)
+        return OnnxBackend(path, model.config)
+    raise ValueError(f"Unknown backend '{backend}', expected one of {BACKENDS}")
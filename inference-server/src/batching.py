@@ -0,0 +1,136 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from metrics import Histogram, add_timings, collect_timings, current_timings
+
+
+@dataclass
+class _Pending:
+    texts: List[str]
+    options: Hashable
+    future: asyncio.Future
+    enqueued_at: float
+    # stage timings of the submitting request (Server-Timing), if any
+    timings: Optional[Dict[str, float]] = None
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent requests for one model into a single forward pass.
+
+    Requests are queued; a worker task takes the first one, keeps collecting
+    until the batch holds max_batch_size texts or max_wait_ms has passed
+    since it started waiting, runs `runner(texts, options)` in a worker
+    thread once per distinct `options` in the batch and hands each caller
+    its slice of the outputs.
+    """
+
+    def __init__(self,
+                 runner: Callable[[List[str], Hashable], List[Any]],
+                 max_batch_size: int = 32,
+                 max_wait_ms: float = 5.0):
+        self._runner = runner
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._carry: Optional[_Pending] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        self.batch_size = Histogram([1, 2, 4, 8, 16, 32, 64, 128])
+        self.queue_wait = Histogram([0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25])
+
+    async def submit(self, texts: List[str], options: Hashable = None) -> List[Any]:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # the queue and the worker are bound to the loop they were made in
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._carry = None
+            self._worker = None
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._run())
+
+        pending = _Pending(texts, options, loop.create_future(), time.perf_counter(),
+                           current_timings())
+        await self._queue.put(pending)
+        return await pending.future
+
+    async def _next(self, timeout: Optional[float] = None) -> _Pending:
+        if self._carry is not None:
+            pending, self._carry = self._carry, None
+            return pending
+        if timeout is None:
+            return await self._queue.get()
+        return await asyncio.wait_for(self._queue.get(), timeout)
+
+    async def _collect(self) -> List[_Pending]:
+        batch = [await self._next()]
+        size = len(batch[0].texts)
+        deadline = time.perf_counter() + self.max_wait
+
+        while size < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                pending = await self._next(timeout)
+            except asyncio.TimeoutError:
+                break
+            if size + len(pending.texts) > self.max_batch_size:
+                # does not fit: it opens the next batch
+                self._carry = pending
+                break
+            batch.append(pending)
+            size += len(pending.texts)
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+            # callers that disconnected while queued are dropped
+            batch = [p for p in batch if not p.future.done()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            for pending in batch:
+                self.queue_wait.observe(started - pending.enqueued_at)
+                add_timings(pending.timings, {"queue": started - pending.enqueued_at})
+            self.batch_size.observe(sum(len(pending.texts) for pending in batch))
+
+            groups: Dict[Hashable, List[_Pending]] = {}
+            for pending in batch:
+                groups.setdefault(pending.options, []).append(pending)
+            for options, group in groups.items():
+                await self._run_group(group, options)
+
+    async def _run_group(self, group: List[_Pending], options: Hashable) -> None:
+        texts = [text for pending in group for text in pending.texts]
+        try:
+            outputs, timings = await asyncio.to_thread(collect_timings, self._runner, texts, options)
+        except Exception as err:
+            for pending in group:
+                if not pending.future.done():
+                    pending.future.set_exception(err)
+            return
+
+        offset = 0
+        for pending in group:
+            # every caller is charged the stages of the whole batch it rode in
+            add_timings(pending.timings, timings)
+            n = len(pending.texts)
+            if not pending.future.done():
+                pending.future.set_result(outputs[offset:offset + n])
+            offset += n
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "queued": self._queue.qsize(),
+            "batch_size": self.batch_size.snapshot(),
+            "queue_wait_seconds": self.queue_wait.snapshot(),
+        }
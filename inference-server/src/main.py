@@ -1,18 +1,32 @@
+import asyncio
+import heapq
+import math
+import os
+from contextlib import asynccontextmanager
 from os import environ
-from functools import lru_cache
-from typing import Dict, List
+from functools import lru_cache, partial
+from operator import itemgetter
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
 import torch
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
 from transformers import (
     AutoModelForSequenceClassification,
     AutoTokenizer,
 )
 
-from schemas import InferenceRequest, InferenceResponse, OutputItem
+from backends import build_backend, parse_backends
+from batching import MicroBatcher
+from metrics import CONTENT_TYPE, MetricsMiddleware, expose_histograms, registry, span
+from schemas import Aggregation, InferenceRequest, InferenceResponse, OutputItem
+
+# Directory with one saved model per key (<MODEL_DIR>/arbitr, ...), used
+# instead of the Hub, e.g. for offline images or benchmarks
+MODEL_DIR = environ.get("MODEL_DIR")
 
 HF_TOKEN = environ.get("HF_TOKEN")
-if not HF_TOKEN:
+if not HF_TOKEN and not MODEL_DIR:
     raise KeyError("Environment variable HF_TOKEN not specified")
 
 MODEL_REGISTRY: Dict[str, str] = {
@@ -22,14 +36,76 @@ MODEL_REGISTRY: Dict[str, str] = {
     "finances":     "utyfull/contract-finances_extra",
     "enforcements": "utyfull/contract-enfoercemetns_extra",
 }
+if MODEL_DIR:
+    MODEL_REGISTRY = {key: os.path.join(MODEL_DIR, key) for key in MODEL_REGISTRY}
+
+# Execution backend per model key: torch (fp32), int8 or onnx.
+# MODEL_BACKEND is the default, MODEL_BACKENDS="arbitr=int8,egrul=onnx" overrides it
+MODEL_BACKEND = environ.get("MODEL_BACKEND", "torch")
+MODEL_BACKENDS: Dict[str, str] = {
+    **{key: MODEL_BACKEND for key in MODEL_REGISTRY},
+    **parse_backends(environ.get("MODEL_BACKENDS", "")),
+}
+
+# Load every model at import. Under `gunicorn --preload` the import happens
+# once in the master before fork, so all workers share one copy-on-write
+# copy of the weights, which inference never writes to
+PRELOAD_MODELS = environ.get("PRELOAD_MODELS", "0") == "1"
+
+# Intra-op threads per worker; by default the cores are split between workers
+TORCH_NUM_THREADS = int(environ.get("TORCH_NUM_THREADS", 0))
+
+# Dynamic micro-batching of concurrent /predict/* calls
+MAX_BATCH_SIZE = int(environ.get("MAX_BATCH_SIZE", 32))
+MAX_BATCH_WAIT_MS = float(environ.get("MAX_BATCH_WAIT_MS", 5))
+
+# Inputs are sorted by token length and run in buckets whose padded size
+# (texts x longest text) stays under this many tokens
+MAX_TOKENS_PER_BUCKET = int(environ.get("MAX_TOKENS_PER_BUCKET", 8192))
+
+
+class WindowOptions(NamedTuple):
+    stride: int
+    aggregation: Aggregation
+
+
+class RunOptions(NamedTuple):
+    window: Optional[WindowOptions] = None
+    attributions: bool = True
 
 
 @lru_cache(maxsize=len(MODEL_REGISTRY))
-def load_model(model_id: str):
+def load_model(model_id: str, backend: str = "torch"):
     model = AutoModelForSequenceClassification.from_pretrained(model_id, token=HF_TOKEN)
     tokenizer = AutoTokenizer.from_pretrained(model_id, token=HF_TOKEN)
     model.eval()
-    return model, tokenizer
+    return build_backend(model, tokenizer, model_id, backend), tokenizer
+
+
+def top_tokens(cls_attn: torch.Tensor,
+               input_ids: torch.Tensor,
+               tokenizer,
+               k: int = 20,
+               attention_mask: Optional[torch.Tensor] = None
+) -> List[dict]:
+    """
+    Top-k tokens by CLS attention, skipping the CLS position itself.
+    With attention_mask, padding never makes it into the result, so a text
+    gets the same tokens whatever it was padded to in its bucket.
+    cls_attn: [batch, seq] (already averaged over heads)
+    input_ids: [batch, seq]
+    """
+    cls_attn = torch.nan_to_num(cls_attn[:, 1:], nan=0.0)
+    if attention_mask is not None:
+        cls_attn = cls_attn.masked_fill(attention_mask[:, 1:] == 0, -math.inf)
+    k = min(k, cls_attn.size(1))
+    topk = torch.topk(cls_attn, k=k, dim=1)
+    ids = torch.gather(input_ids[:, 1:], 1, topk.indices).reshape(-1).tolist()
+    toks = tokenizer.convert_ids_to_tokens(ids)
+    scores = topk.values.detach().cpu().reshape(-1).tolist()
+    return [{tok: score for tok, score in zip(toks[i * k:(i + 1) * k], scores[i * k:(i + 1) * k])
+             if score != -math.inf}
+            for i in range(cls_attn.size(0))]
 
 
 def compute_top20(last_attn: torch.Tensor,
@@ -42,68 +118,248 @@ def compute_top20(last_attn: torch.Tensor,
     last_attn: [batch, heads, seq, seq]
     input_ids: [batch, seq]
     """
-    avg_attn = last_attn.mean(dim=1)
-    cls_attn = avg_attn[:, 0, 1:]
-    cls_attn = torch.nan_to_num(cls_attn, nan=0.0)
-    k = min(k, cls_attn.size(1))
-    topk = torch.topk(cls_attn, k=k, dim=1)
-    idxs, vals = topk.indices, topk.values
-    results = []
-    for i in range(idxs.size(0)):
-        ids = input_ids[i, 1:][idxs[i]].tolist()
-        toks = tokenizer.convert_ids_to_tokens(ids)
-        scores = vals[i].detach().cpu().tolist()
-        results.append(dict(zip(toks, scores)))
-    return results
+    return top_tokens(last_attn.mean(dim=1)[:, 0, :], input_ids, tokenizer, k)
 
 
-def predict(model_key: str, req: InferenceRequest) -> InferenceResponse:
+def length_buckets(lengths: List[int], max_tokens: int) -> List[List[int]]:
+    """
+    Groups indices of `lengths` into buckets of similar length.
+    Indices are taken shortest first; a bucket is closed once adding the
+    next (longest so far) text would push its padded size over max_tokens.
+    """
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    buckets: List[List[int]] = []
+    current: List[int] = []
+    for i in order:
+        if current and (len(current) + 1) * lengths[i] > max_tokens:
+            buckets.append(current)
+            current = []
+        current.append(i)
+    if current:
+        buckets.append(current)
+    return buckets
+
+
+def _forward(backend, tokenizer, enc, attributions: bool = True
+) -> Tuple[torch.Tensor, List[Optional[dict]]]:
+    with span("forward"):
+        logits, cls_attn = backend(enc, attributions)
+    if not attributions:
+        return logits, [None] * logits.size(0)
+    with span("top20"):
+        return logits, top_tokens(cls_attn, enc["input_ids"], tokenizer,
+                                  attention_mask=enc["attention_mask"])
+
+
+def aggregate_windows(doc_ids: List[int],
+                      logits: List[torch.Tensor],
+                      top20s: List[dict],
+                      n_docs: int,
+                      aggregation: Aggregation,
+                      k: int = 20
+) -> Tuple[List[torch.Tensor], List[dict]]:
+    """
+    Combines per-window logits and token attributions into one result per
+    document. `mean` averages window logits and token scores; `max` keeps
+    the window most confident in LABEL_1 and the highest score per token.
+    """
+    windows: List[List[int]] = [[] for _ in range(n_docs)]
+    for w, doc in enumerate(doc_ids):
+        windows[doc].append(w)
+    attributions = top20s[0] is not None
+
+    doc_logits, doc_top = [], []
+    for ws in windows:
+        stacked = torch.stack([logits[w] for w in ws])
+        merged: Dict[str, float] = {}
+        if aggregation == Aggregation.max:
+            doc_logits.append(stacked[torch.softmax(stacked, dim=1)[:, 1].argmax()])
+            for w in ws if attributions else ():
+                for tok, score in top20s[w].items():
+                    merged[tok] = max(merged.get(tok, score), score)
+        else:
+            doc_logits.append(stacked.mean(dim=0))
+            for w in ws if attributions else ():
+                for tok, score in top20s[w].items():
+                    merged[tok] = merged.get(tok, 0.0) + score / len(ws)
+        doc_top.append(dict(heapq.nlargest(k, merged.items(), key=itemgetter(1)))
+                       if attributions else None)
+    return doc_logits, doc_top
+
+
+def _max_length(backend, tokenizer) -> int:
+    return min(tokenizer.model_max_length, backend.config.max_position_embeddings)
+
+
+def run_batch(backend,
+              tokenizer,
+              texts: List[str],
+              options: RunOptions = RunOptions()
+) -> List[OutputItem]:
+    """
+    Tokenizes without padding, runs each length bucket padded only to its
+    own longest sequence and returns outputs in the order of `texts`.
+    With a window, long texts are split into overlapping windows; windows of
+    all texts share the same buckets and are aggregated back per text.
+    """
+    window = options.window
+    with span("tokenize"):
+        if window is None:
+            enc = tokenizer(texts, truncation=True)
+            doc_ids = None
+        else:
+            max_length = _max_length(backend, tokenizer)
+            enc = tokenizer(texts, truncation=True, max_length=max_length,
+                            stride=min(window.stride, max_length // 2),
+                            return_overflowing_tokens=True)
+            doc_ids = enc.pop("overflow_to_sample_mapping")
+    lengths = [len(ids) for ids in enc["input_ids"]]
+
+    logits: List[torch.Tensor] = [None] * len(lengths)
+    top20s: List[dict] = [None] * len(lengths)
+    for bucket in length_buckets(lengths, MAX_TOKENS_PER_BUCKET):
+        with span("pad"):
+            batch = tokenizer.pad({key: [enc[key][i] for i in bucket] for key in enc.keys()},
+                                  return_tensors="pt")
+        bucket_logits, bucket_top20s = _forward(backend, tokenizer, batch, options.attributions)
+        for j, i in enumerate(bucket):
+            logits[i] = bucket_logits[j]
+            top20s[i] = bucket_top20s[j]
+
+    if doc_ids is not None:
+        with span("aggregate"):
+            logits, top20s = aggregate_windows(doc_ids, logits, top20s, len(texts),
+                                               window.aggregation)
+
+    probs = torch.softmax(torch.stack(logits), dim=1)
+    labels = ["LABEL_1" if p[1] > p[0] else "LABEL_0" for p in probs]
+    scores = probs[:, 1].tolist()
+
+    return [OutputItem(label=l, score=s, top20=t)
+            for l, s, t in zip(labels, scores, top20s)]
+
+
+def run_model(model_key: str,
+              texts: List[str],
+              options: RunOptions = RunOptions()
+) -> List[OutputItem]:
+    backend, tokenizer = load_model(MODEL_REGISTRY[model_key], MODEL_BACKENDS[model_key])
+    return run_batch(backend, tokenizer, texts, options)
+
+
+def _options(req: InferenceRequest) -> RunOptions:
+    window = WindowOptions(req.stride, req.aggregation) if req.windowed else None
+    return RunOptions(window, req.return_attributions)
+
+
+def preload_models() -> None:
+    # one thread while loading: the master must not start an OpenMP pool
+    # that forked workers would inherit in a broken state
+    torch.set_num_threads(1)
+    for key, model_id in MODEL_REGISTRY.items():
+        load_model(model_id, MODEL_BACKENDS[key])
+
+
+def warm_up() -> None:
+    """One forward pass per model, so the first real request is not the slow one."""
+    for key in MODEL_REGISTRY:
+        run_model(key, ["warm-up"], RunOptions())
+
+
+def _worker_threads() -> int:
+    if TORCH_NUM_THREADS:
+        return TORCH_NUM_THREADS
+    cores = os.cpu_count() or 1
+    return max(1, cores // int(environ.get("WEB_CONCURRENCY", cores)))
+
+
+if PRELOAD_MODELS:
+    preload_models()
+
+
+def _validate(model_key: str, req: InferenceRequest) -> None:
     if not req.inputs:
         raise HTTPException(400, "No input texts provided")
 
     if model_key not in MODEL_REGISTRY:
         raise HTTPException(404, f"Unknown model_key '{model_key}'")
 
-    model, tokenizer = load_model(MODEL_REGISTRY[model_key])
+
+def predict(model_key: str, req: InferenceRequest) -> InferenceResponse:
+    _validate(model_key, req)
     texts = [item.data for item in req.inputs]
-    enc = tokenizer(texts, padding=True, truncation=True, return_tensors="pt")
+    return InferenceResponse(outputs=run_model(model_key, texts, _options(req)))
 
-    with torch.no_grad():
-        out = model(**enc)
 
-    probs = torch.softmax(out.logits, dim=1)
-    labels = ["LABEL_1" if p[1] > p[0] else "LABEL_0" for p in probs]
-    scores = probs[:, 1].tolist()
-    top20s = compute_top20(out.attentions[-1], enc["input_ids"], tokenizer)
+batchers: Dict[str, MicroBatcher] = {
+    key: MicroBatcher(partial(run_model, key),
+                      max_batch_size=MAX_BATCH_SIZE,
+                      max_wait_ms=MAX_BATCH_WAIT_MS)
+    for key in MODEL_REGISTRY
+}
+
+
+async def predict_batched(model_key: str, req: InferenceRequest) -> InferenceResponse:
+    """
+    Same as `predict`, but the texts are coalesced with concurrent
+    requests for the same model into one forward pass.
+    """
+    _validate(model_key, req)
+    texts = [item.data for item in req.inputs]
+    return InferenceResponse(outputs=await batchers[model_key].submit(texts, _options(req)))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    torch.set_num_threads(_worker_threads())
+    await asyncio.to_thread(warm_up)
+    yield
 
-    outputs = [OutputItem(label=l, score=s, top20=t)
-               for l, s, t in zip(labels, scores, top20s)]
-    return InferenceResponse(outputs=outputs)
 
+app = FastAPI(title="Multi-model contract classifier", lifespan=lifespan)
 
-app = FastAPI(title="Multi-model contract classifier")
+# Per-route request histograms for /metrics; Server-Timing with SERVER_TIMING=1
+app.add_middleware(MetricsMiddleware)
 
 
 @app.post("/predict/arbitr", response_model=InferenceResponse)
-def predict_arbitr(req: InferenceRequest):
-    return predict("arbitr", req)
+async def predict_arbitr(req: InferenceRequest):
+    return await predict_batched("arbitr", req)
 
 
 @app.post("/predict/egrul", response_model=InferenceResponse)
-def predict_egrul(req: InferenceRequest):
-    return predict("egrul", req)
+async def predict_egrul(req: InferenceRequest):
+    return await predict_batched("egrul", req)
 
 
 @app.post("/predict/contracts", response_model=InferenceResponse)
-def predict_contracts(req: InferenceRequest):
-    return predict("contracts", req)
+async def predict_contracts(req: InferenceRequest):
+    return await predict_batched("contracts", req)
 
 
 @app.post("/predict/finances", response_model=InferenceResponse)
-def predict_finances(req: InferenceRequest):
-    return predict("finances", req)
+async def predict_finances(req: InferenceRequest):
+    return await predict_batched("finances", req)
 
 
 @app.post("/predict/enforcements", response_model=InferenceResponse)
-def predict_enforcements(req: InferenceRequest):
-    return predict("enforcements", req)
+async def predict_enforcements(req: InferenceRequest):
+    return await predict_batched("enforcements", req)
+
+
+@app.get("/metrics/batching")
+def batching_metrics():
+    """Batch size and queue wait histograms per model."""
+    return {key: batcher.stats() for key, batcher in batchers.items()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Stage, request and micro-batching histograms in the Prometheus text format."""
+    lines = registry.expose()
+    lines += expose_histograms("inference_batch_size", "Texts per forward pass",
+                               (({"model": key}, b.batch_size) for key, b in batchers.items()))
+    lines += expose_histograms("inference_batch_queue_wait_seconds",
+                               "Time a request waited for its batch",
+                               (({"model": key}, b.queue_wait) for key, b in batchers.items()))
+    return PlainTextResponse("\n".join(lines) + "\n", media_type=CONTENT_TYPE)
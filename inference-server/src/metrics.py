@@ -0,0 +1,241 @@
+"""
+Lightweight metrics without extra dependencies: timing spans around the
+inference stages and per-route request histograms, exposed in the
+Prometheus text format on /metrics.
+
+    with span("forward"):
+        logits = model(**enc)
+
+With SERVER_TIMING=1 the stage durations of a request are also returned
+in a Server-Timing header. Every worker process keeps its own metrics.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from os import environ
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from starlette.datastructures import MutableHeaders
+
+SERVER_TIMING = environ.get("SERVER_TIMING", "0") == "1"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# stage -> seconds of the current request, for Server-Timing
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("timings", default=None)
+
+
+class Histogram:
+    """
+    Minimal cumulative histogram: bucket upper bounds, count and sum.
+    """
+
+    def __init__(self, buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        labels = [str(b) for b in self.buckets] + ["+Inf"]
+        cumulative, running = {}, 0
+        for label, n in zip(labels, self.counts):
+            running += n
+            cumulative[label] = running
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "buckets": cumulative,
+        }
+
+
+def _labels(labels: Dict[str, str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in labels.items()]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def expose_histograms(name: str, help: str,
+                      series: Iterable[Tuple[Dict[str, str], Histogram]]) -> List[str]:
+    """Prometheus text lines of one histogram metric from (labels, histogram) pairs."""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+    for labels, h in series:
+        for bound, n in h.snapshot()["buckets"].items():
+            le = f'le="{bound}"'
+            lines.append(f"{name}_bucket{_labels(labels, le)} {n}")
+        lines.append(f"{name}_sum{_labels(labels)} {h.sum}")
+        lines.append(f"{name}_count{_labels(labels)} {h.count}")
+    return lines
+
+
+class HistogramFamily:
+    """A histogram metric with one series per combination of label values."""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], Histogram] = {}
+
+    def labels(self, *values: str) -> Histogram:
+        series = self._series.get(values)
+        if series is None:
+            series = self._series.setdefault(values, Histogram(self.buckets))
+        return series
+
+    def expose(self) -> List[str]:
+        return expose_histograms(self.name, self.help,
+                                 ((dict(zip(self.labelnames, values)), h)
+                                  for values, h in sorted(self._series.items())))
+
+
+class CounterFamily:
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], int] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *values: str) -> None:
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + 1
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for values, n in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(dict(zip(self.labelnames, values)))} {n}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.families: List[Any] = []
+
+    def histogram(self, *args, **kwargs) -> HistogramFamily:
+        family = HistogramFamily(*args, **kwargs)
+        self.families.append(family)
+        return family
+
+    def counter(self, *args, **kwargs) -> CounterFamily:
+        family = CounterFamily(*args, **kwargs)
+        self.families.append(family)
+        return family
+
+    def expose(self) -> List[str]:
+        return [line for family in self.families for line in family.expose()]
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    "inference_stage_seconds", "Time spent in each inference stage", ["stage"])
+REQUEST_SECONDS = registry.histogram(
+    "inference_http_request_seconds", "HTTP request duration", ["method", "route"])
+REQUESTS = registry.counter(
+    "inference_http_requests_total", "HTTP requests", ["method", "route", "status"])
+
+
+class span:
+    """
+    Times a block into inference_stage_seconds{stage} and, inside a request,
+    into its Server-Timing. Repeated stages of one request are summed.
+    """
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self) -> "span":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        elapsed = time.perf_counter() - self.started
+        STAGE_SECONDS.labels(self.stage).observe(elapsed)
+        timings = _timings.get()
+        if timings is not None:
+            timings[self.stage] = timings.get(self.stage, 0.0) + elapsed
+
+
+def current_timings() -> Optional[Dict[str, float]]:
+    """Stage timings of the request being handled, if any."""
+    return _timings.get()
+
+
+def add_timings(timings: Optional[Dict[str, float]], stages: Dict[str, float]) -> None:
+    if timings is not None:
+        for stage, seconds in stages.items():
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+def collect_timings(func: Callable, *args) -> Tuple[Any, Dict[str, float]]:
+    """
+    func(*args) with its spans collected into a dict of their own, e.g. for
+    a batch that serves several requests at once: (result, timings).
+    """
+    timings: Dict[str, float] = {}
+    token = _timings.set(timings)
+    try:
+        return func(*args), timings
+    finally:
+        _timings.reset(token)
+
+
+def server_timing(timings: Dict[str, float], total: float) -> str:
+    parts = [f"{stage};dur={seconds * 1000:.3f}" for stage, seconds in timings.items()]
+    parts.append(f"total;dur={total * 1000:.3f}")
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording duration and status of every HTTP request by
+    route template, and adding Server-Timing when enabled.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timings: Dict[str, float] = {}
+        token = _timings.set(timings)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if SERVER_TIMING:
+                    MutableHeaders(scope=message).append(
+                        "Server-Timing", server_timing(timings, time.perf_counter() - started))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _timings.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            REQUEST_SECONDS.labels(scope["method"], path).observe(time.perf_counter() - started)
+            REQUESTS.inc(scope["method"], path, str(status))
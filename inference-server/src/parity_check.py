@@ -0,0 +1,76 @@
+"""
+Compares a quantized / ONNX backend with the fp32 PyTorch path on a sample
+corpus: label agreement, score differences and top20 token overlap.
+
+    python parity_check.py --model arbitr --backend int8 --corpus ../data/kad_arbitr.csv
+
+The corpus is either a CSV with a data_text column or a text file with one
+document per line. Exits with code 1 if the backend is out of tolerance.
+"""
+import argparse
+import csv
+import sys
+from itertools import islice
+from typing import List
+
+from backends import BACKENDS
+from main import MODEL_REGISTRY, RunOptions, load_model, run_batch
+
+
+def read_corpus(path: str, limit: int) -> List[str]:
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.endswith(".csv"):
+            rows = (row["data_text"] for row in csv.DictReader(f))
+        else:
+            rows = (line.rstrip("\n") for line in f)
+        return list(islice((text for text in rows if text), limit))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model", required=True, choices=sorted(MODEL_REGISTRY))
+    parser.add_argument("--backend", required=True, choices=[b for b in BACKENDS if b != "torch"])
+    parser.add_argument("--corpus", required=True)
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--min-agreement", type=float, default=0.99,
+                        help="minimal share of equal labels")
+    parser.add_argument("--max-score-diff", type=float, default=0.05,
+                        help="maximal absolute LABEL_1 score difference")
+    args = parser.parse_args()
+
+    texts = read_corpus(args.corpus, args.limit)
+    if not texts:
+        print("Empty corpus", file=sys.stderr)
+        return 1
+
+    model_id = MODEL_REGISTRY[args.model]
+    reference = load_model(model_id, "torch")
+    candidate = load_model(model_id, args.backend)
+
+    agree, diffs, overlaps = 0, [], []
+    for start in range(0, len(texts), args.batch_size):
+        chunk = texts[start:start + args.batch_size]
+        expected = run_batch(*reference, chunk, RunOptions())
+        actual = run_batch(*candidate, chunk, RunOptions())
+        for e, a in zip(expected, actual):
+            agree += e.label == a.label
+            diffs.append(abs(e.score - a.score))
+            overlaps.append(len(e.top20.keys() & a.top20.keys()) / max(len(e.top20), 1))
+
+    agreement = agree / len(texts)
+    diffs.sort()
+    print(f"{args.model} {args.backend} vs torch on {len(texts)} texts")
+    print(f"  label agreement   {agreement:.4f}")
+    print(f"  score diff mean   {sum(diffs) / len(diffs):.6f}")
+    print(f"  score diff p99    {diffs[min(len(diffs) - 1, int(len(diffs) * 0.99))]:.6f}")
+    print(f"  score diff max    {diffs[-1]:.6f}")
+    print(f"  top20 overlap     {sum(overlaps) / len(overlaps):.4f}")
+
+    ok = agreement >= args.min_agreement and diffs[-1] <= args.max_score_diff
+    print("OK" if ok else "FAILED")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,32 @@
-from typing import List, Dict
-from pydantic import BaseModel
+from enum import Enum
+from typing import List, Dict, Optional
+from pydantic import BaseModel, Field
 
 
 class InputItem(BaseModel):
     data: str
 
 
+class Aggregation(str, Enum):
+    mean = "mean"
+    max = "max"
+
+
 class InferenceRequest(BaseModel):
     inputs: List[InputItem]
+    windowed: bool = Field(False, description="Split long texts into overlapping windows "
+                                              "instead of truncating them")
+    stride: int = Field(128, ge=0, description="Tokens shared by neighbouring windows")
+    aggregation: Aggregation = Field(Aggregation.mean, description="How window results are "
+                                                                   "combined per document")
+    return_attributions: bool = Field(True, description="Compute top20 token attributions; "
+                                                        "disable for scoring-only calls")
 
 
 class OutputItem(BaseModel):
     label: str
     score: float
-    top20: Dict[str, float]
+    top20: Optional[Dict[str, float]] = None
 
 
 class InferenceResponse(BaseModel):
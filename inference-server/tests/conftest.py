@@ -0,0 +1,29 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+# main.py requires HF_TOKEN or MODEL_DIR at import; tests build their own models
+os.environ.setdefault("MODEL_DIR", str(Path(__file__).resolve().parent / "models"))
+
+WORDS = [f"w{i}" for i in range(50)]
+
+
+@pytest.fixture(scope="session")
+def tiny_bert(tmp_path_factory):
+    """One-layer BERT with random weights and a word-level vocabulary: (model, tokenizer)."""
+    import torch
+    from transformers import BertConfig, BertForSequenceClassification, BertTokenizerFast
+
+    vocab_file = tmp_path_factory.mktemp("bert") / "vocab.txt"
+    vocab_file.write_text("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", *WORDS]) + "\n")
+    tokenizer = BertTokenizerFast(vocab_file=str(vocab_file), do_lower_case=False,
+                                  model_max_length=64)
+    torch.manual_seed(0)
+    config = BertConfig(vocab_size=len(tokenizer), hidden_size=32, num_hidden_layers=1,
+                        num_attention_heads=2, intermediate_size=64,
+                        max_position_embeddings=64, num_labels=2)
+    return BertForSequenceClassification(config).eval(), tokenizer
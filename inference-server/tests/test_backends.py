@@ -0,0 +1,45 @@
+import multiprocessing
+
+import pytest
+import torch
+
+from backends import OnnxBackend, TorchBackend, export_onnx, parse_backends
+
+
+def test_parse_backends():
+    assert parse_backends(" arbitr=int8, egrul=onnx,") == {"arbitr": "int8", "egrul": "onnx"}
+    with pytest.raises(ValueError):
+        parse_backends("arbitr=tensorrt")
+
+
+def test_concurrent_exports_leave_one_complete_graph(tiny_bert, tmp_path):
+    model, tokenizer = tiny_bert
+    path = tmp_path / "model" / "model.onnx"
+    # Like gunicorn workers exporting on first use: separate processes, one target path
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=export_onnx, args=(model, tokenizer, path)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert [worker.exitcode for worker in workers] == [0] * 4
+
+    assert [p.name for p in tmp_path.iterdir()] == ["model"]
+    assert sorted(p.name for p in path.parent.iterdir()) == ["model.onnx", "model.onnx.data"]
+    enc = tokenizer(["w1 w2 w3", "w4"], padding=True, return_tensors="pt")
+    logits, cls = OnnxBackend(path, model.config)(enc)
+    expected_logits, expected_cls = TorchBackend(model)(enc)
+    assert torch.allclose(logits, expected_logits, atol=1e-4)
+    assert torch.allclose(cls, expected_cls, atol=1e-4)
+
+
+def test_onnx_scoring_only_skips_attention_output(tiny_bert, tmp_path):
+    model, tokenizer = tiny_bert
+    path = tmp_path / "model" / "model.onnx"
+    export_onnx(model, tokenizer, path)
+    assert not model.training
+    enc = tokenizer(["w1 w2 w3"], return_tensors="pt")
+
+    logits, cls = OnnxBackend(path, model.config)(enc, attributions=False)
+    assert cls is None
+    assert torch.allclose(logits, TorchBackend(model)(enc)[0], atol=1e-4)
@@ -0,0 +1,61 @@
+import random
+
+import pytest
+import main
+from backends import TorchBackend
+from conftest import WORDS
+from schemas import Aggregation
+
+
+@pytest.fixture(scope="module")
+def model(tiny_bert):
+    model, tokenizer = tiny_bert
+    return TorchBackend(model), tokenizer
+
+
+def texts(n: int, seed: int = 0, max_words: int = 40) -> list[str]:
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(WORDS, k=rng.randint(1, max_words))) for _ in range(n)]
+
+
+def test_length_buckets_cover_every_index_within_budget():
+    rng = random.Random(0)
+    lengths = [rng.randint(1, 100) for _ in range(200)]
+    buckets = main.length_buckets(lengths, 256)
+
+    assert sorted(i for bucket in buckets for i in bucket) == list(range(len(lengths)))
+    for bucket in buckets:
+        assert len(bucket) == 1 or len(bucket) * max(lengths[i] for i in bucket) <= 256
+
+
+@pytest.mark.parametrize("attributions", [True, False])
+def test_outputs_follow_input_order(model, monkeypatch, attributions):
+    # A small budget spreads texts of different length over several buckets
+    monkeypatch.setattr(main, "MAX_TOKENS_PER_BUCKET", 64)
+    backend, tokenizer = model
+    batch = texts(24)
+    options = main.RunOptions(attributions=attributions)
+
+    outputs = main.run_batch(backend, tokenizer, batch, options)
+    alone = [main.run_batch(backend, tokenizer, [text], options)[0] for text in batch]
+
+    assert len(outputs) == len(batch)
+    for got, expected in zip(outputs, alone):
+        assert got.label == expected.label
+        assert got.score == pytest.approx(expected.score, abs=1e-5)
+        if attributions:
+            assert got.top20.keys() == expected.top20.keys()
+        else:
+            assert got.top20 is None
+
+
+def test_windows_are_aggregated_back_per_text(model, monkeypatch):
+    monkeypatch.setattr(main, "MAX_TOKENS_PER_BUCKET", 128)
+    backend, tokenizer = model
+    batch = texts(6, seed=1, max_words=150)    # longer than the 64-token window
+    options = main.RunOptions(window=main.WindowOptions(stride=16, aggregation=Aggregation.mean))
+
+    outputs = main.run_batch(backend, tokenizer, batch, options)
+    alone = [main.run_batch(backend, tokenizer, [text], options)[0] for text in batch]
+
+    assert [o.score for o in outputs] == pytest.approx([o.score for o in alone], abs=1e-5)
@@ -1,11 +1,18 @@
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from os import environ
+from typing import Any, Hashable, Optional
 
+import httpx
 from fastapi import FastAPI, HTTPException
+from newsapi import NewsApiClient
 from pydantic import BaseModel
-import requests
-import logging
-
-app = FastAPI()
 
 # --- Настройка логирования ---
 logging.basicConfig(
@@ -16,7 +23,10 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Конфигурация Yandex LLM (лучше вынести в переменные окружения)
-URL = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
+URL = environ.get(
+    "YANDEX_GPT_URL",
+    "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
+)
 
 API_KEY = environ.get("YANDEX_CLOUD_API_KEY")
 if not API_KEY:
@@ -26,10 +36,76 @@ FOLDER_ID = environ.get("YANDEX_CLOUD_FOLDER_ID")
 if not FOLDER_ID:
     raise KeyError("Environment variable YANDEX_CLOUD_FOLDER_ID not specified")
 
+NEWSAPI_KEY = environ.get("NEWSAPI_KEY")
+if not NEWSAPI_KEY:
+    raise KeyError("Environment variable NEWSAPI_KEY not specified")
+
+# Сколько статей анализируем одновременно и сколько ждём ответа LLM
+LLM_MAX_CONCURRENCY = int(environ.get("LLM_MAX_CONCURRENCY", 8))
+LLM_TIMEOUT = float(environ.get("LLM_TIMEOUT", 30))
+
+# Повторы запроса к LLM с экспоненциальной задержкой, как в клиенте backend
+LLM_RETRIES = int(environ.get("LLM_RETRIES", 3))
+LLM_BACKOFF = float(environ.get("LLM_BACKOFF", 0.5))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Поиск NewsAPI кэшируем ненадолго, готовые анализы статей — надолго
+NEWS_CACHE_TTL = float(environ.get("NEWS_CACHE_TTL", 300))
+ANALYSIS_CACHE_SIZE = int(environ.get("ANALYSIS_CACHE_SIZE", 4096))
+ANALYSIS_CACHE_TTL = float(environ.get("ANALYSIS_CACHE_TTL", 24 * 3600))
+
+# Пакетный режим: сколько токенов статей помещаем в один запрос к LLM
+PACK_TOKEN_BUDGET = int(environ.get("PACK_TOKEN_BUDGET", 6000))
+PACK_TOKENS_PER_ARTICLE = int(environ.get("PACK_TOKENS_PER_ARTICLE", 400))
+MAX_ANSWER_TOKENS = 8000
+
+# Сколько символов статьи уходит в LLM; ~3 символа русского текста на токен
+ARTICLE_CHAR_LIMIT = 2000
+CHARS_PER_TOKEN = 3
+
+SYSTEM_PROMPT = "Ты - финансовый аналитик. Выдели ключевые факты и оцени влияние события на компанию."
+
+PACK_SYSTEM_PROMPT = (
+    "Ты - финансовый аналитик. Тебе приходит несколько новостей о компании, каждая "
+    "начинается со строки «### Статья N». Для каждой статьи выдели ключевые факты и оцени "
+    "влияние события на компанию. Ответь только JSON-массивом вида "
+    "[{\"id\": N, \"analysis\": \"...\"}], по одному объекту на каждую статью, без текста вокруг."
+)
+
+
+class TTLCache:
+    """
+    LRU-кэш на maxsize записей, каждая живёт не дольше ttl секунд.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
 class NewsRequest(BaseModel):
     query: str = "роснефть"
     language: str = "ru"
     page_size: int = 2
+    packed: bool = False  # несколько статей в одном запросе к LLM
 
 class NewsAnalysis(BaseModel):
     title: str
@@ -43,86 +119,263 @@ class NewsResponse(BaseModel):
 # --- Инициализация клиентов ---
 newsapi = NewsApiClient(api_key=NEWSAPI_KEY)
 
-def analyze_with_yagpt(text: str) -> str:
-    """Анализ текста через Yandex GPT"""
+news_cache = TTLCache(maxsize=256, ttl=NEWS_CACHE_TTL)
+analysis_cache = TTLCache(maxsize=ANALYSIS_CACHE_SIZE, ttl=ANALYSIS_CACHE_TTL)
+
+_http: Optional[httpx.AsyncClient] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def get_http() -> httpx.AsyncClient:
+    """Общий пул keep-alive соединений к Yandex GPT."""
+    global _http
+    if _http is None or _http.is_closed:
+        _http = httpx.AsyncClient(
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=min(LLM_TIMEOUT, 10.0)),
+            limits=httpx.Limits(max_connections=LLM_MAX_CONCURRENCY,
+                                max_keepalive_connections=LLM_MAX_CONCURRENCY)
+        )
+    return _http
+
+
+def get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _semaphore
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    if _http is not None:
+        await _http.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+async def complete_yagpt(system_text: str, user_text: str, max_tokens: int = 1000) -> str:
+    """Один запрос к Yandex GPT"""
     prompt = {
         "modelUri": f"gpt://{FOLDER_ID}/yandexgpt",
         "completionOptions": {
             "stream": False,
             "temperature": 0.6,
-            "maxTokens": "1000"
+            "maxTokens": str(max_tokens)
         },
         "messages": [
             {
                 "role": "system",
-                "text": "Ты - финансовый аналитик. Выдели ключевые факты и оцени влияние события на компанию."
+                "text": system_text
             },
             {
                 "role": "user",
-                "text": text[:2000]  # Ограничение длины текста
+                "text": user_text
             }
         ]
     }
 
     headers = {
         "Content-Type": "application/json",
-        "Authorization": f"Api-Key {YANDEX_API_KEY}"
+        "Authorization": f"Api-Key {API_KEY}"
     }
 
+    async with get_semaphore():
+        for attempt in range(LLM_RETRIES + 1):
+            last = attempt == LLM_RETRIES
+            logger.info("Отправка запроса в Yandex GPT...")
+            try:
+                response = await get_http().post(URL, headers=headers, json=prompt)
+            except httpx.TransportError:
+                if last:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or last:
+                    break
+                logger.warning(f"Yandex GPT ответил {response.status_code}, повторяем")
+            await asyncio.sleep(LLM_BACKOFF * 2 ** attempt + random.uniform(0, LLM_BACKOFF))
+    response.raise_for_status()
+    return response.json()['result']['alternatives'][0]['message']['text']
+
+
+async def analyze_with_yagpt(text: str) -> str:
+    """Анализ текста через Yandex GPT"""
+    return await complete_yagpt(SYSTEM_PROMPT, text[:ARTICLE_CHAR_LIMIT])  # Ограничение длины текста
+
+
+def article_text(article: dict) -> str:
+    title = article.get("title", "Без заголовка")
+    description = article.get("description", "Без описания")
+    return f"{title}\n\n{description}"
+
+
+def article_key(article: dict) -> tuple[str, str]:
+    """Ключ анализа: URL статьи и хеш текста, который уходит в LLM."""
+    content = f"{article.get('title')}\n\n{article.get('description')}"
+    return article.get("url") or "", hashlib.sha256(content.encode()).hexdigest()
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def pack_articles(texts: list[str], budget: int = PACK_TOKEN_BUDGET) -> list[list[int]]:
+    """
+    Жадно раскладывает статьи по пачкам так, чтобы тексты пачки вместе
+    с ответом на них укладывались в budget токенов. Возвращает индексы.
+    """
+    packs: list[list[int]] = []
+    current: list[int] = []
+    used = 0
+    for i, text in enumerate(texts):
+        cost = estimate_tokens(text) + PACK_TOKENS_PER_ARTICLE
+        if current and used + cost > budget:
+            packs.append(current)
+            current, used = [], 0
+        current.append(i)
+        used += cost
+    if current:
+        packs.append(current)
+    return packs
+
+
+def parse_packed(answer: str, n_articles: int) -> dict[int, str]:
+    """
+    Достаёт из ответа JSON-массив [{"id": N, "analysis": ...}] и возвращает
+    {индекс статьи в пачке: анализ}. Всё, что разобрать не удалось, пропускается.
+    """
+    start, end = answer.find("["), answer.rfind("]")
+    if start < 0 or end < start:
+        return {}
+    try:
+        items = json.loads(answer[start:end + 1])
+    except ValueError:
+        return {}
+
+    parsed = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        idx, analysis = item.get("id"), item.get("analysis")
+        if isinstance(idx, int) and 1 <= idx <= n_articles and isinstance(analysis, str):
+            parsed[idx - 1] = analysis
+    return parsed
+
+
+async def analyze_pack(texts: list[str]) -> dict[int, str]:
+    user_text = "\n\n".join(f"### Статья {n}\n{text}" for n, text in enumerate(texts, 1))
+    max_tokens = min(MAX_ANSWER_TOKENS, PACK_TOKENS_PER_ARTICLE * len(texts))
+    logger.info(f"Пакетный анализ {len(texts)} статей...")
     try:
-        logger.info("Отправка запроса в Yandex GPT...")
-        response = requests.post(YANDEX_URL, headers=headers, json=prompt, timeout=10)
-        response.raise_for_status()
-        return response.json()['result']['alternatives'][0]['message']['text']
+        answer = await complete_yagpt(PACK_SYSTEM_PROMPT, user_text, max_tokens)
     except Exception as e:
         logger.error(f"Ошибка Yandex GPT: {str(e)}")
-        return f"Ошибка анализа: {str(e)}"
+        return {}
+    return parse_packed(answer, len(texts))
+
+
+async def analyze_packed(articles: list[dict]) -> dict[int, str]:
+    """
+    Анализирует некэшированные статьи пачками по PACK_TOKEN_BUDGET, по
+    одному запросу к LLM на пачку. Статьи, которых нет в ответе модели,
+    в результат не попадают — их потом разберут по одной.
+    """
+    todo = [i for i, article in enumerate(articles)
+            if analysis_cache.get(article_key(article)) is None]
+    texts = [article_text(articles[i])[:ARTICLE_CHAR_LIMIT] for i in todo]
+
+    packs = pack_articles(texts)
+    answers = await asyncio.gather(*(analyze_pack([texts[j] for j in pack]) for pack in packs))
+
+    analyses = {}
+    for pack, parsed in zip(packs, answers):
+        for n, analysis in parsed.items():
+            i = todo[pack[n]]
+            analyses[i] = analysis
+            analysis_cache.set(article_key(articles[i]), analysis)
+    return analyses
+
+
+async def search_news(query: str, language: str, page_size: int) -> dict:
+    """
+    Поиск NewsAPI с коротким кэшем: повторные загрузки дашборда по той же
+    компании не ходят наружу. Синхронный клиент уводим в поток.
+    """
+    key = (query, language, page_size)
+    cached = news_cache.get(key)
+    if cached is not None:
+        return cached
+
+    news_data = await asyncio.to_thread(
+        newsapi.get_everything,
+        q=query,
+        language=language,
+        sort_by="publishedAt",
+        page_size=page_size
+    )
+    news_cache.set(key, news_data)
+    return news_data
+
+
+async def analyze_article(article: dict, analysis: Optional[str] = None) -> NewsAnalysis:
+    # Формирование текста для анализа
+    title = article.get("title", "Без заголовка")
+    description = article.get("description", "Без описания")
+    text_to_analyze = article_text(article)
+
+    key = article_key(article)
+    if analysis is None:
+        analysis = analysis_cache.get(key)
+    if analysis is None:
+        logger.info(f"Анализ статьи: {title[:50]}...")
+        try:
+            analysis = await analyze_with_yagpt(text_to_analyze)
+            analysis_cache.set(key, analysis)
+        except Exception as e:
+            # Ошибку отдаём в ответе, но не кэшируем
+            logger.error(f"Ошибка Yandex GPT: {str(e)}")
+            analysis = f"Ошибка анализа: {str(e)}"
+
+    return NewsAnalysis(
+        title=title,
+        description=description,
+        url=article.get("url", ""),
+        analysis=analysis
+    )
+
 
 @app.post("/news-analysis", response_model=NewsResponse)
 async def get_news_analysis(request: NewsRequest):
     """Получение и анализ новостей"""
     try:
         logger.info(f"Поиск новостей по запросу: '{request.query}'")
-        
+
         # Получение новостей
-        news_data = newsapi.get_everything(
-            q=request.query,
-            language=request.language,
-            sort_by="publishedAt",
-            page_size=request.page_size
-        )
+        news_data = await search_news(request.query, request.language, request.page_size)
 
         if not news_data.get("articles"):
             logger.warning("Новости не найдены!")
             return NewsResponse(results=[])
 
+        articles = news_data["articles"]
+        packed = await analyze_packed(articles) if request.packed else {}
+
+        # Статьи анализируются параллельно, не больше LLM_MAX_CONCURRENCY сразу
+        analyses = await asyncio.gather(
+            *(analyze_article(article, packed.get(i)) for i, article in enumerate(articles)),
+            return_exceptions=True
+        )
+
         results = []
-        for article in news_data["articles"]:
-            try:
-                # Формирование текста для анализа
-                title = article.get("title", "Без заголовка")
-                description = article.get("description", "Без описания")
-                text_to_analyze = f"{title}\n\n{description}"
-                
-                logger.info(f"Анализ статьи: {title[:50]}...")
-                
-                # Анализ текста
-                analysis = analyze_with_yagpt(text_to_analyze)
-                
-                # Формирование результата
-                results.append(NewsAnalysis(
-                    title=title,
-                    description=description,
-                    url=article.get("url", ""),
-                    analysis=analysis
-                ))
-                
-            except Exception as e:
-                logger.error(f"Ошибка обработки статьи: {str(e)}")
+        for analysis in analyses:
+            if isinstance(analysis, Exception):
+                logger.error(f"Ошибка обработки статьи: {str(analysis)}")
                 continue
+            results.append(analysis)
 
         return NewsResponse(results=results)
-        
+
     except Exception as e:
         logger.critical(f"Критическая ошибка: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -0,0 +1,9 @@
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# inference.py requires the keys at import; tests never reach the real services
+for name in ("YANDEX_CLOUD_API_KEY", "YANDEX_CLOUD_FOLDER_ID", "NEWSAPI_KEY"):
+    os.environ.setdefault(name, "test")
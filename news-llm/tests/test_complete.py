@@ -0,0 +1,64 @@
+import asyncio
+
+import httpx
+import pytest
+
+import inference
+
+
+def answer(text: str) -> dict:
+    return {"result": {"alternatives": [{"message": {"role": "assistant", "text": text}}]}}
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Routes complete_yagpt to a list of scripted replies; returns the list of received requests."""
+    replies, requests = [], []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        reply = replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    monkeypatch.setattr(inference, "LLM_BACKOFF", 0)
+    monkeypatch.setattr(inference, "_semaphore", None)
+    monkeypatch.setattr(inference, "_http", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return replies, requests
+
+
+def complete() -> str:
+    return asyncio.run(inference.complete_yagpt("system", "user"))
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_retries_retryable_status(upstream, status):
+    replies, requests = upstream
+    replies += [httpx.Response(status), httpx.Response(200, json=answer("ok"))]
+    assert complete() == "ok"
+    assert len(requests) == 2
+
+
+def test_retries_transport_error(upstream):
+    replies, requests = upstream
+    replies += [httpx.ConnectError("refused"), httpx.Response(200, json=answer("ok"))]
+    assert complete() == "ok"
+    assert len(requests) == 2
+
+
+def test_does_not_retry_client_error(upstream):
+    replies, requests = upstream
+    replies += [httpx.Response(400)]
+    with pytest.raises(httpx.HTTPStatusError):
+        complete()
+    assert len(requests) == 1
+
+
+def test_gives_up_after_retries(upstream, monkeypatch):
+    monkeypatch.setattr(inference, "LLM_RETRIES", 2)
+    replies, requests = upstream
+    replies += [httpx.Response(503)] * 3
+    with pytest.raises(httpx.HTTPStatusError):
+        complete()
+    assert len(requests) == 3
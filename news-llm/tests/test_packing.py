@@ -0,0 +1,68 @@
+import asyncio
+import json
+
+import pytest
+
+import inference
+from inference import PACK_TOKENS_PER_ARTICLE, estimate_tokens, pack_articles, parse_packed
+
+
+def cost(text: str) -> int:
+    return estimate_tokens(text) + PACK_TOKENS_PER_ARTICLE
+
+
+def test_pack_articles_respects_budget_and_order():
+    texts = ["а" * n for n in (300, 3000, 30, 1500, 600, 900)]
+    budget = 2 * PACK_TOKENS_PER_ARTICLE + 1200
+    packs = pack_articles(texts, budget)
+    assert [i for pack in packs for i in pack] == list(range(len(texts)))
+    for pack in packs:
+        assert len(pack) == 1 or sum(cost(texts[i]) for i in pack) <= budget
+
+
+def test_pack_articles_oversized_article_gets_own_pack():
+    texts = ["short", "х" * 30_000, "short"]
+    assert pack_articles(texts, budget=1000) == [[0], [1], [2]]
+
+
+def test_pack_articles_empty():
+    assert pack_articles([]) == []
+
+
+def test_parse_packed_out_of_order_and_surrounding_text():
+    answer = "Вот ответ:\n" + json.dumps([{"id": 3, "analysis": "в"}, {"id": 1, "analysis": "а"},
+                                         {"id": 2, "analysis": "б"}], ensure_ascii=False) + "\nГотово"
+    assert parse_packed(answer, 3) == {0: "а", 1: "б", 2: "в"}
+
+
+def test_parse_packed_missing_and_extra_ids():
+    answer = json.dumps([{"id": 2, "analysis": "б"}, {"id": 4, "analysis": "лишняя"},
+                         {"id": 0, "analysis": "ноль"}, {"id": "1", "analysis": "строка"},
+                         {"id": 1}, "мусор"])
+    assert parse_packed(answer, 3) == {1: "б"}
+
+
+@pytest.mark.parametrize("answer", ["", "нет JSON", "[{\"id\": 1, ", "{\"id\": 1, \"analysis\": \"а\"}"])
+def test_parse_packed_unparseable(answer):
+    assert parse_packed(answer, 2) == {}
+
+
+def test_analyze_packed_leaves_missing_articles_out(monkeypatch):
+    articles = [{"title": f"t{i}", "description": f"d{i}", "url": f"u{i}"} for i in range(3)]
+    calls = []
+
+    async def complete(system_text, user_text, max_tokens=1000):
+        calls.append(user_text)
+        if len(calls) > 1:
+            return "[]"
+        # Модель ответила не на все статьи и не по порядку
+        return json.dumps([{"id": 3, "analysis": "третья"}, {"id": 1, "analysis": "первая"}])
+
+    monkeypatch.setattr(inference, "complete_yagpt", complete)
+    monkeypatch.setattr(inference, "analysis_cache", inference.TTLCache())
+    assert asyncio.run(inference.analyze_packed(articles)) == {0: "первая", 2: "третья"}
+    assert len(calls) == 1
+
+    # Разобранные статьи закэшированы и повторно в LLM не уходят
+    assert asyncio.run(inference.analyze_packed(articles)) == {}
+    assert "t1" in calls[1] and "t0" not in calls[1] and "t2" not in calls[1]